@@ -0,0 +1,269 @@
+"""Time the hot paths of buglog on synthetic configs and histories.
+
+Each case is run a few times after a warm-up, and its fastest run
+is reported (slower ones are slowed down by the rest of the system).
+The results can be saved as a baseline, and later runs compared
+against it, failing if any case got slower than the threshold::
+
+    python benchmarks/run.py --save benchmarks/baseline.json
+    python benchmarks/run.py --compare benchmarks/baseline.json
+
+The timings depend on the machine, so the baseline is to be
+recorded on the same machine as the runs compared against it.
+Baselines recorded with another Python version, architecture
+or scale are refused.
+"""
+import contextlib
+import io
+import json
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Iterator
+from typing import NamedTuple
+from typing import Optional
+
+import click
+
+from synthetic import bug_specs
+from synthetic import filled_template
+from synthetic import random_data
+from synthetic import render_config
+from synthetic import write_history
+
+# Numbers of the classes in the configs, and of the records in the histories
+SCALES = {
+    "small": ((10, 200), (1_000, 100_000)),
+    "full": ((10, 200, 2_000), (1_000, 100_000, 1_000_000)),
+}
+# Classes picked into the template
+NUM_PICKED = 10
+# Differences below this many seconds are noise, not regressions
+MIN_DELTA = 0.0005
+
+
+def environment(scale: str) -> Dict[str, str]:
+    """Describe where the results come from, to be kept with them."""
+    return {
+        "python": ".".join(platform.python_version_tuple()[:2]),
+        "machine": platform.machine(),
+        "scale": scale,
+    }
+
+
+class Case(NamedTuple):
+    name: str
+    run: Callable[[], Any]
+    repeat: int
+
+
+def _use_dirs(root: Path) -> None:
+    """Point buglog's config, data and cache folders into the root."""
+    import buglog.bootstrap
+
+    buglog.bootstrap.XDG_CONFIG_HOME = root / "config"
+    buglog.bootstrap.XDG_DATA_HOME = root / "data"
+    buglog.bootstrap.XDG_CACHE_HOME = root / "cache"
+
+
+def config_cases(root: Path, num_classes: int) -> Iterator[Case]:
+    """Cases of importing the config, and of the templates."""
+    import buglog.parse_rst
+    from buglog.bootstrap import config_path
+    from buglog.parse_rst import bugs_to_rst
+    from buglog.parse_rst import rst_to_bugs
+    from buglog.snapshot import build_snapshot
+    from buglog.snapshot import load_snapshot
+    from buglog.utils import BugRegistry
+    from buglog.utils import get_bug_subclasses
+    from buglog.utils import str_to_bug
+
+    _use_dirs(root / f"config-{num_classes}")
+    specs = bug_specs(num_classes)
+    config_path().parent.mkdir(parents=True)
+    config_path().write_text(render_config(specs))
+    names = [spec.name for spec in specs]
+    step = max(1, num_classes // NUM_PICKED)
+    picked = specs[::step][:NUM_PICKED]
+    text = filled_template(picked)
+
+    yield Case(
+        f"config_import[{num_classes}]", lambda: BugRegistry().refresh(), 5
+    )
+    get_bug_subclasses()
+    yield Case(
+        f"str_to_bug[{num_classes}]",
+        lambda: [str_to_bug(name) for name in names],
+        5,
+    )
+    yield Case(f"build_snapshot[{num_classes}]", build_snapshot, 3)
+    load_snapshot()
+    yield Case(
+        f"bugs_to_rst[{num_classes}]",
+        lambda: bugs_to_rst(spec.name for spec in picked),
+        20,
+    )
+
+    def _parse_cold() -> None:
+        buglog.parse_rst._parsed.clear()
+        list(rst_to_bugs(text))
+
+    yield Case(f"rst_to_bugs[{num_classes}]", _parse_cold, 20)
+    # A round of the edit loop: one of the sections is corrected
+    edited = filled_template(picked[:1], seed=1)
+    rounds = [text, edited + text[text.index("\n\n") :]]
+    yield Case(
+        f"rst_to_bugs_edit[{num_classes}]",
+        lambda: [list(rst_to_bugs(round_text)) for round_text in rounds],
+        20,
+    )
+
+
+def history_cases(root: Path, num_records: int) -> Iterator[Case]:
+    """Cases of saving a bug, and of reading the whole history."""
+    from buglog.bootstrap import config_path
+    from buglog.dump import dump_bug
+    from buglog.prompt import date_to_filename
+    from buglog.records import load_lite_records
+    from buglog.storage import iter_records
+    from buglog.utils import str_to_bug
+
+    _use_dirs(root / f"history-{num_records}")
+    specs = bug_specs(10)
+    config_path().parent.mkdir(parents=True)
+    config_path().write_text(render_config(specs))
+    write_history(specs, num_records)
+
+    yield Case(f"read_history[{num_records}]", lambda: list(iter_records()), 3)
+    yield Case(f"load_lite_records[{num_records}]", load_lite_records, 3)
+
+    spec = specs[0]
+    bug = str_to_bug(spec.name)(**random_data(spec, random.Random(0)))
+    file_name = date_to_filename(spec.name, datetime(2030, 1, 1))
+
+    def _dump() -> None:
+        with contextlib.redirect_stdout(io.StringIO()):
+            dump_bug(bug, file_name)
+
+    yield Case(f"dump_bug[{num_records}]", _dump, 20)
+
+
+def time_case(case: Case) -> float:
+    """Get time of the case's fastest run, in seconds."""
+    case.run()
+    timings = []
+    for _ in range(case.repeat):
+        started = time.perf_counter()
+        case.run()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def compare(
+    results: Dict[str, float], baseline: Dict[str, float], threshold: float
+) -> int:
+    """Print results against the baseline, returning number of regressions."""
+    regressions = 0
+    for name, seconds in results.items():
+        if name not in baseline:
+            click.echo(f"{name:32} {'new':>10} {seconds * 1000:10.3f} ms")
+            continue
+        before = baseline[name]
+        change = seconds / before - 1 if before else 0.0
+        regressed = change > threshold and seconds - before > MIN_DELTA
+        regressions += regressed
+        click.echo(
+            f"{name:32} {before * 1000:10.3f} {seconds * 1000:10.3f} ms"
+            f" {change:+8.1%}{'  REGRESSION' if regressed else ''}"
+        )
+    return regressions
+
+
+@click.command()
+@click.option(
+    "--scale",
+    type=click.Choice(list(SCALES)),
+    default="small",
+    show_default=True,
+    help="Up to 200 classes and 100k records, or 2,000 and 1M.",
+)
+@click.option(
+    "--save",
+    type=click.Path(dir_okay=False, writable=True),
+    help="Save the results into the file.",
+)
+@click.option(
+    "--compare",
+    "baseline_path",
+    type=click.Path(exists=True, dir_okay=False),
+    help="Fail if slower than the results saved in the file.",
+)
+@click.option(
+    "--threshold",
+    type=float,
+    default=0.25,
+    show_default=True,
+    help="Slowdown (relative to the baseline) failing the comparison.",
+)
+@click.option("--only", help="Only the cases whose name contains this.")
+def main(
+    scale: str,
+    save: Optional[str],
+    baseline_path: Optional[str],
+    threshold: float,
+    only: Optional[str],
+) -> None:
+    """Time the hot paths on synthetic configs and histories."""
+    baseline = None
+    if baseline_path:
+        with open(baseline_path) as fin:
+            baseline = json.load(fin)
+        recorded = {key: baseline.get(key) for key in environment(scale)}
+        if recorded != environment(scale):
+            raise click.UsageError(
+                f"{baseline_path} was recorded with {recorded},"
+                f" not comparable to {environment(scale)};"
+                " record a baseline here with --save first"
+            )
+
+    class_counts, record_counts = SCALES[scale]
+    results: Dict[str, float] = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        root = Path(tmp_dir)
+        groups = [config_cases(root, n) for n in class_counts]
+        groups += [history_cases(root, n) for n in record_counts]
+        for group in groups:
+            for case in group:
+                if only and only not in case.name:
+                    continue
+                results[case.name] = time_case(case)
+                click.echo(
+                    f"{case.name:32} {results[case.name] * 1000:10.3f} ms"
+                )
+
+    if save:
+        with open(save, "w") as fout:
+            json.dump(
+                {**environment(scale), "results": results},
+                fout,
+                indent=2,
+            )
+            fout.write("\n")
+
+    if baseline is not None:
+        click.echo()
+        regressions = compare(results, baseline["results"], threshold)
+        if regressions:
+            click.echo(f"{regressions} case(s) regressed", err=True)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
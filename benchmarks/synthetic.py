@@ -0,0 +1,156 @@
+"""Synthetic configs and histories for the benchmarks."""
+import random
+from datetime import datetime
+from datetime import timedelta
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Union
+
+KINDS = ("int", "float", "str", "bool")
+WORDS = ("coffee", "tea", "water", "juice", "soda", "milk", "кефир")
+MAX_FIELDS = 6
+
+
+class FieldSpec(NamedTuple):
+    name: str
+    kind: str
+    title: str
+    default: Optional[Any]
+
+
+class BugSpec(NamedTuple):
+    name: str
+    description: str
+    fields: List[FieldSpec]
+
+
+def _random_value(kind: str, rng: random.Random) -> Any:
+    if kind == "int":
+        return rng.randint(0, 1000)
+    if kind == "float":
+        return round(rng.uniform(0, 100), 2)
+    if kind == "bool":
+        return rng.random() < 0.5
+    return rng.choice(WORDS)
+
+
+def bug_specs(num_classes: int, *, seed: int = 0) -> List[BugSpec]:
+    """Generate Bug classes with mixed field types.
+
+    Parameters:
+        num_classes: Number of the classes.
+        seed: Seed of the random generator.
+
+    Returns:
+        Specifications of the classes, each with 1 to 6 fields,
+        half of which have defaults.
+    """
+    rng = random.Random(seed)
+    specs = []
+    for i in range(num_classes):
+        fields = []
+        for j in range(rng.randint(1, MAX_FIELDS)):
+            kind = rng.choice(KINDS)
+            default = _random_value(kind, rng) if rng.random() < 0.5 else None
+            title = f"{kind.capitalize()} field {j}"
+            fields.append(FieldSpec(f"{kind}_{j}", kind, title, default))
+        specs.append(BugSpec(f"Bug{i:04}", f"Synthetic bug {i}", fields))
+    return specs
+
+
+def render_config(specs: List[BugSpec]) -> str:
+    """Render the classes as a config file.
+
+    Parameters:
+        specs: Specifications of the classes.
+
+    Returns:
+        Source code of the config.
+    """
+    lines = ["from pydantic import Field", "", "from buglog.utils import Bug"]
+    for spec in specs:
+        lines += ["", "", f"class {spec.name}(Bug):"]
+        lines.append(f'    """{spec.description}"""')
+        for field in spec.fields:
+            default = "..." if field.default is None else repr(field.default)
+            constraint = ", ge=0" if field.kind in ("int", "float") else ""
+            lines.append(
+                f"    {field.name}: {field.kind} = "
+                f'Field({default}, title="{field.title}"{constraint})'
+            )
+    return "\n".join(lines) + "\n"
+
+
+def random_data(spec: BugSpec, rng: random.Random) -> Dict[str, Any]:
+    """Generate valid fields of a bug.
+
+    Parameters:
+        spec: Specification of the class.
+        rng: The random generator.
+
+    Returns:
+        The fields, as in ``bug.dict()``.
+    """
+    return {
+        field.name: _random_value(field.kind, rng) for field in spec.fields
+    }
+
+
+def filled_template(specs: List[BugSpec], *, seed: int = 0) -> str:
+    """Render the template of the classes, as filled in by the user.
+
+    Parameters:
+        specs: Specifications of the classes.
+        seed: Seed of the random generator.
+
+    Returns:
+        The filled in template.
+    """
+    rng = random.Random(seed)
+    sections = []
+    for spec in specs:
+        title = f"{spec.name}: {spec.description}"
+        lines = [title, "-" * len(title)]
+        data = random_data(spec, rng)
+        for field in spec.fields:
+            lines.append(f"* {field.title}: {data[field.name]}")
+        sections.append("\n".join(lines))
+    return "\n\n".join(sections)
+
+
+def write_history(
+    specs: List[BugSpec],
+    num_records: int,
+    *,
+    records_per_file: int = 20,
+    seed: int = 0,
+) -> None:
+    """Save random bugs into the data folder.
+
+    Parameters:
+        specs: Specifications of the classes.
+        num_records: Number of the records.
+        records_per_file: Number of the records per dump file.
+        seed: Seed of the random generator.
+    """
+    from buglog.prompt import date_to_filename
+    from buglog.storage import commit
+
+    rng = random.Random(seed)
+    timestamp = datetime(2015, 1, 1)
+    batch: Dict[Union[Path, str], List[Dict[str, Any]]] = {}
+    written = 0
+    while written < num_records:
+        spec = rng.choice(specs)
+        count = min(records_per_file, num_records - written)
+        file_name = date_to_filename(spec.name, timestamp)
+        batch[file_name] = [random_data(spec, rng) for _ in range(count)]
+        written += count
+        timestamp += timedelta(minutes=rng.randint(1, 180))
+        if len(batch) >= 1000 or written == num_records:
+            commit(batch, fsync=False)
+            batch = {}
@@ -33,6 +33,7 @@ nox.options.sessions = (
 locations = (
     "src/",
     "tests/",
+    "benchmarks/",
     "noxfile.py",
     "docs/conf.py",
 )
@@ -186,6 +187,20 @@ def tests(session: Session) -> None:
         session.run("pytest", *args)
 
 
+@nox.session(python="3.8")
+def benchmarks(session: Session) -> None:
+    """Time the hot paths, failing if slower than the baseline.
+
+    The baseline is recorded with this session's interpreter,
+    and has to be re-recorded on another machine::
+
+        nox -s benchmarks -- --save benchmarks/baseline.json
+    """
+    args = session.posargs or ["--compare", "benchmarks/baseline.json"]
+    session.install(".")
+    session.run("python", "benchmarks/run.py", *args)
+
+
 @nox.session(python="3.8")
 def coverage(session: Session) -> None:
     """Upload coverage data."""
@@ -1,10 +1,11 @@
 import platform
 import tarfile
+from hashlib import sha256
 from io import BytesIO
 from pathlib import Path
 from shutil import copyfile
 
-import httpx
+from xdg import XDG_CACHE_HOME
 from xdg import XDG_CONFIG_HOME
 from xdg import XDG_DATA_HOME
 
@@ -30,6 +31,8 @@ def ensure_fzf(*, version: str = "0.21.1") -> None:
             f"/{version}/fzf-{version}-{system}_{arch}.tgz"
         )
 
+        import httpx
+
         response = httpx.get(asset_url)
 
         with tarfile.open(fileobj=BytesIO(response.content)) as tar:
@@ -44,9 +47,54 @@ def ensure_config(*, force_update: bool = False) -> None:
             (used for debug porposes).
     """
     example = Path(buglog.__file__).parents[0] / "data" / "config.py"
-    conf_dir = XDG_CONFIG_HOME / __package__
-    conf_path = conf_dir / "config.py"
+    conf_path = config_path()
 
     if force_update or not conf_path.exists():
-        conf_dir.mkdir(parents=True, exist_ok=True)
+        conf_path.parent.mkdir(parents=True, exist_ok=True)
         copyfile(example, conf_path)
+
+
+def config_path() -> Path:
+    """Get path to the user's config file.
+
+    Returns:
+        The ``${XDG_CONFIG_HOME:-${HOME}/.config}/buglog/config.py`` path.
+    """
+    return XDG_CONFIG_HOME / __package__ / "config.py"
+
+
+def config_digest() -> str:
+    """Get hash of the user's config file contents.
+
+    Returns:
+        Hex digest of the config file.
+    """
+    return sha256(config_path().read_bytes()).hexdigest()
+
+
+def data_dir() -> Path:
+    """Get path to the data folder.
+
+    Returns:
+        The ``${XDG_DATA_HOME:-${HOME}/.local/share}/buglog`` path.
+    """
+    return XDG_DATA_HOME / __package__
+
+
+def cache_dir() -> Path:
+    """Get path to the cache folder.
+
+    Returns:
+        The ``${XDG_CACHE_HOME:-${HOME}/.cache}/buglog`` path.
+    """
+    return XDG_CACHE_HOME / __package__
+
+
+def latest_dir() -> Path:
+    """Get path to the folder of the latest records of each bug.
+
+    Returns:
+        The ``${XDG_CACHE_HOME:-${HOME}/.cache}/buglog/latest`` path,
+        with a ``<BugClassName>.tsv`` file per logged Bug class.
+    """
+    return cache_dir() / "latest"
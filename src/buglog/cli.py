@@ -1,47 +1,55 @@
+import os
 from datetime import datetime
 from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import TextIO
+from typing import Tuple
+from typing import TYPE_CHECKING
 
 import click
-from blessings import Terminal
-from docutils.utils import SystemMessage
-from pydantic.error_wrappers import ValidationError
-from pydantic.main import ModelMetaclass
 
-from buglog.dump import dump_bug
+from buglog.bootstrap import cache_dir
+from buglog.dump import print_saved
 from buglog.fuzzy import fuzzy_pick_bug
-from buglog.parse_rst import bugs_to_rst
-from buglog.parse_rst import rst_to_bugs
+from buglog.parse_rst import RstSyntaxError
 from buglog.prompt import date_to_filename
 from buglog.prompt import edit_filename_date
 from buglog.prompt import user_read_character
-from buglog.utils import Bug
-from buglog.utils import split_to_types
+from buglog.trace import span
+
+# Filled in template, kept when it is unknown whether its bugs were saved
+UNSAVED_NAME = "unsaved.rst"
+
+if TYPE_CHECKING:
+    from buglog.daemon import BugData
+    from buglog.daemon import Session
+    from buglog.index import Predicate
+    from buglog.ingest import Invalid
+    from buglog.ingest import Validated
 
 
 def print_bugs_and_errors(
-    bugs: Iterable[Bug], errs: Iterable[ValidationError]
+    bugs: Iterable["BugData"], errs: Iterable[str]
 ) -> None:
+    from blessings import Terminal
+
     t = Terminal()
 
-    for bug in bugs:
-        print(t.bold_green("✔ ") + t.green(repr(bug)))
+    for bug_name, data in bugs:
+        fields = ", ".join(f"{k}={v!r}" for k, v in data.items())
+        print(t.bold_green("✔ ") + t.green(f"{bug_name}({fields})"))
 
     for err in errs:
-        model = err.model
-        assert isinstance(model, ModelMetaclass)
-        title = model.schema()["title"]
-        for sub_err in err.errors():
-            (loc,) = sub_err["loc"]
-            msg = sub_err["msg"]
-            print(t.bold_red("✘ ") + t.red(f"{title}.{loc}: {msg}"))
+        print(t.bold_red("✘ ") + t.red(err))
 
 
-def bugs_save_dialog(bugs: Iterable[Bug]) -> None:
+def bugs_save_dialog(session: "Session", bugs: Iterable["BugData"]) -> None:
     # Let the user choose the appropriate dates
     char = user_read_character("[K]eep current date or [t]oggle: ")
     text = ""
-    for bug in bugs:
-        bug_name = bug.__class__.__name__
+    items = []
+    for bug_name, data in bugs:
         now = datetime.now()
         if char == "k":
             file_name = date_to_filename(bug_name=bug_name, date=now)
@@ -52,12 +60,22 @@ def bugs_save_dialog(bugs: Iterable[Bug]) -> None:
             )
             if text == default:
                 text = ""
-        dump_bug(bug=bug, file_name=file_name)
+        items.append((bug_name, data, file_name))
+    # Save all the bugs at once
+    with span("save", bugs=len(items)):
+        num_files = session.save(items)
+    if num_files:
+        print_saved([bug_name for bug_name, _, _ in items], num_files)
 
 
-def cli() -> None:
+def log_bugs(session: "Session") -> None:
+    from buglog.daemon import DaemonError
+
     # Pick bugs via fzf
-    picked_bugs = fuzzy_pick_bug()
+    with span("picker lines"):
+        lines = session.picker_lines()
+    with span("pick"):
+        picked_bugs = fuzzy_pick_bug(lines)
     if not picked_bugs:
         return
 
@@ -66,18 +84,21 @@ def cli() -> None:
     while True:
         # Create .rst template from the list of picked bugs
         if rst_text is None:
-            rst_text = bugs_to_rst(picked_bugs)
+            with span("template", bugs=len(picked_bugs)):
+                rst_text = session.template(picked_bugs)
         # Let user fill the template
-        rst_text = click.edit(rst_text)
+        with span("editor"):
+            rst_text = click.edit(rst_text)
         # If the user did not provide any input (either '' or None) then exit
         if not rst_text:
             return
         # Parse filled in template into bugs and errors
         try:
-            items = list(rst_to_bugs(rst_text))
-        except SystemMessage:
+            with span("parse"):
+                only_bugs, only_errs = session.parse(rst_text)
+        except RstSyntaxError as err:
             char = user_read_character(
-                "Could not parse text.",
+                f"Could not parse text: {err}",
                 "[e]dit/[c]ancel: ",
             )
             if char == "e":
@@ -85,11 +106,6 @@ def cli() -> None:
                 continue
             elif char == "c":
                 return
-        only_bugs, only_errs = split_to_types(
-            items=items,
-            t1=Bug,
-            t2=ValidationError,
-        )
         # Print the parse results
         print_bugs_and_errors(bugs=only_bugs, errs=only_errs)
         # If no problems encountered then go further
@@ -120,13 +136,367 @@ def cli() -> None:
             return
 
     # Let the user choose the appropriate dates
-    bugs_save_dialog(only_bugs)
+    with span("save dialog"):
+        try:
+            bugs_save_dialog(session, only_bugs)
+        except DaemonError as err:
+            # Whether the bugs were saved is unknown, keep them for the user
+            path = cache_dir() / UNSAVED_NAME
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(rst_text)
+            raise DaemonError(f"{err}, the bugs are kept in {path}")
+
+
+def cli() -> None:
+    # Served by the daemon if it is running, otherwise in this process
+    from buglog.daemon import DaemonError
+    from buglog.daemon import open_session
+
+    try:
+        with open_session() as session:
+            log_bugs(session)
+    except DaemonError as err:
+        raise click.ClickException(str(err))
+
+
+def _parse_predicates(
+    ctx: click.Context, param: click.Parameter, values: Tuple[str, ...]
+) -> List["Predicate"]:
+    from buglog.index import parse_predicate
+
+    try:
+        return [parse_predicate(value) for value in values]
+    except ValueError as err:
+        raise click.BadParameter(str(err))
+
+
+def _profile(ctx: click.Context, path: str) -> None:
+    """Profile the run, and time its stages."""
+    import cProfile
 
+    from buglog.trace import enable
 
-@click.command()
+    enable()
+    profile = cProfile.Profile()
+    profile.enable()
+
+    def _dump() -> None:
+        profile.disable()
+        profile.dump_stats(path)
+
+    ctx.call_on_close(_dump)
+
+
+@click.group(invoke_without_command=True)
 @click.version_option(prog_name=__package__)
-def main() -> None:
-    cli()
+@click.option(
+    "--profile",
+    "profile_path",
+    type=click.Path(dir_okay=False, writable=True),
+    help="Dump cProfile stats of the run into the file,"
+    " and print timings of its stages (as BUGLOG_TRACE=1 does).",
+)
+@click.pass_context
+def main(ctx: click.Context, profile_path: Optional[str]) -> None:
+    """Log what's bugging you.
+
+    Without a command, pick the bugs to be logged interactively.
+    """
+    if profile_path:
+        _profile(ctx, profile_path)
+    if ctx.invoked_subcommand is None:
+        cli()
+
+
+@main.command()
+@click.argument("bug_name", required=False)
+@click.option(
+    "--since", type=click.DateTime(), help="Only bugs logged since then."
+)
+@click.option(
+    "--until", type=click.DateTime(), help="Only bugs logged before then."
+)
+@click.option(
+    "--where",
+    "predicates",
+    multiple=True,
+    metavar="FIELD<OP>VALUE",
+    callback=_parse_predicates,
+    help="Only bugs whose field satisfies the predicate.",
+)
+def query(
+    bug_name: Optional[str],
+    since: Optional[datetime],
+    until: Optional[datetime],
+    predicates: List["Predicate"],
+) -> None:
+    """Print logged bugs as JSON lines."""
+    import json
+
+    from buglog.index import query as query_index
+
+    records = query_index(bug_name, since=since, until=until, where=predicates)
+    for timestamp, name, data in records:
+        line = {"timestamp": timestamp.isoformat(), "bug": name, "data": data}
+        click.echo(json.dumps(line))
+
+
+@main.command()
+@click.option(
+    "--layout",
+    type=click.Choice(["flat", "partitioned"]),
+    required=True,
+    help="Keep dump files in one folder or in YYYY/MM/DD/ subfolders.",
+)
+def migrate(layout: str) -> None:
+    """Move logged bugs into another layout of the data folder."""
+    from buglog.storage import migrate as migrate_storage
+
+    moved = migrate_storage(layout)
+    click.echo(f"Moved {moved} file(s) into the {layout} layout")
+
+
+@main.command()
+@click.option(
+    "--before",
+    type=click.DateTime(formats=["%Y-%m"]),
+    help="Only months before this one (YYYY-MM).",
+)
+@click.option(
+    "--binary",
+    is_flag=True,
+    help="Encode the bugs in a binary format derived from the config.",
+)
+def compact(before: Optional[datetime], binary: bool) -> None:
+    """Pack logged bugs of the past months into compressed segments."""
+    from buglog.segments import compact as compact_storage
+
+    packed = compact_storage(before, binary=binary)
+    click.echo(
+        f"Packed {sum(packed.values())} file(s)"
+        f" into {len(packed)} segment(s)"
+    )
+
+
+@main.command()
+@click.option(
+    "--watch-interval",
+    type=click.FloatRange(min=0.1),
+    default=1.0,
+    show_default=True,
+    help="Seconds between checks of the config for changes.",
+)
+def serve(watch_interval: float) -> None:
+    """Keep the config, schemas and templates warm for the next runs.
+
+    While the daemon is running, picking and logging bugs
+    is served by it over a UNIX socket in the cache folder.
+    """
+    import signal
+    import sys
+
+    from buglog.daemon import DaemonError
+    from buglog.daemon import serve as serve_daemon
+    from buglog.daemon import socket_path
+
+    # Remove the socket when terminated as well
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    click.echo(f"Serving on {socket_path()}")
+    try:
+        serve_daemon(watch_interval=watch_interval)
+    except DaemonError as err:
+        raise click.ClickException(str(err))
+
+
+@main.command()
+@click.option(
+    "--host",
+    default="127.0.0.1",
+    show_default=True,
+    help="Address to listen on (0.0.0.0 for the whole network).",
+)
+@click.option("--port", type=int, default=8421, show_default=True)
+@click.option(
+    "--batch-window",
+    type=click.FloatRange(min=0),
+    default=0.05,
+    show_default=True,
+    help="Seconds to gather concurrent requests into one commit.",
+)
+@click.option(
+    "--token",
+    envvar="BUGLOG_HTTP_TOKEN",
+    help="Require 'Authorization: Bearer TOKEN' header"
+    " (default: $BUGLOG_HTTP_TOKEN).",
+)
+def http(
+    host: str, port: int, batch_window: float, token: Optional[str]
+) -> None:
+    """Log bugs posted as JSON over HTTP.
+
+    POST /bugs takes a record or an array of them, formatted as for
+    the import command. GET /stats reports throughput and latencies.
+    """
+    from buglog.httpd import serve as serve_http
+
+    click.echo(f"Serving on http://{host}:{port}")
+    serve_http(host, port, batch_window=batch_window, token=token)
+
+
+def _report_and_write(
+    valid: List["Validated"], invalid: List["Invalid"], *, partial: bool
+) -> None:
+    from buglog.ingest import write_validated
+
+    for lineno, message in invalid:
+        click.echo(f"line {lineno}: {message}", err=True)
+    if invalid and not partial:
+        raise click.ClickException(
+            f"{len(invalid)} invalid record(s), nothing was written"
+        )
+    paths = write_validated(valid)
+    click.echo(f"Saved {len(valid)} bug(s) into {len(paths)} file(s)")
+    if invalid:
+        raise click.ClickException(f"{len(invalid)} invalid record(s)")
+
+
+@main.command()
+@click.argument("bug_name")
+@click.argument("assignments", nargs=-1, metavar="[FIELD=VALUE]...")
+@click.option("--at", default="", help="When it happened (default: now).")
+def add(bug_name: str, assignments: Tuple[str, ...], at: str) -> None:
+    """Log a single bug without any prompts."""
+    from buglog.ingest import parse_assignments
+    from buglog.ingest import validate_rows
+
+    try:
+        fields = parse_assignments(assignments)
+    except ValueError as err:
+        raise click.BadParameter(str(err), param_hint="FIELD=VALUE")
+    record = {**fields, "bug": bug_name, "at": at}
+    valid, invalid = validate_rows([(1, record)])
+    _report_and_write(valid, invalid, partial=False)
+
+
+@main.command(name="import")
+@click.argument("input_file", type=click.File("r"), default="-")
+@click.option(
+    "--format",
+    "input_format",
+    type=click.Choice(["ndjson", "csv"]),
+    default="ndjson",
+    help="Format of the records.",
+)
+@click.option(
+    "--partial",
+    is_flag=True,
+    help="Save the valid records, even if some are invalid.",
+)
+@click.option(
+    "--jobs",
+    "-j",
+    type=click.IntRange(min=1),
+    default=1,
+    help="Number of worker processes validating the records.",
+)
+def import_(
+    input_file: TextIO, input_format: str, partial: bool, jobs: int
+) -> None:
+    """Log bugs read from the file (or the standard input).
+
+    Each record has the class name under the "bug" key,
+    optional time under the "at" key, and the fields under the rest.
+    """
+    from buglog.ingest import read_csv
+    from buglog.ingest import read_ndjson
+    from buglog.ingest import validate_rows
+
+    read = read_csv if input_format == "csv" else read_ndjson
+    valid, invalid = validate_rows(read(input_file), jobs=jobs)
+    _report_and_write(valid, invalid, partial=partial)
+
+
+@main.command()
+@click.option(
+    "--jobs",
+    "-j",
+    type=click.IntRange(min=1),
+    default=lambda: os.cpu_count() or 1,
+    show_default="number of CPUs",
+    help="Number of worker processes validating the records.",
+)
+def validate(jobs: int) -> None:
+    """Check logged bugs against the current config."""
+    from buglog.ingest import revalidate
+    from buglog.storage import iter_records
+
+    num_invalid = 0
+    for record, message in revalidate(iter_records(), jobs=jobs):
+        timestamp = record.timestamp.isoformat("_")
+        click.echo(f"{timestamp} {record.bug_name}: {message}")
+        num_invalid += 1
+    if num_invalid:
+        raise click.ClickException(f"{num_invalid} invalid record(s)")
+
+
+@main.command()
+@click.argument("bug_name")
+@click.argument("field")
+@click.option(
+    "--by",
+    type=click.Choice(["day", "week", "month"]),
+    default="day",
+    show_default=True,
+    help="Time buckets to aggregate over.",
+)
+@click.option(
+    "--agg",
+    type=click.Choice(["count", "sum", "mean", "min", "max"]),
+    default="sum",
+    show_default=True,
+    help="Aggregate of the field's values.",
+)
+@click.option(
+    "--since", type=click.DateTime(), help="Only bugs logged since then."
+)
+@click.option(
+    "--until", type=click.DateTime(), help="Only bugs logged before then."
+)
+@click.option(
+    "--rebuild",
+    is_flag=True,
+    help="Rebuild the index and its rollups from the logged bugs first.",
+)
+def stats(
+    bug_name: str,
+    field: str,
+    by: str,
+    agg: str,
+    since: Optional[datetime],
+    until: Optional[datetime],
+    rebuild: bool,
+) -> None:
+    """Aggregate numeric field of logged bugs over days, weeks or months.
+
+    The aggregates are served from rollups kept in the index,
+    unless --since or --until split the buckets.
+    """
+    from buglog.index import rebuild_index
+    from buglog.snapshot import load_snapshot
+    from buglog.stats import iter_stats
+    from buglog.stats import numeric_fields
+
+    if bug_name not in load_snapshot():
+        raise click.BadParameter(f"unknown bug {bug_name!r}")
+    if field not in numeric_fields(bug_name):
+        raise click.BadParameter(f"{field!r} is not a numeric field")
+    if rebuild:
+        rebuild_index()
+
+    for day, value in iter_stats(
+        bug_name, field, by=by, how=agg, since=since, until=until
+    ):
+        click.echo(f"{day.isoformat()}\t{value:g}")
 
 
 if __name__ == "__main__":
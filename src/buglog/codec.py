@@ -0,0 +1,286 @@
+import hashlib
+import itertools
+import json
+import struct
+import sys
+from array import array
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Sequence
+from typing import Tuple
+
+from buglog.snapshot import load_snapshot
+
+MAGIC = b"BUGB"
+# Magic, schema tag, length of the layout descriptor, number of records
+_HEADER = struct.Struct("<4s8sII")
+
+# Kinds of the fields: fixed-width ones are struct format characters,
+# strings are stored as UTF-8, anything else as JSON
+INTEGER = "q"
+NUMBER = "d"
+BOOLEAN = "?"
+STRING = "s"
+OTHER = "j"
+_FIXED_KINDS = (INTEGER, NUMBER, BOOLEAN)
+_SCHEMA_KINDS = {
+    "integer": INTEGER,
+    "number": NUMBER,
+    "boolean": BOOLEAN,
+    "string": STRING,
+}
+# Types of the values, which are encoded exactly
+_KIND_TYPES = {INTEGER: int, NUMBER: float, BOOLEAN: bool, STRING: str}
+
+Field = Tuple[str, str]
+
+
+class Layout:
+    """Binary layout of the records of a Bug class.
+
+    Each batch of records is laid out column-wise: bitmaps of nulls
+    and of integers held by number fields (which are stored as floats),
+    then the fixed-width fields of all the records (so that they are
+    decoded with a single :meth:`struct.Struct.iter_unpack`),
+    then the other fields column by column: lengths of the values
+    followed by the UTF-8 strings (or JSON for the non-scalar fields).
+
+    Parameters:
+        bug_name: Class name of the bug.
+        fields: Names and kinds of the fields, in order of definition.
+    """
+
+    def __init__(self, bug_name: str, fields: Sequence[Field]) -> None:
+        self.bug_name = bug_name
+        self.fields = tuple((name, kind) for name, kind in fields)
+        self.names = tuple(name for name, _ in self.fields)
+        self.fixed = tuple(
+            (i, name, kind)
+            for i, (name, kind) in enumerate(self.fields)
+            if kind in _FIXED_KINDS
+        )
+        self.variable = tuple(
+            (i, name, kind)
+            for i, (name, kind) in enumerate(self.fields)
+            if kind not in _FIXED_KINDS
+        )
+        self.row = struct.Struct("<" + "".join(k for _, _, k in self.fixed))
+        self.bitmap_size = (2 * len(self.fields) + 7) // 8
+        self.descriptor = json.dumps([bug_name, self.fields]).encode()
+        self.tag = hashlib.sha256(self.descriptor).digest()[:8]
+        # Fields' order of the decoded records, before reordering
+        self._decoded_names = tuple(
+            name for _, name, _ in self.fixed + self.variable
+        )
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Layout) and self.tag == other.tag
+
+    def __hash__(self) -> int:
+        return hash(self.tag)
+
+    def __repr__(self) -> str:
+        return f"Layout({self.bug_name!r}, {list(self.fields)!r})"
+
+    def encode(self, records: Iterable[Dict[str, Any]]) -> bytes:
+        """Encode a batch of records.
+
+        Parameters:
+            records: Records with exactly the layout's fields,
+                e.g. ``bug.dict()``.
+
+        Returns:
+            The encoded batch, tagged with the layout's hash.
+
+        Raises:
+            ValueError: A record does not fit the layout, i.e. its fields
+                differ, or a value is not of the field's type (so it would
+                not be decoded exactly).
+        """
+        bitmaps = bytearray()
+        fixed = bytearray()
+        lengths: List["array[int]"] = [array("I") for _ in self.variable]
+        blobs: List[List[bytes]] = [[] for _ in self.variable]
+        count = 0
+        zero = {INTEGER: 0, NUMBER: 0.0, BOOLEAN: False}
+        for record in records:
+            if len(record) != len(self.names) or not all(
+                name in record for name in self.names
+            ):
+                raise ValueError(
+                    f"fields {sorted(record)} do not fit {self.bug_name}"
+                )
+            # Bit i marks a null, bit n + i an integer number
+            flags = 0
+            values = []
+            for i, name, kind in self.fixed:
+                value = record[name]
+                if value is None:
+                    flags |= 1 << i
+                    value = zero[kind]
+                elif kind == NUMBER and type(value) is int:
+                    if int(float(value)) != value:
+                        raise ValueError(f"{name}: {value!r} is not a float")
+                    flags |= 1 << (len(self.fields) + i)
+                elif type(value) is not _KIND_TYPES[kind]:
+                    raise ValueError(f"{name}: {value!r} is not of {kind!r}")
+                values.append(value)
+            try:
+                fixed += self.row.pack(*values)
+            except struct.error as err:
+                raise ValueError(str(err))
+            for j, (i, name, kind) in enumerate(self.variable):
+                value = record[name]
+                if value is None:
+                    flags |= 1 << i
+                    raw = b""
+                elif kind == STRING:
+                    if type(value) is not str:
+                        raise ValueError(f"{name}: {value!r} is not of 's'")
+                    raw = value.encode()
+                else:
+                    raw = json.dumps(value).encode()
+                lengths[j].append(len(raw))
+                blobs[j].append(raw)
+            bitmaps += flags.to_bytes(self.bitmap_size, "little")
+            count += 1
+
+        header = _HEADER.pack(MAGIC, self.tag, len(self.descriptor), count)
+        chunks = [header, self.descriptor, bytes(bitmaps), bytes(fixed)]
+        for column_lengths, column_blobs in zip(lengths, blobs):
+            if sys.byteorder != "little":
+                column_lengths.byteswap()
+            chunks.append(column_lengths.tobytes())
+            chunks.extend(column_blobs)
+        return b"".join(chunks)
+
+    def _decode_column(
+        self, kind: str, payload: bytes, offset: int, count: int
+    ) -> Tuple[List[Any], int]:
+        """Decode a column of strings, returning the offset past it."""
+        lengths = array("I")
+        lengths.frombytes(payload[offset : offset + count * lengths.itemsize])
+        if sys.byteorder != "little":
+            lengths.byteswap()
+        offset += count * lengths.itemsize
+        end = offset + sum(lengths)
+        bounds = list(itertools.accumulate(lengths, initial=0))
+        blob = payload[offset:end]
+        if kind == STRING:
+            text = blob.decode()
+            # ASCII text is sliced at the same offsets as its bytes
+            if len(text) != len(blob):
+                strings = [
+                    str(blob[a:b], "utf-8") for a, b in zip(bounds, bounds[1:])
+                ]
+                return strings, end
+            return [text[a:b] for a, b in zip(bounds, bounds[1:])], end
+        values: List[Any] = [
+            json.loads(blob[a:b]) if b > a else None
+            for a, b in zip(bounds, bounds[1:])
+        ]
+        return values, end
+
+    def _decode(self, payload: bytes, offset: int, count: int) -> List[Any]:
+        bitmaps_end = offset + count * self.bitmap_size
+        fixed_end = bitmaps_end + count * self.row.size
+        bitmaps = payload[offset:bitmaps_end]
+        rows: Iterable[Tuple[Any, ...]] = itertools.repeat((), count)
+        if self.fixed:
+            rows = self.row.iter_unpack(payload[bitmaps_end:fixed_end])
+        names = self._decoded_names
+
+        if not self.variable:
+            records = [dict(zip(names, row)) for row in rows]
+        else:
+            columns = []
+            offset = fixed_end
+            for _, _, kind in self.variable:
+                column, offset = self._decode_column(
+                    kind, payload, offset, count
+                )
+                columns.append(column)
+            records = [
+                dict(zip(names, row + tuple(values)))
+                for row, *values in zip(rows, *columns)
+            ]
+
+        # Nulls and integer numbers are rare, so they are patched afterwards
+        if any(bitmaps):
+            size = self.bitmap_size
+            num_fields = len(self.fields)
+            for n, record in enumerate(records):
+                flags = int.from_bytes(
+                    bitmaps[n * size : (n + 1) * size], "little"
+                )
+                if not flags:
+                    continue
+                for i, name in enumerate(self.names):
+                    if flags >> i & 1:
+                        record[name] = None
+                    elif flags >> (num_fields + i) & 1:
+                        record[name] = int(record[name])
+
+        if names != self.names:
+            records = [{name: r[name] for name in self.names} for r in records]
+        return records
+
+
+_layouts: Dict[bytes, Layout] = {}
+
+
+def _layout_of_descriptor(descriptor: bytes) -> Layout:
+    if descriptor not in _layouts:
+        bug_name, fields = json.loads(descriptor)
+        _layouts[descriptor] = Layout(
+            bug_name, [(name, kind) for name, kind in fields]
+        )
+    return _layouts[descriptor]
+
+
+def layout_for(bug_name: str) -> Layout:
+    """Derive binary layout of a Bug class from its JSON schema.
+
+    Parameters:
+        bug_name: Class name of the bug.
+
+    Returns:
+        The layout.
+    """
+    properties = load_snapshot()[bug_name]["properties"]
+    fields = [
+        (name, _SCHEMA_KINDS.get(prop.get("type", ""), OTHER))
+        for name, prop in properties.items()
+    ]
+    return _layout_of_descriptor(json.dumps([bug_name, fields]).encode())
+
+
+def decode(payload: bytes) -> Tuple[Layout, List[Dict[str, Any]]]:
+    """Decode a batch of records.
+
+    The batch carries its layout, so it is decoded even after
+    the Bug class has changed. Whether it still matches the class
+    is told by comparing the layout with :func:`layout_for`.
+
+    Parameters:
+        payload: Batch encoded with :meth:`Layout.encode`.
+
+    Returns:
+        The batch's layout and the records.
+
+    Raises:
+        ValueError: The payload is not an encoded batch.
+    """
+    try:
+        magic, tag, descriptor_size, count = _HEADER.unpack_from(payload)
+    except struct.error as err:
+        raise ValueError(str(err))
+    if magic != MAGIC:
+        raise ValueError("not an encoded batch of records")
+    offset = _HEADER.size + descriptor_size
+    layout = _layout_of_descriptor(bytes(payload[_HEADER.size : offset]))
+    if layout.tag != tag:
+        raise ValueError("layout does not match its tag")
+    return layout, layout._decode(payload, offset, count)
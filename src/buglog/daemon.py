@@ -0,0 +1,479 @@
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+from contextlib import contextmanager
+from contextlib import suppress
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+
+from buglog.bootstrap import cache_dir
+from buglog.bootstrap import config_path
+from buglog.bootstrap import data_dir
+from buglog.parse_rst import RstSyntaxError
+from buglog.trace import span
+
+SOCKET_NAME = "daemon.sock"
+# Bumped whenever the requests or the responses change
+PROTOCOL = 1
+CONNECT_TIMEOUT = 1.0
+WATCH_INTERVAL = 1.0
+
+# Class name and fields of a bug
+BugData = Tuple[str, Dict[str, Any]]
+# Class name and fields of a bug, and the name of the file to dump it into
+SaveItem = Tuple[str, Dict[str, Any], str]
+
+
+class Parsed(NamedTuple):
+    """Filled in template, parsed into bugs.
+
+    Attributes:
+        bugs: Class names and fields of the valid bugs.
+        errors: Messages of the validation errors, one per field.
+    """
+
+    bugs: List[BugData]
+    errors: List[str]
+
+
+class DaemonError(RuntimeError):
+    """The daemon failed to serve a request."""
+
+
+class DaemonLostError(DaemonError):
+    """The daemon went away while serving a request,
+    which may or may not have been done."""
+
+
+def socket_path() -> Path:
+    """Get path to the daemon's socket.
+
+    Returns:
+        The ``${XDG_CACHE_HOME:-${HOME}/.cache}/buglog/daemon.sock`` path.
+    """
+    return cache_dir() / SOCKET_NAME
+
+
+def _identity() -> Dict[str, Any]:
+    """What a daemon has to serve, to be used by this process."""
+    from buglog import __version__
+
+    return {
+        "protocol": PROTOCOL,
+        "version": __version__,
+        "config": str(config_path()),
+        "data": str(data_dir()),
+    }
+
+
+def parse_text(text: str) -> Parsed:
+    """Parse filled in template into bugs and validation errors.
+
+    Parameters:
+        text: The filled in template.
+
+    Returns:
+        The bugs and the messages of the errors.
+
+    Raises:
+        RstSyntaxError: The text could not be parsed.
+    """
+    from docutils.utils import SystemMessage
+    from pydantic.error_wrappers import ValidationError
+    from pydantic.main import ModelMetaclass
+
+    from buglog.parse_rst import rst_to_bugs
+    from buglog.utils import Bug
+
+    try:
+        items = list(rst_to_bugs(text))
+    except SystemMessage as err:
+        raise RstSyntaxError(None, str(err)) from None
+
+    parsed = Parsed(bugs=[], errors=[])
+    for item in items:
+        if isinstance(item, Bug):
+            parsed.bugs.append((item.__class__.__name__, item.dict()))
+        elif isinstance(item, ValidationError):
+            model = item.model
+            assert isinstance(model, ModelMetaclass)
+            title = model.schema()["title"]
+            for sub_err in item.errors():
+                (loc,) = sub_err["loc"]
+                parsed.errors.append(f"{title}.{loc}: {sub_err['msg']}")
+    return parsed
+
+
+class Session:
+    """Operations needed to log bugs interactively, run in this process.
+
+    See :class:`RemoteSession` for the ones served by the daemon.
+    """
+
+    def picker_lines(self) -> List[str]:
+        """Get lines of the bugs to be picked from with fzf."""
+        from buglog.fuzzy import picker_lines
+
+        return picker_lines()
+
+    def template(self, bug_names: Iterable[str]) -> str:
+        """Create template from the picked bugs."""
+        from buglog.parse_rst import bugs_to_rst
+
+        return bugs_to_rst(bug_names)
+
+    def parse(self, text: str) -> Parsed:
+        """Parse filled in template, see :func:`parse_text`."""
+        return parse_text(text)
+
+    def save(self, items: Iterable[SaveItem]) -> int:
+        """Save parsed bugs, returning the number of written files."""
+        from buglog.dump import save_records
+
+        return save_records((data, file_name) for _, data, file_name in items)
+
+    def close(self) -> None:
+        pass
+
+
+class RemoteSession(Session):
+    """Operations needed to log bugs interactively, served by the daemon.
+
+    If the daemon goes away, the rest of the session is served
+    by this process, except for a save which the daemon may have done.
+
+    Parameters:
+        sock: Socket connected to the daemon.
+    """
+
+    def __init__(self, sock: socket.socket) -> None:
+        self._sock = sock
+        self._file = sock.makefile("rwb")
+        self._local: Optional[Session] = None
+
+    def call(self, op: str, **args: Any) -> Any:
+        """Send request to the daemon and wait for the response.
+
+        Parameters:
+            op: Name of the operation.
+            args: Arguments of the operation.
+
+        Returns:
+            Result of the operation.
+
+        Raises:
+            RstSyntaxError: The daemon could not parse the template.
+            DaemonLostError: The daemon went away after getting the request.
+            DaemonError: The request failed, or could not be sent.
+        """
+        request = json.dumps({"op": op, "args": args}).encode() + b"\n"
+        try:
+            self._file.write(request)
+            self._file.flush()
+        except (OSError, ValueError) as err:
+            raise DaemonError(f"lost connection to the daemon: {err}")
+        try:
+            line = self._file.readline()
+        except OSError as err:
+            raise DaemonLostError(f"lost connection to the daemon: {err}")
+        if not line:
+            raise DaemonLostError("the daemon closed the connection")
+        response = json.loads(line)
+        if "error" in response:
+            error = response["error"]
+            if error["type"] == RstSyntaxError.__name__:
+                raise RstSyntaxError(error["lineno"], error["message"])
+            raise DaemonError(f"{error['type']}: {error['message']}")
+        return response["result"]
+
+    def _fall_back(self, err: DaemonError) -> Session:
+        """Serve the rest of the session in this process."""
+        if self._local is None:
+            print(f"{err}, continuing without the daemon", file=sys.stderr)
+            self.close()
+            self._local = Session()
+        return self._local
+
+    def picker_lines(self) -> List[str]:
+        try:
+            lines: List[str] = self.call("picker_lines")
+        except DaemonError as err:
+            return self._fall_back(err).picker_lines()
+        return lines
+
+    def template(self, bug_names: Iterable[str]) -> str:
+        bug_names = list(bug_names)
+        try:
+            text: str = self.call("template", bug_names=bug_names)
+        except DaemonError as err:
+            return self._fall_back(err).template(bug_names)
+        return text
+
+    def parse(self, text: str) -> Parsed:
+        try:
+            result = self.call("parse", text=text)
+        except DaemonError as err:
+            return self._fall_back(err).parse(text)
+        return Parsed(
+            bugs=[(name, data) for name, data in result["bugs"]],
+            errors=result["errors"],
+        )
+
+    def save(self, items: Iterable[SaveItem]) -> int:
+        items = list(items)
+        try:
+            num_files: int = self.call("save", items=items)
+        except DaemonLostError:
+            # Saving again could log the bugs twice
+            raise
+        except DaemonError as err:
+            return self._fall_back(err).save(items)
+        return num_files
+
+    def close(self) -> None:
+        with suppress(OSError):
+            self._file.close()
+        self._sock.close()
+
+
+def connect() -> Optional[RemoteSession]:
+    """Connect to the daemon, if it is running.
+
+    Parameters of the daemon (version, config and data folder)
+    are checked against this process' ones.
+
+    Returns:
+        Session with the daemon, or ``None`` if no matching daemon
+        is listening on :func:`socket_path`.
+    """
+    path = socket_path()
+    if not path.exists():
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(CONNECT_TIMEOUT)
+    session = RemoteSession(sock)
+    try:
+        sock.connect(str(path))
+        identity = session.call("ping")
+        sock.settimeout(None)
+    except (OSError, ValueError, DaemonError):
+        session.close()
+        return None
+    if identity != _identity():
+        session.close()
+        return None
+    return session
+
+
+@contextmanager
+def open_session() -> Iterator[Session]:
+    """Open session with the daemon, falling back to this process.
+
+    Returns:
+        Context manager of the session.
+    """
+    with span("connect to daemon"):
+        session = connect() or Session()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def _config_stamp() -> Optional[Tuple[int, int]]:
+    try:
+        stat = config_path().stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: "Daemon"
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            response: Dict[str, Any]
+            try:
+                request = json.loads(line)
+                result = self.server.dispatch(
+                    request["op"], request.get("args", {})
+                )
+                response = {"result": result}
+            except RstSyntaxError as err:
+                response = {
+                    "error": {
+                        "type": RstSyntaxError.__name__,
+                        "lineno": err.lineno,
+                        "message": err.reason,
+                    }
+                }
+            except Exception as err:
+                response = {
+                    "error": {"type": type(err).__name__, "message": str(err)}
+                }
+            payload = json.dumps(response, default=str).encode() + b"\n"
+            self.wfile.write(payload)
+            self.wfile.flush()
+
+
+class Daemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Server keeping the Bug registry, schemas and templates warm.
+
+    The config is watched for changes, which are loaded
+    before the next request comes in. Requests are served
+    one at a time, as the registry is not thread safe.
+
+    Parameters:
+        path: Path to the socket to listen on.
+        watch_interval: Seconds between checks of the config.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self, path: Path, *, watch_interval: float = WATCH_INTERVAL
+    ) -> None:
+        super().__init__(str(path), _Handler)
+        self.watch_interval = watch_interval
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._lines: List[str] = []
+
+    def warm_up(self) -> None:
+        """Import the config, render the picker and the templates,
+        and sync the index of the data folder."""
+        from contextlib import closing
+
+        from buglog.index import connect as connect_index
+        from buglog.index import sync_index
+        from buglog.parse_rst import bugs_to_rst
+        from buglog.snapshot import load_snapshot
+        from buglog.utils import get_bug_subclasses
+
+        with self._lock:
+            self._refresh()
+            get_bug_subclasses()
+            bugs_to_rst(load_snapshot())
+            with closing(connect_index()) as conn:
+                sync_index(conn)
+
+    def _refresh(self) -> None:
+        """Reload the schemas and the picker if the config has changed."""
+        from buglog.fuzzy import picker_lines
+
+        stamp = _config_stamp()
+        if stamp == self._stamp and stamp is not None:
+            return
+        self._lines = picker_lines()
+        self._stamp = _config_stamp()
+
+    def _watch(self) -> None:
+        failed_stamp = None
+        while not self._stopped.wait(self.watch_interval):
+            stamp = _config_stamp()
+            if stamp in (self._stamp, failed_stamp):
+                continue
+            try:
+                self.warm_up()
+            except Exception as err:
+                # Reported once, the clients get the error on every request
+                failed_stamp = stamp
+                print(f"Could not load the config: {err}", file=sys.stderr)
+
+    def serve_forever(self, poll_interval: float = 0.5) -> None:
+        watcher = threading.Thread(target=self._watch, daemon=True)
+        watcher.start()
+        try:
+            super().serve_forever(poll_interval)
+        finally:
+            self._stopped.set()
+            watcher.join()
+
+    def server_close(self) -> None:
+        super().server_close()
+        with suppress(FileNotFoundError):
+            os.unlink(str(self.server_address))
+
+    def dispatch(self, op: str, args: Dict[str, Any]) -> Any:
+        """Serve a request.
+
+        Parameters:
+            op: Name of the operation.
+            args: Arguments of the operation.
+
+        Returns:
+            Result of the operation, to be sent as JSON.
+        """
+        handler = getattr(self, f"_op_{op}", None)
+        if handler is None:
+            raise ValueError(f"unknown operation {op!r}")
+        with self._lock:
+            self._refresh()
+            return handler(**args)
+
+    def _op_ping(self) -> Dict[str, Any]:
+        return _identity()
+
+    def _op_picker_lines(self) -> List[str]:
+        return self._lines
+
+    def _op_template(self, bug_names: List[str]) -> str:
+        from buglog.parse_rst import bugs_to_rst
+
+        return bugs_to_rst(bug_names)
+
+    def _op_parse(self, text: str) -> Dict[str, Any]:
+        return parse_text(text)._asdict()
+
+    def _op_save(self, items: List[SaveItem]) -> int:
+        from buglog.dump import save_records
+        from buglog.utils import str_to_bug
+
+        # Fields went through JSON, so they are validated again
+        return save_records(
+            [
+                (str_to_bug(bug_name)(**data).dict(), file_name)
+                for bug_name, data, file_name in items
+            ]
+        )
+
+
+def serve(*, watch_interval: float = WATCH_INTERVAL) -> None:
+    """Run the daemon until interrupted.
+
+    Parameters:
+        watch_interval: Seconds between checks of the config.
+
+    Raises:
+        DaemonError: A daemon is already listening on the socket.
+    """
+    path = socket_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.exists():
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(str(path))
+        except OSError:
+            # Left behind by a daemon which was killed
+            path.unlink()
+        else:
+            raise DaemonError(f"a daemon is already listening on {path}")
+        finally:
+            probe.close()
+
+    with Daemon(path, watch_interval=watch_interval) as daemon:
+        daemon.warm_up()
+        with suppress(KeyboardInterrupt):
+            daemon.serve_forever()
@@ -1,28 +1,91 @@
-import json
-from contextlib import suppress
+from collections import defaultdict
 from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Tuple
+from typing import TYPE_CHECKING
 from typing import Union
 
-from blessings import Terminal
-from xdg import XDG_DATA_HOME
+from buglog.bootstrap import data_dir
+from buglog.storage import commit
+from buglog.trace import span
 
-from buglog.utils import Bug
+if TYPE_CHECKING:
+    from buglog.utils import Bug
 
 
-def dump_bug(bug: Bug, file_name: Union[Path, str]) -> None:
-    path = XDG_DATA_HOME / __package__ / file_name
+def save_records(
+    items: Iterable[Tuple[Dict[str, Any], Union[Path, str]]],
+) -> int:
+    """Save bugs' fields into their dump files as a single transaction.
 
-    prev_dumps = []
-    with suppress(FileNotFoundError):
-        with open(path, "r") as fin:
-            prev_dumps = json.load(fin)
+    The index, with its rollups, is updated with the written files.
 
-    with open(path, "w") as fout:
-        json.dump(prev_dumps + [bug.dict()], fout)
+    Parameters:
+        items: Pairs of the fields of a bug (as in ``bug.dict()``)
+            and the name of the file to dump it into.
+
+    Returns:
+        Number of the written files.
+    """
+    from buglog.index import data_stamp
+    from buglog.index import index_written
+
+    batch: Dict[Union[Path, str], List[Dict[str, Any]]] = defaultdict(list)
+    for data, file_name in items:
+        batch[file_name].append(data)
+    if not batch:
+        return 0
+
+    stamp = data_stamp()
+    with span("commit", files=len(batch)):
+        paths = commit(batch)
+    with span("update index"):
+        index_written(paths, stamp=stamp)
+    return len(batch)
+
+
+def print_saved(bug_names: Iterable[str], num_files: int) -> None:
+    """Report saved bugs to the user.
+
+    Parameters:
+        bug_names: Class names of the saved bugs.
+        num_files: Number of the files they were saved into.
+    """
+    from blessings import Terminal
 
     t = Terminal()
-    verb = "Added" if prev_dumps else "Wrote"
     print(
-        t.bold_green(f"{verb} {bug.__class__.__name__} into a file: ")
-        + t.on_bright_black(f"{path}")
+        t.bold_green(
+            f"Saved {', '.join(bug_names)} into {num_files} file(s) at: "
+        )
+        + t.on_bright_black(f"{data_dir()}")
+    )
+
+
+def dump_bugs(items: Iterable[Tuple["Bug", Union[Path, str]]]) -> None:
+    """Save bugs into their dump files as a single transaction.
+
+    The index, with its rollups, is updated with the written files.
+
+    Parameters:
+        items: Pairs of a bug and the name of the file to dump it into.
+    """
+    items = list(items)
+    num_files = save_records(
+        (bug.dict(), file_name) for bug, file_name in items
     )
+    if num_files:
+        print_saved([bug.__class__.__name__ for bug, _ in items], num_files)
+
+
+def dump_bug(bug: "Bug", file_name: Union[Path, str]) -> None:
+    """Save a bug into a dump file.
+
+    Parameters:
+        bug: The bug to be saved.
+        file_name: Name of the file, relative to the data folder.
+    """
+    dump_bugs([(bug, file_name)])
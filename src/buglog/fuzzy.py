@@ -1,37 +1,95 @@
+import shlex
 from contextlib import suppress
 from subprocess import CalledProcessError
 from subprocess import check_output
-from typing import Iterator
+from typing import Iterable
 from typing import List
-from typing import Type
+from typing import Optional
 
 from xdg import XDG_DATA_HOME
 
 from buglog.bootstrap import ensure_fzf
-from buglog.utils import Bug
-from buglog.utils import get_bug_subclasses
-from buglog.utils import str_to_bug
+from buglog.bootstrap import latest_dir
+from buglog.snapshot import load_snapshot
+from buglog.trace import span
 
 
-def fuzzy_pick_bug() -> List[Type[Bug]]:
-    def fzf_input() -> Iterator[str]:
-        for bug_class in get_bug_subclasses():
-            schema = bug_class.schema()
-            title = schema["title"]
-            description = schema.get("description", title)
-            yield f"{title} {description}"
+def picker_lines() -> List[str]:
+    """Get lines of the bugs to be picked from.
 
-    def _parse_item(line: str) -> Type[Bug]:
+    Returns:
+        Lines of a Bug class name followed by its description.
+    """
+    lines = []
+    for bug_name, schema in load_snapshot().items():
+        title = schema["title"]
+        description = schema.get("description", title)
+        lines.append(f"{bug_name} {description}")
+    return lines
+
+
+# Prints the latest records as "23h ago  2020-07-21 08:00  dose=10, num=1"
+_PREVIEW_AWK = """\
+BEGIN { FS = "\\t" }
+{
+    s = now - $1
+    if (s < 0) ago = "ahead"
+    else if (s < 3600) ago = int(s / 60) "m ago"
+    else if (s < 86400) ago = int(s / 3600) "h ago"
+    else ago = int(s / 86400) "d ago"
+    printf "%-8s  %s  %s\\n", ago, $2, $3
+}
+"""
+
+
+def preview_command() -> str:
+    """Get shell command of the fzf preview of a bug.
+
+    The preview prints the latest records of the bug, as rendered
+    into :func:`~buglog.bootstrap.latest_dir` on every save,
+    so it runs in a few milliseconds, without starting Python.
+
+    Returns:
+        Command, with ``{1}`` to be replaced by fzf with the class name.
+    """
+    path = shlex.quote(str(latest_dir())) + "/{1}.tsv"
+    awk = shlex.quote(_PREVIEW_AWK)
+    return (
+        f'awk -v now="$(date +%s)" {awk} {path} 2>/dev/null'
+        " || echo 'Not logged yet'"
+    )
+
+
+def fuzzy_pick_bug(lines: Optional[Iterable[str]] = None) -> List[str]:
+    """Let the user pick bugs with fzf.
+
+    Parameters:
+        lines: Lines to pick from, as given by :func:`picker_lines`
+            (which is called if they are not given).
+
+    Returns:
+        Class names of the picked bugs.
+    """
+
+    def _parse_item(line: str) -> str:
         bug_name, _ = line.split(" ", 1)
-        return str_to_bug(bug_name)
+        return bug_name
 
-    ensure_fzf()
+    with span("ensure fzf"):
+        ensure_fzf()
 
-    input_str = "\n".join(fzf_input())
+    input_str = "\n".join(picker_lines() if lines is None else lines)
     fzf = XDG_DATA_HOME / "buglog" / "fzf"
-    fzf_cmd = [str(fzf), "--multi", "--with-nth", "2.."]
+    fzf_cmd = [
+        str(fzf),
+        "--multi",
+        "--with-nth",
+        "2..",
+        "--preview",
+        preview_command(),
+    ]
 
-    with suppress(CalledProcessError):
+    with suppress(CalledProcessError), span("fzf"):
         stdout = check_output(fzf_cmd, input=input_str, text=True)
         return [_parse_item(line) for line in stdout.splitlines()]
 
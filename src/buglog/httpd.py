@@ -0,0 +1,313 @@
+import asyncio
+import hmac
+import json
+import time
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http import HTTPStatus
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+from buglog.ingest import validate_chunk
+from buglog.ingest import Validated
+from buglog.ingest import write_validated
+
+DEFAULT_PORT = 8421
+BATCH_WINDOW = 0.05
+MAX_BODY_SIZE = 1024 * 1024
+
+# Upper bounds of the histograms' buckets
+LATENCY_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+BATCH_SIZE_BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# Status and the JSON payload of a response
+Response = Tuple[HTTPStatus, Any]
+# Records of a request, and the future resolved once they are written
+Pending = Tuple[List[Validated], "asyncio.Future[None]"]
+
+
+class Histogram:
+    """Counts of the values falling into buckets.
+
+    Parameters:
+        bounds: Upper bounds (inclusive) of the buckets, ascending.
+            Values above the last bound fall into the ``+Inf`` bucket.
+
+    Example:
+        >>> histogram = Histogram([1, 10])
+        >>> for value in [0.5, 1, 3, 20]:
+        ...     histogram.add(value)
+        >>> histogram.as_dict()
+        {'1': 2, '10': 1, '+Inf': 1}
+    """
+
+    def __init__(self, bounds: Sequence[float]) -> None:
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+
+    def add(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+
+    def as_dict(self) -> Dict[str, int]:
+        labels = [f"{bound:g}" for bound in self.bounds] + ["+Inf"]
+        return dict(zip(labels, self.counts))
+
+
+class Stats:
+    """Counters of the served requests and the group commits."""
+
+    def __init__(self) -> None:
+        self.started = time.monotonic()
+        self.requests = 0
+        self.rejected = 0
+        self.records = 0
+        self.batches = 0
+        self.request_latency = Histogram(LATENCY_BOUNDS_MS)
+        self.commit_latency = Histogram(LATENCY_BOUNDS_MS)
+        self.batch_size = Histogram(BATCH_SIZE_BOUNDS)
+
+    def as_dict(self) -> Dict[str, Any]:
+        uptime = time.monotonic() - self.started
+        return {
+            "uptime": uptime,
+            "requests": self.requests,
+            "rejected": self.rejected,
+            "records": self.records,
+            "batches": self.batches,
+            "records_per_second": self.records / uptime if uptime else 0.0,
+            "request_latency_ms": self.request_latency.as_dict(),
+            "commit_latency_ms": self.commit_latency.as_dict(),
+            "batch_size": self.batch_size.as_dict(),
+        }
+
+
+class IngestServer:
+    """HTTP server logging the bugs posted as JSON.
+
+    ``POST /bugs`` takes a record, or an array of them, in the format
+    of ``bug import``: the class name under the ``bug`` key,
+    the optional time under the ``at`` key and the fields under the rest.
+    The records of a request are saved all or none. ``GET /stats``
+    reports the throughput and the latencies.
+
+    Records are validated in a worker thread, not to stall the other
+    connections (a single one, as the Bug registry is not thread safe).
+    Valid records are queued for a single writer task, which gathers
+    the records of the concurrent requests over a batch window,
+    and saves them all in one commit (so with one flush to the disk).
+
+    Parameters:
+        batch_window: Seconds to gather the records for a commit.
+        token: If given, requests have to carry
+            an ``Authorization: Bearer <token>`` header.
+    """
+
+    def __init__(
+        self,
+        *,
+        batch_window: float = BATCH_WINDOW,
+        token: Optional[str] = None,
+    ) -> None:
+        self.batch_window = batch_window
+        self.token = token
+        self.stats = Stats()
+        self._queue: "Optional[asyncio.Queue[Pending]]" = None
+        self._writer: "Optional[asyncio.Task[None]]" = None
+        self._validator = ThreadPoolExecutor(1, "buglog-validate")
+
+    async def start(
+        self, host: str = "127.0.0.1", port: int = DEFAULT_PORT
+    ) -> asyncio.Server:
+        """Start the writer task and listen for requests.
+
+        Parameters:
+            host: Address to listen on.
+            port: Port to listen on (0 picks a free one).
+
+        Returns:
+            The listening server.
+        """
+        from buglog.utils import get_bug_subclasses
+
+        # Import the config before the first request comes in
+        get_bug_subclasses()
+        self._queue = asyncio.Queue()
+        self._writer = asyncio.ensure_future(self._write_batches())
+        return await asyncio.start_server(self._serve_connection, host, port)
+
+    async def stop(self) -> None:
+        """Stop the writer task, once the queued records are written."""
+        if self._queue is None or self._writer is None:
+            return
+        await self._queue.join()
+        self._writer.cancel()
+        try:
+            await self._writer
+        except asyncio.CancelledError:
+            pass
+        self._validator.shutdown()
+
+    async def _write_batches(self) -> None:
+        assert self._queue is not None
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            await asyncio.sleep(self.batch_window)
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            records = [record for valid, _ in batch for record in valid]
+            started = time.perf_counter()
+            try:
+                await loop.run_in_executor(None, write_validated, records)
+            except Exception as err:
+                for _, future in batch:
+                    # Requests cancelled while waiting are done already
+                    if not future.done():
+                        future.set_exception(err)
+                    self._queue.task_done()
+                continue
+            elapsed = time.perf_counter() - started
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(None)
+                self._queue.task_done()
+
+            self.stats.batches += 1
+            self.stats.records += len(records)
+            self.stats.batch_size.add(len(records))
+            self.stats.commit_latency.add(elapsed * 1000)
+
+    async def _save(self, body: bytes) -> Response:
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return HTTPStatus.BAD_REQUEST, {"error": "not JSON"}
+        records = payload if isinstance(payload, list) else [payload]
+
+        loop = asyncio.get_running_loop()
+        valid, invalid = await loop.run_in_executor(
+            self._validator,
+            validate_chunk,
+            list(enumerate(records, start=1)),
+            datetime.now(),
+        )
+        if invalid:
+            errors = [{"record": n, "message": msg} for n, msg in invalid]
+            return HTTPStatus.UNPROCESSABLE_ENTITY, {"errors": errors}
+
+        assert self._queue is not None
+        future = loop.create_future()
+        self._queue.put_nowait((valid, future))
+        try:
+            await future
+        except Exception as err:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(err)}
+        return HTTPStatus.OK, {"saved": len(valid)}
+
+    async def _respond(
+        self, method: str, path: str, headers: Dict[str, str], body: bytes
+    ) -> Response:
+        if self.token is not None:
+            expected = f"Bearer {self.token}".encode()
+            given = headers.get("authorization", "").encode()
+            if not hmac.compare_digest(given, expected):
+                return HTTPStatus.UNAUTHORIZED, {"error": "invalid token"}
+        routes = {("POST", "/bugs"), ("GET", "/stats")}
+        if (method, path) not in routes:
+            if path in {p for _, p in routes}:
+                return HTTPStatus.METHOD_NOT_ALLOWED, {"error": method}
+            return HTTPStatus.NOT_FOUND, {"error": path}
+        if path == "/stats":
+            return HTTPStatus.OK, self.stats.as_dict()
+        return await self._save(body)
+
+    async def _serve_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                started = time.perf_counter()
+                method, target, version = request_line.decode().split()
+                path = target.split("?", 1)[0]
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                size = int(headers.get("content-length", 0))
+                if size > MAX_BODY_SIZE:
+                    status, payload = HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {
+                        "error": f"body is over {MAX_BODY_SIZE} bytes"
+                    }
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(size)
+                    status, payload = await self._respond(
+                        method, path, headers, body
+                    )
+                    keep_alive = version == "HTTP/1.1" and (
+                        headers.get("connection", "").lower() != "close"
+                    )
+
+                content = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                    "Content-Type: application/json\r\n"
+                    f"Content-Length: {len(content)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}"
+                    "\r\n\r\n".encode() + content
+                )
+                await writer.drain()
+
+                if path == "/bugs":
+                    self.stats.requests += 1
+                    if status != HTTPStatus.OK:
+                        self.stats.rejected += 1
+                    elapsed = time.perf_counter() - started
+                    self.stats.request_latency.add(elapsed * 1000)
+                if not keep_alive:
+                    break
+        except (ValueError, ConnectionError, asyncio.IncompleteReadError):
+            # Malformed request, or the client went away
+            pass
+        finally:
+            writer.close()
+
+
+def serve(
+    host: str = "127.0.0.1",
+    port: int = DEFAULT_PORT,
+    *,
+    batch_window: float = BATCH_WINDOW,
+    token: Optional[str] = None,
+) -> None:
+    """Run the ingestion server until interrupted.
+
+    See :class:`IngestServer` for the parameters.
+    """
+
+    async def _serve() -> None:
+        server = IngestServer(batch_window=batch_window, token=token)
+        listening = await server.start(host, port)
+        try:
+            async with listening:
+                await listening.serve_forever()
+        finally:
+            await server.stop()
+
+    try:
+        asyncio.run(_serve())
+    except KeyboardInterrupt:
+        pass
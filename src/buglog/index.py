@@ -0,0 +1,540 @@
+import itertools
+import json
+import os
+import re
+import sqlite3
+from contextlib import closing
+from contextlib import suppress
+from datetime import date
+from datetime import datetime
+from datetime import timedelta
+from pathlib import Path
+from typing import Any
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+from buglog.bootstrap import cache_dir
+from buglog.bootstrap import data_dir
+from buglog.bootstrap import latest_dir
+from buglog.segments import iter_segment_files
+from buglog.segments import read_segment
+from buglog.segments import recover
+from buglog.segments import SEGMENT_SUFFIX
+from buglog.segments import segments_dir
+from buglog.storage import iter_dump_files
+from buglog.storage import parse_file_name
+from buglog.storage import read_file
+from buglog.storage import Record
+from buglog.storage import roll_back
+
+INDEX_NAME = "index.sqlite3"
+# Number of the latest records of each Bug class, for the picker's preview
+LATEST_COUNT = 5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    name TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS records (
+    file TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    bug_name TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS records_by_bug ON records (bug_name, timestamp);
+CREATE INDEX IF NOT EXISTS records_by_time ON records (timestamp);
+CREATE INDEX IF NOT EXISTS records_by_file ON records (file);
+CREATE TABLE IF NOT EXISTS rollups (
+    bug_name TEXT NOT NULL,
+    field TEXT NOT NULL,
+    granularity TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    sum REAL NOT NULL,
+    min REAL NOT NULL,
+    max REAL NOT NULL,
+    PRIMARY KEY (bug_name, field, granularity, bucket)
+);
+CREATE TABLE IF NOT EXISTS state (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+# Bumped whenever derived tables have to be rebuilt from the records
+_VERSION = 2
+
+GRANULARITIES = ("day", "week", "month")
+
+# Comparison operators of field predicates, longest first
+_OPERATORS = ("<=", ">=", "!=", "=", "<", ">")
+_PREDICATE_RE = re.compile(r"^(\w+)(%s)(.*)$" % "|".join(_OPERATORS))
+
+Predicate = Tuple[str, str, Any]
+
+
+def parse_predicate(text: str) -> Predicate:
+    """Parse field predicate of a query.
+
+    Example:
+        >>> parse_predicate("dose>=10")
+        ('dose', '>=', 10)
+        >>> parse_predicate("name=diet soda")
+        ('name', '=', 'diet soda')
+
+    Parameters:
+        text: Predicate in a ``FIELD<OP>VALUE`` form, where ``OP`` is one
+            of ``=``, ``!=``, ``<``, ``<=``, ``>``, ``>=``. The value is
+            treated as JSON if possible, and as a string otherwise.
+            JSON arrays and objects are not comparable, so not allowed.
+
+    Returns:
+        Field name, operator and value.
+
+    Raises:
+        ValueError: The text is not a valid predicate.
+    """
+    match = _PREDICATE_RE.match(text)
+    if match is None:
+        raise ValueError(f"not a predicate: {text!r}")
+    field, op, raw_value = match.groups()
+    try:
+        value = json.loads(raw_value)
+    except ValueError:
+        value = raw_value
+    if isinstance(value, (list, dict)):
+        raise ValueError(f"not a scalar value: {raw_value!r}")
+    return field, op, value
+
+
+def connect() -> sqlite3.Connection:
+    """Open the index database, creating it if needed.
+
+    Returns:
+        Connection to the
+        ``${XDG_CACHE_HOME:-${HOME}/.cache}/buglog/index.sqlite3`` database.
+    """
+    cache_dir().mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(cache_dir() / INDEX_NAME))
+    conn.executescript(_SCHEMA)
+    (version,) = conn.execute("PRAGMA user_version").fetchone()
+    if version < 1:
+        rebuild_rollups(conn)
+    if version < 2:
+        rebuild_latest(conn)
+    if version < _VERSION:
+        conn.execute(f"PRAGMA user_version = {_VERSION}")
+    return conn
+
+
+def bucket_bounds(timestamp: datetime, granularity: str) -> Tuple[date, date]:
+    """Get the time bucket a timestamp falls into.
+
+    Example:
+        >>> bucket_bounds(datetime(2020, 7, 23, 8), "week")
+        (datetime.date(2020, 7, 20), datetime.date(2020, 7, 27))
+
+    Parameters:
+        timestamp: Time of the record.
+        granularity: One of ``day``, ``week`` (starting on Monday)
+            or ``month``.
+
+    Returns:
+        First day of the bucket and first day of the next one.
+    """
+    day = timestamp.date()
+    if granularity == "day":
+        return day, day + timedelta(days=1)
+    if granularity == "week":
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=7)
+    start = day.replace(day=1)
+    return start, (start + timedelta(days=31)).replace(day=1)
+
+
+Bucket = Tuple[str, str, date, date]
+
+
+def _buckets(bug_name: str, timestamp: datetime) -> Iterator[Bucket]:
+    for granularity in GRANULARITIES:
+        yield (bug_name, granularity, *bucket_bounds(timestamp, granularity))
+
+
+def _refresh_rollups(
+    conn: sqlite3.Connection, buckets: Iterable[Bucket]
+) -> None:
+    """Recompute rollups of numeric fields in the given buckets."""
+    for bug_name, granularity, start, end in buckets:
+        conn.execute(
+            "DELETE FROM rollups"
+            " WHERE bug_name = ? AND granularity = ? AND bucket = ?",
+            (bug_name, granularity, start.isoformat()),
+        )
+        conn.execute(
+            """
+            INSERT INTO rollups
+            SELECT ?, json_each.key, ?, ?,
+                COUNT(*), SUM(value), MIN(value), MAX(value)
+            FROM records, json_each(records.data)
+            WHERE bug_name = ? AND timestamp >= ? AND timestamp < ?
+                AND json_each.type IN ('integer', 'real')
+            GROUP BY json_each.key
+            """,
+            (
+                bug_name,
+                granularity,
+                start.isoformat(),
+                bug_name,
+                start.isoformat(),
+                end.isoformat(),
+            ),
+        )
+
+
+def rebuild_rollups(conn: sqlite3.Connection) -> None:
+    """Recompute all the rollups from the indexed records.
+
+    Parameters:
+        conn: Connection to the index database.
+    """
+    days = conn.execute(
+        "SELECT DISTINCT bug_name, substr(timestamp, 1, 10) FROM records"
+    )
+    buckets = {
+        bucket
+        for bug_name, day in days
+        for bucket in _buckets(bug_name, datetime.fromisoformat(day))
+    }
+    with conn:
+        conn.execute("DELETE FROM rollups")
+        _refresh_rollups(conn, sorted(buckets))
+
+
+def _latest_line(timestamp: str, data: str) -> str:
+    """Render a record as Unix time, date and the fields, tab separated.
+
+    Example:
+        >>> line = _latest_line("2020-03-02T09:00", '{"dose": 5, "num": 1}')
+        >>> line.split("\\t")[1:]
+        ['2020-03-02 09:00', 'dose=5, num=1']
+    """
+    moment = datetime.fromisoformat(timestamp)
+    fields = ", ".join(
+        f"{name}={' '.join(str(value).split())}"
+        for name, value in json.loads(data).items()
+    )
+    return f"{int(moment.timestamp())}\t{moment:%Y-%m-%d %H:%M}\t{fields}"
+
+
+def write_latest(conn: sqlite3.Connection, bug_names: Iterable[str]) -> None:
+    """Render the latest records of the Bug classes into their files.
+
+    The files are small enough for the picker's preview to be
+    a mere ``awk`` over them, instead of a query.
+
+    Parameters:
+        conn: Connection to the index database.
+        bug_names: Class names of the bugs whose records have changed.
+    """
+    folder = latest_dir()
+    folder.mkdir(parents=True, exist_ok=True)
+    for bug_name in bug_names:
+        path = folder / f"{bug_name}.tsv"
+        rows = conn.execute(
+            "SELECT timestamp, data FROM records WHERE bug_name = ?"
+            " ORDER BY timestamp DESC LIMIT ?",
+            (bug_name, LATEST_COUNT),
+        ).fetchall()
+        if not rows:
+            with suppress(FileNotFoundError):
+                path.unlink()
+            continue
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w") as fout:
+            fout.writelines(_latest_line(*row) + "\n" for row in rows)
+        os.replace(tmp_path, path)
+
+
+def rebuild_latest(conn: sqlite3.Connection) -> None:
+    """Render the latest records of all the Bug classes anew.
+
+    Parameters:
+        conn: Connection to the index database.
+    """
+    with suppress(FileNotFoundError):
+        for path in latest_dir().iterdir():
+            path.unlink()
+    bug_names = conn.execute("SELECT DISTINCT bug_name FROM records")
+    write_latest(conn, [bug_name for bug_name, in bug_names])
+
+
+def _read_source(path: Path) -> Iterator[Record]:
+    """Read records from either a dump file or a segment."""
+    if path.suffix == SEGMENT_SUFFIX:
+        yield from read_segment(path)
+        return
+    timestamp, bug_name = parse_file_name(path.name)
+    for data in read_file(path):
+        yield Record(timestamp, bug_name, data)
+
+
+def _file_buckets(conn: sqlite3.Connection, name: str) -> Set[Bucket]:
+    """Get buckets of the indexed records of a file."""
+    days = conn.execute(
+        "SELECT DISTINCT bug_name, substr(timestamp, 1, 10) FROM records"
+        " WHERE file = ?",
+        (name,),
+    )
+    return {
+        bucket
+        for bug_name, day in days
+        for bucket in _buckets(bug_name, datetime.fromisoformat(day))
+    }
+
+
+def update_index(
+    conn: sqlite3.Connection, paths: Optional[Iterable[Path]] = None
+) -> None:
+    """Bring the index in sync with the data folder.
+
+    Only the dump files and segments which are new, or whose
+    modification time or size have changed since the last update,
+    are read. Rollups are recomputed only in the buckets of those files,
+    and the latest records only of the Bug classes found in them.
+
+    Parameters:
+        conn: Connection to the index database.
+        paths: Only (re)index these dump files, e.g. the ones just written,
+            without scanning the data folder for removed files.
+    """
+    root = data_dir()
+    known = {
+        name: (mtime_ns, size)
+        for name, mtime_ns, size in conn.execute("SELECT * FROM files")
+    }
+    full_scan = paths is None
+    if paths is None:
+        roll_back()
+        recover()
+        paths = itertools.chain(
+            (dump.path for dump in iter_dump_files()), iter_segment_files()
+        )
+    seen = set()
+    dirty: Set[Bucket] = set()
+
+    with conn:
+        for path in paths:
+            name = os.fspath(path.relative_to(root))
+            stat = path.stat()
+            seen.add(name)
+            if known.get(name) == (stat.st_mtime_ns, stat.st_size):
+                continue
+            dirty |= _file_buckets(conn, name)
+            conn.execute("DELETE FROM records WHERE file = ?", (name,))
+            conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?)",
+                (name, stat.st_mtime_ns, stat.st_size),
+            )
+            conn.executemany(
+                "INSERT INTO records VALUES (?, ?, ?, ?)",
+                (
+                    (
+                        name,
+                        r.timestamp.isoformat(),
+                        r.bug_name,
+                        json.dumps(r.data),
+                    )
+                    for r in _read_source(path)
+                ),
+            )
+            dirty |= _file_buckets(conn, name)
+
+        if full_scan:
+            for name in known.keys() - seen:
+                dirty |= _file_buckets(conn, name)
+                conn.execute("DELETE FROM records WHERE file = ?", (name,))
+                conn.execute("DELETE FROM files WHERE name = ?", (name,))
+
+        _refresh_rollups(conn, sorted(dirty))
+
+    write_latest(conn, sorted({bucket[0] for bucket in dirty}))
+
+
+def data_stamp() -> str:
+    """Get stamp of the files in the data folder.
+
+    Modification times of the data folder and of the segments folder
+    change whenever buglog adds or removes files in them, and every
+    commit does (see :func:`buglog.storage.commit`). Files changed
+    by hand in the ``YYYY/MM/DD/`` partitions are not noticed,
+    until ``bug stats --rebuild``.
+
+    Returns:
+        The stamp, to be compared with the one the index was synced at.
+    """
+    stamps = []
+    for folder in (data_dir(), segments_dir()):
+        try:
+            stamps.append(str(os.stat(folder).st_mtime_ns))
+        except FileNotFoundError:
+            stamps.append("")
+    return ":".join(stamps)
+
+
+def _synced_stamp(conn: sqlite3.Connection) -> Optional[str]:
+    row = conn.execute(
+        "SELECT value FROM state WHERE name = 'data'"
+    ).fetchone()
+    return None if row is None else str(row[0])
+
+
+def _set_synced_stamp(conn: sqlite3.Connection, stamp: str) -> None:
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO state VALUES ('data', ?)", (stamp,)
+        )
+
+
+def sync_index(conn: sqlite3.Connection) -> None:
+    """Bring the index in sync with the data folder, if it has changed.
+
+    The data folder is scanned only if its :func:`data_stamp` differs
+    from the one of the last scan, so queries of an index kept
+    up to date by :func:`index_written` cost no stat of every file.
+
+    Parameters:
+        conn: Connection to the index database.
+    """
+    stamp = data_stamp()
+    if _synced_stamp(conn) == stamp:
+        return
+    update_index(conn)
+    _set_synced_stamp(conn, stamp)
+
+
+def index_written(
+    paths: Iterable[Path], *, stamp: Optional[str] = None
+) -> None:
+    """Add just written dump files to the index, its rollups
+    and the latest records.
+
+    The index is only a cache, so failing to update it is not an error,
+    it gets synced on the next query anyway.
+
+    Parameters:
+        paths: Paths to the written dump files.
+        stamp: The :func:`data_stamp` from before the files were written.
+            If the index was in sync with it, it stays in sync
+            with the data folder without scanning it.
+    """
+    with suppress(sqlite3.Error), closing(connect()) as conn:
+        in_sync = stamp is not None and _synced_stamp(conn) == stamp
+        update_index(conn, paths)
+        if in_sync:
+            _set_synced_stamp(conn, data_stamp())
+
+
+def rebuild_index() -> None:
+    """Rebuild the index, its rollups and the latest records
+    from the data folder."""
+    with closing(connect()) as conn:
+        with conn:
+            conn.execute("DELETE FROM files")
+            conn.execute("DELETE FROM records")
+            conn.execute("DELETE FROM rollups")
+        stamp = data_stamp()
+        update_index(conn)
+        rebuild_latest(conn)
+        _set_synced_stamp(conn, stamp)
+
+
+def rollups(
+    bug_name: str,
+    field: str,
+    granularity: str,
+    *,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+) -> Iterator[Tuple[date, int, float, float, float]]:
+    """Read rollups of a numeric field, syncing the index beforehand.
+
+    Parameters:
+        bug_name: Class name of the bugs.
+        field: Name of the numeric field.
+        granularity: One of ``day``, ``week`` or ``month``.
+        since: Only buckets starting at or after this day.
+        until: Only buckets starting before this day.
+
+    Returns:
+        First day of the bucket, and count, sum, minimum and maximum
+        of the field's values in it, in chronological order.
+    """
+    sql = (
+        "SELECT bucket, count, sum, min, max FROM rollups"
+        " WHERE bug_name = ? AND field = ? AND granularity = ?"
+    )
+    params: List[Any] = [bug_name, field, granularity]
+    if since is not None:
+        sql += " AND bucket >= ?"
+        params.append(since.isoformat())
+    if until is not None:
+        sql += " AND bucket < ?"
+        params.append(until.isoformat())
+    sql += " ORDER BY bucket"
+
+    with closing(connect()) as conn:
+        sync_index(conn)
+        for bucket, count, total, low, high in conn.execute(sql, params):
+            yield date.fromisoformat(bucket), count, total, low, high
+
+
+def query(
+    bug_name: Optional[str] = None,
+    *,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    where: Iterable[Predicate] = (),
+) -> Iterator[Record]:
+    """Find records, syncing the index beforehand.
+
+    Parameters:
+        bug_name: Class name of the bugs.
+        since: Only records logged at or after this time.
+        until: Only records logged before this time.
+        where: Field predicates the records must satisfy.
+
+    Returns:
+        Matching records in chronological order.
+    """
+    clauses = []
+    params: List[Any] = []
+    if bug_name is not None:
+        clauses.append("bug_name = ?")
+        params.append(bug_name)
+    if since is not None:
+        clauses.append("timestamp >= ?")
+        params.append(since.isoformat())
+    if until is not None:
+        clauses.append("timestamp < ?")
+        params.append(until.isoformat())
+    for field, op, value in where:
+        assert op in _OPERATORS
+        clauses.append(f"json_extract(data, ?) {op} ?")
+        params.extend([f'$."{field}"', value])
+
+    sql = "SELECT timestamp, bug_name, data FROM records"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY timestamp, rowid"
+
+    with closing(connect()) as conn:
+        sync_index(conn)
+        for timestamp, name, data in conn.execute(sql, params):
+            yield Record(
+                datetime.fromisoformat(timestamp), name, json.loads(data)
+            )
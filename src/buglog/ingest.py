@@ -0,0 +1,304 @@
+import csv
+import itertools
+import json
+from collections import defaultdict
+from collections import deque
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import Deque
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+from typing import TextIO
+from typing import Tuple
+from typing import TypeVar
+from typing import Union
+
+from buglog.index import data_stamp
+from buglog.index import index_written
+from buglog.prompt import date_to_filename
+from buglog.prompt import decode_timedate
+from buglog.prompt import to_local
+from buglog.storage import commit
+from buglog.storage import Record
+
+# Keys of the raw record, which are not fields of the bug
+BUG_KEY = "bug"
+AT_KEY = "at"
+
+# Line number and the raw record, as read from the input
+Row = Tuple[int, Any]
+
+R = TypeVar("R")
+
+
+class Validated(NamedTuple):
+    """A record which passed validation."""
+
+    lineno: int
+    bug_name: str
+    timestamp: datetime
+    data: Dict[str, Any]
+
+
+class Invalid(NamedTuple):
+    """A record which failed validation."""
+
+    lineno: int
+    message: str
+
+
+def parse_assignments(assignments: Iterable[str]) -> Dict[str, str]:
+    """Parse bug fields given on the command line.
+
+    Example:
+        >>> parse_assignments(["times=3", "name=diet soda"])
+        {'times': '3', 'name': 'diet soda'}
+
+    Parameters:
+        assignments: Fields in a ``FIELD=VALUE`` form.
+
+    Returns:
+        Mapping from field names to raw values.
+
+    Raises:
+        ValueError: An assignment without ``=``.
+    """
+    fields = {}
+    for assignment in assignments:
+        field, sep, value = assignment.partition("=")
+        if not sep or not field:
+            raise ValueError(f"not a FIELD=VALUE pair: {assignment!r}")
+        fields[field] = value
+    return fields
+
+
+def read_ndjson(stream: TextIO) -> Iterator[Row]:
+    """Read raw records from JSON lines.
+
+    Lines which are not JSON objects are yielded as is,
+    to be reported by validation.
+    """
+    for lineno, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = line
+        yield lineno, record
+
+
+def read_csv(stream: TextIO) -> Iterator[Row]:
+    """Read raw records from CSV with a header.
+
+    Empty cells are dropped, so that the fields' defaults apply.
+    """
+    reader = csv.DictReader(stream)
+    for record in reader:
+        yield reader.line_num, {k: v for k, v in record.items() if v != ""}
+
+
+def _format_validation_error(err: Any) -> str:
+    return "; ".join(
+        f"{'.'.join(map(str, sub_err['loc']))}: {sub_err['msg']}"
+        for sub_err in err.errors()
+    )
+
+
+def _validate_row(
+    row: Row, bug_classes: Dict[str, Any], now: datetime
+) -> Union[Validated, Invalid]:
+    from pydantic import ValidationError
+
+    lineno, record = row
+    if not isinstance(record, dict):
+        return Invalid(lineno, "not a JSON object")
+    fields = dict(record)
+    bug_name = fields.pop(BUG_KEY, None)
+    if not isinstance(bug_name, str) or bug_name not in bug_classes:
+        return Invalid(lineno, f"unknown bug {bug_name!r}")
+
+    timestamp = now
+    if AT_KEY in fields:
+        decoded = decode_timedate(str(fields.pop(AT_KEY)))
+        if decoded is None:
+            return Invalid(lineno, "could not decode the time")
+        timestamp = to_local(decoded)
+
+    try:
+        bug = bug_classes[bug_name](**fields)
+    except ValidationError as err:
+        return Invalid(lineno, _format_validation_error(err))
+    return Validated(lineno, bug_name, timestamp, bug.dict())
+
+
+def validate_chunk(
+    rows: List[Row], now: datetime
+) -> Tuple[List[Validated], List[Invalid]]:
+    """Validate a chunk of raw records against the Bugs in the config.
+
+    Parameters:
+        rows: Line numbers and raw records, with the class name
+            under the ``bug`` key, the optional timestamp under
+            the ``at`` key, and the bug's fields under the rest.
+        now: Timestamp for the records without one.
+
+    Returns:
+        Valid records and errors, in order of the input.
+    """
+    from buglog.utils import get_bug_subclasses
+    from buglog.utils import split_to_types
+
+    bug_classes = {cls.__name__: cls for cls in get_bug_subclasses()}
+    results = [_validate_row(row, bug_classes, now) for row in rows]
+    return split_to_types(results, t1=Validated, t2=Invalid)
+
+
+def _warm_up_worker() -> None:
+    """Import the config once per worker process."""
+    from buglog.utils import get_bug_subclasses
+
+    get_bug_subclasses()
+
+
+def map_chunks(
+    func: Callable[..., R],
+    items: Iterable[Any],
+    *args: Any,
+    chunk_size: int = 1024,
+    jobs: int = 1,
+) -> Iterator[R]:
+    """Apply function to chunks of items, possibly in worker processes.
+
+    With several jobs, chunks are fanned out to a process pool,
+    which imports the config once per worker. Only a few chunks
+    per worker are in flight at a time, so the items are not
+    read into memory all at once.
+
+    Parameters:
+        func: Function to be called as ``func(chunk, *args)``.
+        items: Items to be split into chunks.
+        args: Additional arguments of the function.
+        chunk_size: Number of items in a chunk.
+        jobs: Number of worker processes (``1`` means no pool).
+
+    Returns:
+        Results of the function, in order of the chunks.
+    """
+    iterator = iter(items)
+    chunks = iter(lambda: list(itertools.islice(iterator, chunk_size)), [])
+    if jobs == 1:
+        for chunk in chunks:
+            yield func(chunk, *args)
+        return
+
+    with ProcessPoolExecutor(jobs, initializer=_warm_up_worker) as pool:
+        in_flight: Deque["Future[R]"] = deque()
+        for chunk in chunks:
+            in_flight.append(pool.submit(func, chunk, *args))
+            if len(in_flight) >= 2 * jobs:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+
+def validate_rows(
+    rows: Iterable[Row], *, chunk_size: int = 1024, jobs: int = 1
+) -> Tuple[List[Validated], List[Invalid]]:
+    """Validate raw records chunk by chunk.
+
+    Parameters:
+        rows: Line numbers and raw records (see :func:`validate_chunk`).
+        chunk_size: Number of records validated at once.
+        jobs: Number of worker processes.
+
+    Returns:
+        Valid records and errors, in order of the input.
+    """
+    valid: List[Validated] = []
+    invalid: List[Invalid] = []
+    results = map_chunks(
+        validate_chunk,
+        rows,
+        datetime.now(),
+        chunk_size=chunk_size,
+        jobs=jobs,
+    )
+    for chunk_valid, chunk_invalid in results:
+        valid.extend(chunk_valid)
+        invalid.extend(chunk_invalid)
+    return valid, invalid
+
+
+def revalidate_chunk(records: List[Record]) -> List[Tuple[Record, str]]:
+    """Validate stored records against the Bugs in the config.
+
+    Parameters:
+        records: Records read from the data folder.
+
+    Returns:
+        Invalid records and the errors.
+    """
+    from pydantic import ValidationError
+
+    from buglog.utils import get_bug_subclasses
+
+    bug_classes = {cls.__name__: cls for cls in get_bug_subclasses()}
+    invalid = []
+    for record in records:
+        if record.bug_name not in bug_classes:
+            invalid.append((record, f"unknown bug {record.bug_name!r}"))
+            continue
+        try:
+            bug_classes[record.bug_name](**record.data)
+        except ValidationError as err:
+            invalid.append((record, _format_validation_error(err)))
+    return invalid
+
+
+def revalidate(
+    records: Iterable[Record], *, chunk_size: int = 1024, jobs: int = 1
+) -> Iterator[Tuple[Record, str]]:
+    """Validate stored records, e.g. after the config got stricter.
+
+    Parameters:
+        records: Records read from the data folder.
+        chunk_size: Number of records validated at once.
+        jobs: Number of worker processes.
+
+    Returns:
+        Invalid records and the errors, in order of the input.
+    """
+    results = map_chunks(
+        revalidate_chunk, records, chunk_size=chunk_size, jobs=jobs
+    )
+    for chunk_invalid in results:
+        yield from chunk_invalid
+
+
+def write_validated(records: Iterable[Validated]) -> List[Path]:
+    """Save validated records in one bulk commit, and index them.
+
+    Parameters:
+        records: Valid records.
+
+    Returns:
+        Paths to the written dump files.
+    """
+    batch: Dict[Union[Path, str], List[Dict[str, Any]]] = defaultdict(list)
+    for record in records:
+        file_name = date_to_filename(record.bug_name, record.timestamp)
+        batch[file_name].append(record.data)
+    if not batch:
+        return []
+    stamp = data_stamp()
+    paths = commit(batch)
+    index_written(paths, stamp=stamp)
+    return paths
@@ -3,66 +3,311 @@ from typing import Any
 from typing import Dict
 from typing import Iterable
 from typing import Iterator
+from typing import List
+from typing import Optional
 from typing import Tuple
 from typing import Type
+from typing import TYPE_CHECKING
 from typing import Union
+from weakref import WeakKeyDictionary
 
-from bs4 import BeautifulSoup
-from docutils.core import publish_parts
-from pydantic.error_wrappers import ValidationError
+from buglog.snapshot import load_snapshot
+from buglog.snapshot import Schema
+from buglog.trace import span
 
-from buglog.utils import Bug
-from buglog.utils import str_to_bug
+if TYPE_CHECKING:
+    from pydantic.error_wrappers import ValidationError
 
+    from buglog.utils import Bug
 
-def bugs_to_rst(bugs_classes: Iterable[Type[Bug]]) -> str:
-    """Convert a list of bug models to reStructuredText."""
+# Line number (if known) and text of a bullet item
+Item = Tuple[Optional[int], str]
+# Line number (if known), title and items of a section
+Section = Tuple[Optional[int], str, List[Item]]
 
-    def _title(schema: Dict[str, Any]) -> Iterator[str]:
+_BULLETS = ("*", "-", "+")
+
+# Results of the sections of the last parsed text, keyed by their content
+_parsed: Dict[Tuple[Any, ...], Union["Bug", "ValidationError"]] = {}
+
+
+class TitleIndex:
+    """Longest-prefix lookup of field titles, backed by a trie.
+
+    Example:
+        >>> index = TitleIndex({"Dose": "num", "Dose [mg]": "dose"})
+        >>> index.match("Dose [mg]: 10")
+        ('dose', 9)
+        >>> index.match("Dose: 1")
+        ('num', 4)
+        >>> index.match("Weight: 80") is None
+        True
+    """
+
+    _END = ""
+
+    def __init__(self, titles: Dict[str, str]) -> None:
+        """Build the trie.
+
+        Parameters:
+            titles: Mapping from field titles to field names.
+        """
+        self._trie: Dict[str, Any] = {}
+        for title, name in titles.items():
+            node = self._trie
+            for char in title:
+                node = node.setdefault(char, {})
+            node[self._END] = name
+
+    def match(self, line: str) -> Optional[Tuple[str, int]]:
+        """Find the longest title the line starts with.
+
+        Parameters:
+            line: Text of the bullet item.
+
+        Returns:
+            Field name and length of the matched title
+            or ``None`` if no title matched.
+        """
+        found = None
+        node = self._trie
+        for pos, char in enumerate(line):
+            if self._END in node:
+                found = node[self._END], pos
+            child: Optional[Dict[str, Any]] = node.get(char)
+            if child is None:
+                return found
+            node = child
+        if self._END in node:
+            found = node[self._END], len(line)
+        return found
+
+
+# Title indexes of the Bug classes, dropped along with the classes
+# replaced by a re-import of the config
+_title_indexes: "WeakKeyDictionary[Type[Bug], TitleIndex]" = (
+    WeakKeyDictionary()
+)
+
+
+def _title_index(bug_class: Type["Bug"]) -> TitleIndex:
+    index = _title_indexes.get(bug_class)
+    if index is None:
+        props = bug_class.schema()["properties"]
+        index = TitleIndex(
+            {
+                item_dict.get("title", item_name): item_name
+                for item_name, item_dict in props.items()
+            }
+        )
+        _title_indexes[bug_class] = index
+    return index
+
+
+class RstSyntaxError(ValueError):
+    """The text could not be parsed into bugs.
+
+    Attributes:
+        lineno: Number of the offending line (if known).
+        reason: The message, without the line number.
+    """
+
+    def __init__(self, lineno: Optional[int], message: str) -> None:
+        self.lineno = lineno
+        self.reason = message
+        if lineno is not None:
+            message = f"line {lineno}: {message}"
+        super().__init__(message)
+
+
+# Rendered templates of the Bugs, with the schemas they were rendered from
+_fragments: Dict[str, Tuple[Schema, str]] = {}
+
+
+def _render_bug(schema: Schema) -> str:
+    def _title() -> Iterator[str]:
         title = schema["title"]
         if "description" in schema:
             title += ": " + schema["description"]
         yield title
         yield "-" * len(title)
 
-    def _list_items(schema: Dict[str, Any]) -> Iterator[str]:
+    def _list_items() -> Iterator[str]:
         for item, item_dict in schema["properties"].items():
             item_text = item_dict.get("title", item)
             default = item_dict.get("default", "")
             yield f"* {item_text}: {default}"
 
-    def _single_bug(schema: Dict[str, Any]) -> str:
-        lines = itertools.chain(_title(schema), _list_items(schema))
-        return "\n".join(lines)
+    return "\n".join(itertools.chain(_title(), _list_items()))
+
+
+def _bug_template(bug_name: str, schema: Schema) -> str:
+    """Get template of a single bug, rendering it if its schema changed."""
+    cached = _fragments.get(bug_name)
+    # Mostly it is the very same schema, otherwise the config was edited
+    # and only the classes whose schemas differ are rendered again
+    if cached is not None and (cached[0] is schema or cached[0] == schema):
+        fragment = cached[1]
+    else:
+        fragment = _render_bug(schema)
+    _fragments[bug_name] = (schema, fragment)
+    return fragment
+
+
+def bugs_to_rst(bug_names: Iterable[str]) -> str:
+    """Convert a list of bug models to reStructuredText.
 
+    The schemas are taken from the snapshot,
+    so the config does not have to be imported.
+    Templates of the single bugs are cached in memory.
+
+    Parameters:
+        bug_names: Class names of the bugs.
+
+    Returns:
+        Template to be filled in by the user.
+    """
+    snapshot = load_snapshot()
     return "\n\n".join(
-        _single_bug(bug_cls.schema()) for bug_cls in bugs_classes
+        _bug_template(bug_name, snapshot[bug_name]) for bug_name in bug_names
     )
 
 
-def rst_to_bugs(text: str) -> Iterator[Union[Bug, ValidationError]]:
-    def _map_items_to_strings(
-        bug_class: Type[Bug], line: str
-    ) -> Tuple[str, str]:
-        props = bug_class.schema()["properties"]
-        for item_name, item_dict in props.items():
-            if line.startswith(item_dict["title"]):
-                return item_name, line[len(item_dict["title"]) + 1 :].strip()
-        raise AssertionError()
+def _is_bullet(line: str) -> bool:
+    return line[:1] in _BULLETS and line[1:2] in ("", " ")
+
+
+def _is_underline(line: str, title: str) -> bool:
+    return set(line.rstrip()) == {"-"} and len(line.rstrip()) >= len(title)
+
+
+def _template_sections(text: str) -> Iterator[Section]:
+    """Parse text in the exact format :func:`bugs_to_rst` produces.
+
+    That is: section titles underlined with dashes, followed by
+    bullet items, possibly continued on indented lines.
+
+    Raises:
+        RstSyntaxError: The text does not follow the format.
+    """
+    section: Optional[Section] = None
+    lines = text.splitlines()
+    lineno = 0
+    while lineno < len(lines):
+        line = lines[lineno]
+        lineno += 1
+        if not line.strip():
+            continue
+        if _is_bullet(line):
+            if section is None:
+                raise RstSyntaxError(lineno, "bullet item before any title")
+            section[2].append((lineno, line[2:].strip()))
+        elif line[0].isspace():
+            if section is None or not section[2]:
+                raise RstSyntaxError(lineno, "unexpected indentation")
+            item_lineno, item_text = section[2][-1]
+            section[2][-1] = (item_lineno, f"{item_text}\n{line.strip()}")
+        else:
+            title = line.rstrip()
+            if lineno >= len(lines) or not _is_underline(lines[lineno], title):
+                raise RstSyntaxError(
+                    lineno, f"title {title!r} is not underlined"
+                )
+            if section is not None:
+                yield section
+            section = (lineno, title, [])
+            lineno += 1
+    if section is not None:
+        yield section
+
+
+def _docutils_sections(text: str) -> Iterator[Section]:
+    """Parse free-form reStructuredText with docutils."""
+    from bs4 import BeautifulSoup
+    from docutils.core import publish_parts
 
     html = publish_parts(text, writer_name="html")["html_body"]
     soup = BeautifulSoup(html, "html.parser")
     sections = soup.select(".section") or soup.select(".document")
     for section in sections:
-        title = section.h1.text
+        if section.h1 is None:
+            continue
+        items: List[Item] = [(None, li.text) for li in section.select("li")]
+        yield None, section.h1.text, items
+
+
+def _parse_sections(text: str) -> List[Section]:
+    """Split text into sections, preferring the fast template parser."""
+    try:
+        return list(_template_sections(text))
+    except RstSyntaxError:
+        sections = list(_docutils_sections(text))
+        if not sections:
+            raise
+        return sections
+
+
+def rst_to_bugs(text: str) -> Iterator[Union["Bug", "ValidationError"]]:
+    """Parse filled in template into bugs.
+
+    Text in the format produced by :func:`bugs_to_rst` is parsed
+    line by line, other reStructuredText falls back to docutils.
+    Sections left unchanged since the previous call
+    (as when the user corrects a few fields) are not validated again,
+    their bugs are copied from the previous results instead.
+
+    Parameters:
+        text: The filled in template.
+
+    Returns:
+        Bugs and validation errors, one per section.
+
+    Raises:
+        RstSyntaxError: The text could not be parsed.
+    """
+    from pydantic.error_wrappers import ValidationError
+
+    from buglog.utils import get_bugs_by_name
+
+    def _map_items_to_strings(
+        bug_class: Type["Bug"], item: Item
+    ) -> Tuple[str, str]:
+        lineno, line = item
+        found = _title_index(bug_class).match(line)
+        if found is None:
+            raise RstSyntaxError(lineno, f"unknown field {line!r}")
+        item_name, title_len = found
+        return item_name, line[title_len + 1 :].strip()
+
+    global _parsed
+
+    with span("parse sections"):
+        sections = _parse_sections(text)
+    bugs_by_name = get_bugs_by_name()
+    parsed: Dict[Tuple[Any, ...], Union["Bug", ValidationError]] = {}
+    for lineno, title, items in sections:
         bug_name = title.replace(":", " ").split(" ")[0]
-        bug_class: Any = str_to_bug(bug_name)
-        bug_args = dict(
-            _map_items_to_strings(bug_class, item.text)
-            for item in section.select("li")
-        )
         try:
-            bug = bug_class(**bug_args)
-            yield bug
-        except ValidationError as e:
-            yield e
+            bug_class: Any = bugs_by_name[bug_name]
+        except KeyError:
+            raise RstSyntaxError(lineno, f"unknown bug {bug_name!r}") from None
+        # The class is a part of the key, as it changes with the config
+        key = (bug_class, title, tuple(line for _, line in items))
+        result = _parsed.get(key)
+        if result is None:
+            bug_args = dict(
+                _map_items_to_strings(bug_class, item) for item in items
+            )
+            with span("validate", bug=bug_name):
+                try:
+                    result = bug_class(**bug_args)
+                except ValidationError as e:
+                    result = e
+        parsed[key] = result
+        if isinstance(result, ValidationError):
+            yield result
+        else:
+            # The cached bug is kept safe from the caller's assignments,
+            # its values are parsed from single lines, so not nested
+            yield result.copy()
+    _parsed = parsed
@@ -1,14 +1,34 @@
 import re
 from contextlib import suppress
 from datetime import datetime
+from datetime import timedelta
+from functools import lru_cache
 from typing import Optional
 from typing import Tuple
 
-import readchar
-from prompt_toolkit import prompt
-from prompt_toolkit.application.current import get_app
-from prompt_toolkit.validation import Validator
-from timefhuman import timefhuman
+
+def to_local(date: datetime) -> datetime:
+    """Convert timezone-aware timedate to the naive local one.
+
+    The dump files are named by the local time, without an offset.
+
+    Example:
+        >>> from datetime import timezone
+        >>> to_local(datetime(2007, 12, 6, 15, 29, 43)).tzinfo is None
+        True
+        >>> aware = datetime(2007, 12, 6, 15, 29, 43, tzinfo=timezone.utc)
+        >>> to_local(aware) == aware.astimezone().replace(tzinfo=None)
+        True
+
+    Parameters:
+        date: Either naive (assumed local) or aware timedate.
+
+    Returns:
+        The naive local timedate.
+    """
+    if date.tzinfo is None:
+        return date
+    return date.astimezone().replace(tzinfo=None)
 
 
 def date_to_filename(bug_name: str, date: datetime) -> str:
@@ -17,25 +37,101 @@ def date_to_filename(bug_name: str, date: datetime) -> str:
     Example:
         >>> from datetime import datetime
         >>> date_to_filename('Squats', datetime(2007, 12, 6, 15, 29, 43))
-        '2007-12-06_15:29:43_Squats.json'
+        '2007-12-06_15:29:43_Squats.jsonl'
 
     Parameters:
         bug_name: The class name of the bug.
-        date: Bug generation time and date.
+        date: Bug generation time and date (converted to the local time,
+            if timezone-aware).
 
     Returns:
-        Name of .json file dump.
+        Name of .jsonl file dump.
     """
-    pretty_date = date.isoformat("_", "seconds")
-    return f"{pretty_date}_{bug_name}.json"
+    pretty_date = to_local(date).isoformat("_", "seconds")
+    return f"{pretty_date}_{bug_name}.jsonl"
 
 
-def _decode_timedate(text: str) -> Optional[datetime]:
-    if text == "":
-        return datetime.now()
+_RELATIVE_RE = re.compile(
+    r"^(?P<sign>[+-])?\s*(?P<num>\d+)\s*"
+    r"(?P<unit>s|secs?|seconds?|m|mins?|minutes?|h|hrs?|hours?|d|days?)"
+    r"(?:\s+(?P<ago>ago))?$"
+)
+_CLOCK_RE = re.compile(
+    r"^(?:(?P<day>today|yesterday|tomorrow)\s+)?(?:at\s+)?"
+    r"(?P<hour>\d{1,2})(?::(?P<minute>\d{2}))?\s*(?P<ampm>am|pm)?$"
+)
+_UNITS = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days"}
+_DAYS = {"yesterday": -1, "today": 0, "tomorrow": 1}
+
+
+def _decode_relative(text: str, now: datetime) -> Optional[datetime]:
+    match = _RELATIVE_RE.match(text)
+    if match is None or (match["sign"] and match["ago"]):
+        return None
+    delta = timedelta(**{_UNITS[match["unit"][0]]: int(match["num"])})
+    if match["sign"] == "-" or match["ago"]:
+        return now - delta
+    return now + delta
+
+
+def _decode_clock(text: str, now: datetime) -> Optional[datetime]:
+    match = _CLOCK_RE.match(text)
+    # A bare number is too ambiguous to be treated as an hour
+    if match is None or not (match["day"] or match["minute"] or match["ampm"]):
+        return None
+    hour = int(match["hour"])
+    if match["ampm"]:
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if match["ampm"] == "pm" else 0)
+    with suppress(ValueError):
+        date = now + timedelta(days=_DAYS[match["day"] or "today"])
+        return date.replace(
+            hour=hour,
+            minute=int(match["minute"] or 0),
+            second=0,
+            microsecond=0,
+        )
+    return None
+
+
+def _decode_fast(text: str, now: datetime) -> Optional[datetime]:
+    """Decode the most common forms of the timedate.
+
+    Example:
+        >>> now = datetime(2020, 7, 21, 10, 51, 10)
+        >>> _decode_fast("-15m", now)
+        datetime.datetime(2020, 7, 21, 10, 36, 10)
+        >>> _decode_fast("yesterday at 4pm", now)
+        datetime.datetime(2020, 7, 20, 16, 0)
+        >>> _decode_fast("next friday", now) is None
+        True
+
+    Parameters:
+        text: Stripped text entered by user.
+        now: Current timedate.
 
+    Returns:
+        The timedate or ``None`` if the text is not of a common form.
+    """
+    # ISO format is case sensitive, unlike the phrases
     with suppress(ValueError):
         return datetime.fromisoformat(text)
+    text = text.lower()
+    if text in ("", "now"):
+        return now
+    return _decode_relative(text, now) or _decode_clock(text, now)
+
+
+@lru_cache(maxsize=256)
+def _decode_human(text: str, minute: datetime) -> Optional[datetime]:
+    """Decode the timedate with timefhuman.
+
+    The results are cached per minute, as parsing is slow,
+    and is done on every keystroke by both the validator
+    and the toolbar.
+    """
+    from timefhuman import timefhuman
 
     with suppress(AssertionError, ValueError):
         parsed = timefhuman(text)
@@ -45,21 +141,37 @@ def _decode_timedate(text: str) -> Optional[datetime]:
     return None
 
 
+def decode_timedate(text: str) -> Optional[datetime]:
+    """Decode timedate entered by user.
+
+    Example:
+        >>> decode_timedate("2020-07-21_10:51:10")
+        datetime.datetime(2020, 7, 21, 10, 51, 10)
+
+    Parameters:
+        text: Either machine-like or human readable timedate.
+
+    Returns:
+        The timedate or ``None`` if it could not be decoded.
+    """
+    now = datetime.now()
+    text = text.strip()
+    decoded = _decode_fast(text, now)
+    if decoded is not None:
+        return decoded
+    return _decode_human(text.lower(), now.replace(second=0, microsecond=0))
+
+
 def _get_toolbar_text(bug_name: str) -> str:
+    from prompt_toolkit.application.current import get_app
+
     text = get_app().current_buffer.text
-    date = _decode_timedate(text)
+    date = decode_timedate(text)
     if date is not None:
         return date_to_filename(bug_name, date)
     return "???"
 
 
-_validator = Validator.from_callable(
-    lambda s: bool(_decode_timedate(s)),
-    error_message="This input is not a timedate",
-    move_cursor_to_end=True,
-)
-
-
 def edit_filename_date(bug_name: str, default: str = "") -> Tuple[str, str]:
     """Prompt user to change timedate of created file.
 
@@ -68,16 +180,24 @@ def edit_filename_date(bug_name: str, default: str = "") -> Tuple[str, str]:
         default: Default textual time.
 
     Returns:
-        New name of the .json dump file
+        New name of the .jsonl dump file
         and the raw text entered by user.
     """
+    from prompt_toolkit import prompt
+    from prompt_toolkit.validation import Validator
+
+    validator = Validator.from_callable(
+        lambda s: bool(decode_timedate(s)),
+        error_message="This input is not a timedate",
+        move_cursor_to_end=True,
+    )
     text = prompt(
         "Time: ",
         default=default,
-        validator=_validator,
+        validator=validator,
         bottom_toolbar=lambda: _get_toolbar_text(bug_name),
     )
-    date = _decode_timedate(text)
+    date = decode_timedate(text)
     assert date is not None
     return date_to_filename(bug_name, date), text
 
@@ -101,6 +221,8 @@ def user_read_character(*args: str) -> str:
     Returns:
         The letter the user have chosen; lowercase.
     """
+    import readchar
+
     # Construct prompt message from provided arguments
     prompt = "\n".join(args)
     # All letters the user specified to accept
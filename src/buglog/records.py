@@ -0,0 +1,181 @@
+from datetime import datetime
+from typing import Any
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import Type
+from typing import TYPE_CHECKING
+
+from buglog.snapshot import load_snapshot
+from buglog.storage import iter_records
+
+if TYPE_CHECKING:
+    from buglog.utils import Bug
+
+
+class LiteRecord:
+    """A logged bug, as read back without any validation.
+
+    Subclasses are generated per Bug class by :func:`record_class`,
+    with a slot per field, so that a record takes a fraction
+    of the memory of a dict or of a pydantic model.
+
+    The fields are attributes of the record, except for the ones
+    named like the attributes of this class (e.g. ``timestamp``),
+    which are only available through :meth:`dict`.
+    """
+
+    __slots__ = ("timestamp",)
+
+    bug_name: str = ""
+    fields: Tuple[str, ...] = ()
+    # Names of the fields' slots, in the order of the fields
+    slots: Tuple[str, ...] = ()
+    defaults: Dict[str, Any] = {}
+
+    def __init__(self, timestamp: datetime, data: Dict[str, Any]) -> None:
+        self.timestamp = timestamp
+        defaults = self.defaults
+        for field, slot in zip(self.fields, self.slots):
+            setattr(self, slot, data.get(field, defaults.get(field)))
+
+    if TYPE_CHECKING:
+        # The fields' slots are generated per Bug class
+        def __getattr__(self, name: str) -> Any: ...
+
+    def dict(self) -> Dict[str, Any]:
+        """Get the fields' values.
+
+        Returns:
+            Mapping from the field names to the values.
+        """
+        return {
+            field: getattr(self, slot)
+            for field, slot in zip(self.fields, self.slots)
+        }
+
+    def to_bug(self, *, validate: bool = True) -> "Bug":
+        """Upgrade the record to the Bug model.
+
+        Parameters:
+            validate: Validate the fields against the current config,
+                otherwise the model is built as is with ``construct()``.
+
+        Returns:
+            The bug.
+
+        Raises:
+            pydantic.ValidationError: The record is invalid.
+        """
+        from buglog.utils import str_to_bug
+
+        bug_class = str_to_bug(self.bug_name)
+        if validate:
+            return bug_class(**self.dict())
+        return bug_class.construct(**self.dict())
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, LiteRecord):
+            return NotImplemented
+        return (self.bug_name, self.timestamp, self.dict()) == (
+            other.bug_name,
+            other.timestamp,
+            other.dict(),
+        )
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{k}={v!r}" for k, v in self.dict().items())
+        return f"{self.bug_name}({self.timestamp.isoformat()}, {fields})"
+
+
+_classes: Dict[Tuple[str, Tuple[str, ...]], Type[LiteRecord]] = {}
+# Pydantic ignores fields starting with an underscore,
+# so the prefixed slots cannot collide with other fields
+_RESERVED = frozenset(dir(LiteRecord))
+
+
+def _slot_name(field: str) -> str:
+    """Get name of the field's slot, not shadowing the record's attributes.
+
+    Example:
+        >>> _slot_name("dose"), _slot_name("timestamp")
+        ('dose', '_timestamp')
+    """
+    return f"_{field}" if field in _RESERVED else field
+
+
+def record_class(bug_name: str) -> Type[LiteRecord]:
+    """Get record class of a Bug, generated from its schema.
+
+    Parameters:
+        bug_name: Class name of the bug.
+
+    Returns:
+        Subclass of :class:`LiteRecord` with the Bug's fields as slots,
+        and defaults taken from the schema.
+    """
+    properties = load_snapshot()[bug_name]["properties"]
+    fields = tuple(properties)
+    key = (bug_name, fields)
+    if key not in _classes:
+        slots = tuple(map(_slot_name, fields))
+        _classes[key] = type(
+            bug_name,
+            (LiteRecord,),
+            {
+                "__slots__": slots,
+                "__module__": __name__,
+                "bug_name": bug_name,
+                "fields": fields,
+                "slots": slots,
+                "defaults": {
+                    field: prop["default"]
+                    for field, prop in properties.items()
+                    if "default" in prop
+                },
+            },
+        )
+    return _classes[key]
+
+
+def iter_lite_records(
+    bug_name: Optional[str] = None,
+    *,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> Iterator[LiteRecord]:
+    """Read records of the Bugs in the config, without validating them.
+
+    Records of the classes no longer in the config are skipped.
+
+    Parameters:
+        bug_name: Only records of this class.
+        since: Only records logged at or after this time.
+        until: Only records logged before this time.
+
+    Returns:
+        Records in chronological order.
+    """
+    snapshot = load_snapshot()
+    classes: Dict[str, Type[LiteRecord]] = {}
+    for timestamp, name, data in iter_records(since, until, bug_name):
+        if name not in classes:
+            if name not in snapshot:
+                continue
+            classes[name] = record_class(name)
+        yield classes[name](timestamp, data)
+
+
+def load_lite_records(
+    bug_name: Optional[str] = None,
+    *,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> List[LiteRecord]:
+    """Load records into memory, without validating them.
+
+    See :func:`iter_lite_records` for the parameters.
+    """
+    return list(iter_lite_records(bug_name, since=since, until=until))
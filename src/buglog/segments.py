@@ -0,0 +1,520 @@
+import gzip
+import hashlib
+import itertools
+import json
+import os
+import struct
+import sys
+import zlib
+from array import array
+from contextlib import suppress
+from datetime import datetime
+from datetime import timedelta
+from pathlib import Path
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+from buglog.bootstrap import data_dir
+from buglog.codec import decode
+from buglog.codec import layout_for
+from buglog.storage import _remove_empty_partitions
+from buglog.storage import _roll_back_journal
+from buglog.storage import iter_dump_files
+from buglog.storage import iter_lines
+from buglog.storage import locked
+from buglog.storage import mapped
+from buglog.storage import read_file
+from buglog.storage import Record
+
+SEGMENTS_DIR = "segments"
+SEGMENT_SUFFIX = ".seg"
+SIDECAR_SUFFIX = ".idx"
+# Bumped whenever the fields of the blocks change
+SIDECAR_FORMAT = 2
+# Dump files being packed into a segment, removed once they are deleted
+JOURNAL_SUFFIX = ".pending"
+# Uncompressed size of a block, above which a new block is started
+BLOCK_SIZE = 64 * 1024
+# Blocks encoded with the binary codec start with the magic,
+# followed by the number of records and their timestamps
+_BINARY_MAGIC = b"BUGT"
+_COUNT = struct.Struct("<I")
+EPOCH = datetime(1970, 1, 1)
+# Offset past the quoted timestamp of a JSON block's line
+_STAMP_MAX_LEN = len('["YYYY-MM-DDThh:mm:ss.ffffff"')
+
+
+class Block(NamedTuple):
+    """A compressed block of a segment, holding records of one class."""
+
+    offset: int
+    length: int
+    bug_name: str
+    n_records: int
+    first: datetime
+    last: datetime
+
+
+def segments_dir() -> Path:
+    """Get the folder of the segments.
+
+    Returns:
+        The ``${XDG_DATA_HOME:-${HOME}/.local/share}/buglog/segments`` path.
+    """
+    return data_dir() / SEGMENTS_DIR
+
+
+def segment_path(timestamp: datetime) -> Path:
+    """Get path of the segment holding the month of a timestamp.
+
+    Parameters:
+        timestamp: Time of a record.
+
+    Returns:
+        Path to the ``YYYY-MM.seg`` segment.
+    """
+    return segments_dir() / f"{timestamp:%Y-%m}{SEGMENT_SUFFIX}"
+
+
+def _record_order(record: Record) -> Tuple[datetime, str]:
+    return record.timestamp, record.bug_name
+
+
+def _encode_binary(records: List[Record]) -> bytes:
+    """Encode records of a class with the binary codec.
+
+    Raises:
+        ValueError: The records do not fit the class' current layout.
+    """
+    seconds = array("q")
+    for record in records:
+        if record.timestamp.microsecond:
+            raise ValueError("timestamps have to be whole seconds")
+        seconds.append(int((record.timestamp - EPOCH).total_seconds()))
+    if sys.byteorder != "little":
+        seconds.byteswap()
+    try:
+        layout = layout_for(records[0].bug_name)
+    except KeyError:
+        raise ValueError(f"unknown bug {records[0].bug_name!r}")
+    batch = layout.encode(r.data for r in records)
+    count = _COUNT.pack(len(records))
+    return _BINARY_MAGIC + count + seconds.tobytes() + batch
+
+
+def _decode_binary(raw: bytes) -> Iterator[Record]:
+    (count,) = _COUNT.unpack_from(raw, len(_BINARY_MAGIC))
+    start = len(_BINARY_MAGIC) + _COUNT.size
+    seconds = array("q")
+    seconds.frombytes(raw[start : start + count * seconds.itemsize])
+    if sys.byteorder != "little":
+        seconds.byteswap()
+    layout, records = decode(raw[start + count * seconds.itemsize :])
+    timestamps: Dict[int, datetime] = {}
+    for second, data in zip(seconds, records):
+        if second not in timestamps:
+            timestamps[second] = EPOCH + timedelta(seconds=second)
+        yield Record(timestamps[second], layout.bug_name, data)
+
+
+def _encode_block(records: List[Record], binary: bool = False) -> bytes:
+    """Compress records into a gzip member.
+
+    Parameters:
+        records: Records of a single class.
+        binary: Encode the records with the binary codec, if they fit
+            the class' layout, instead of the JSON lines.
+    """
+    if binary:
+        with suppress(ValueError):
+            raw = _encode_binary(records)
+            return gzip.compress(raw, mtime=0)
+    lines = "".join(
+        json.dumps([r.timestamp.isoformat(), r.bug_name, r.data]) + "\n"
+        for r in records
+    )
+    return gzip.compress(lines.encode(), mtime=0)
+
+
+def _decode_block(
+    payload: Union[bytes, memoryview],
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> Iterator[Record]:
+    """Decompress records of a block.
+
+    Lines of a JSON block are prefiltered on their raw timestamps,
+    so the records outside of the time range are not decoded.
+    """
+    raw = zlib.decompress(payload, wbits=31)
+    if raw.startswith(_BINARY_MAGIC):
+        yield from _decode_binary(raw)
+        return
+    lower = since.isoformat().encode() if since is not None else None
+    upper = until.isoformat().encode() if until is not None else None
+    for line in iter_lines(raw):
+        if lower is not None or upper is not None:
+            # Lines start with the quoted ISO timestamp
+            stamp = bytes(line[2:_STAMP_MAX_LEN]).partition(b'"')[0]
+            if lower is not None and stamp < lower:
+                continue
+            if upper is not None and stamp >= upper:
+                continue
+        timestamp, bug_name, data = json.loads(bytes(line))
+        yield Record(datetime.fromisoformat(timestamp), bug_name, data)
+
+
+def _pack(
+    records: Iterable[Record], binary: bool = False
+) -> Tuple[bytes, List[Block]]:
+    """Compress records into blocks, each holding a single class."""
+    chunks: List[bytes] = []
+    blocks: List[Block] = []
+
+    def _flush(block: List[Record]) -> None:
+        chunk = _encode_block(block, binary)
+        offset = blocks[-1].offset + blocks[-1].length if blocks else 0
+        first, last = block[0].timestamp, block[-1].timestamp
+        blocks.append(
+            Block(
+                offset, len(chunk), block[0].bug_name, len(block), first, last
+            )
+        )
+        chunks.append(chunk)
+
+    # Sorting is stable, so each class' records stay chronological
+    by_class = sorted(records, key=lambda r: r.bug_name)
+    for _, group in itertools.groupby(by_class, lambda r: r.bug_name):
+        block: List[Record] = []
+        size = 0
+        for record in group:
+            block.append(record)
+            size += len(json.dumps(record.data))
+            if size >= BLOCK_SIZE:
+                _flush(block)
+                block, size = [], 0
+        if block:
+            _flush(block)
+    return b"".join(chunks), blocks
+
+
+def _write_atomically(path: Path, content: bytes) -> None:
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as fout:
+        fout.write(content)
+        fout.flush()
+        os.fsync(fout.fileno())
+    os.replace(tmp_path, path)
+
+
+def _write_sidecar(path: Path, size: int, blocks: List[Block]) -> None:
+    sidecar = {
+        "format": SIDECAR_FORMAT,
+        "size": size,
+        "blocks": [
+            {
+                **block._asdict(),
+                "first": block.first.isoformat(),
+                "last": block.last.isoformat(),
+            }
+            for block in blocks
+        ],
+    }
+    content = json.dumps(sidecar).encode()
+    _write_atomically(path.with_suffix(SIDECAR_SUFFIX), content)
+
+
+def write_segment(
+    path: Path, records: Iterable[Record], *, binary: bool = False
+) -> List[Block]:
+    """Replace segment with the records, and write its sidecar index.
+
+    Parameters:
+        path: Path to the segment.
+        records: Records in chronological order.
+        binary: Encode the blocks with the binary codec where possible.
+
+    Returns:
+        Blocks of the segment.
+    """
+    content, blocks = _pack(records, binary)
+    _store_segment(path, content, blocks)
+    return blocks
+
+
+def _store_segment(path: Path, content: bytes, blocks: List[Block]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _write_atomically(path, content)
+    _write_sidecar(path, len(content), blocks)
+
+
+def _remove_dumps(names: Iterable[str]) -> None:
+    root = data_dir()
+    for name in names:
+        with suppress(FileNotFoundError):
+            (root / name).unlink()
+
+
+def _finish_journals() -> None:
+    """Finish compactions interrupted by a crash.
+
+    If the segment was replaced, the journaled dump files are
+    already in it, and are removed. Otherwise the compaction
+    did not happen, and the dump files are kept.
+    """
+    folder = segments_dir()
+    for journal in sorted(folder.glob(f"*{JOURNAL_SUFFIX}")):
+        try:
+            entry = json.loads(journal.read_bytes())
+        except ValueError:
+            entry = {}
+        segment = journal.with_suffix(SEGMENT_SUFFIX)
+        with suppress(FileNotFoundError):
+            digest = hashlib.sha256(segment.read_bytes()).hexdigest()
+            if entry and digest == entry["digest"]:
+                _remove_dumps(entry["dumps"])
+        journal.unlink()
+
+
+def recover() -> None:
+    """Finish compactions interrupted by a crash, if there are any.
+
+    Until then, records of the interrupted compaction would be read
+    twice: from the segment, and from the dump files packed into it.
+    """
+    folder = segments_dir()
+    if not folder.is_dir() or not any(folder.glob(f"*{JOURNAL_SUFFIX}")):
+        return
+    with locked():
+        _finish_journals()
+
+
+def _scan_blocks(path: Path) -> List[Block]:
+    """Recover blocks of a segment, by decompressing its gzip members."""
+    content = path.read_bytes()
+    blocks = []
+    offset = 0
+    while offset < len(content):
+        decompressor = zlib.decompressobj(wbits=31)
+        decompressor.decompress(content[offset:])
+        length = len(content) - offset - len(decompressor.unused_data)
+        records = list(_decode_block(content[offset : offset + length]))
+        blocks.append(
+            Block(
+                offset,
+                length,
+                records[0].bug_name,
+                len(records),
+                records[0].timestamp,
+                records[-1].timestamp,
+            )
+        )
+        offset += length
+    return blocks
+
+
+def read_sidecar(path: Path) -> List[Block]:
+    """Read blocks of a segment from its sidecar index.
+
+    A missing or outdated sidecar (e.g. when compaction was interrupted
+    in between of replacing the segment and its sidecar) is rebuilt
+    from the segment itself.
+
+    Parameters:
+        path: Path to the segment.
+
+    Returns:
+        Blocks of the segment.
+    """
+    size = path.stat().st_size
+    try:
+        sidecar = json.loads(path.with_suffix(SIDECAR_SUFFIX).read_bytes())
+    except (FileNotFoundError, ValueError):
+        sidecar = {}
+    if sidecar.get("format") != SIDECAR_FORMAT or sidecar["size"] != size:
+        blocks = _scan_blocks(path)
+        with suppress(OSError):
+            _write_sidecar(path, size, blocks)
+        return blocks
+    return [
+        Block(
+            **{
+                **block,
+                "first": datetime.fromisoformat(block["first"]),
+                "last": datetime.fromisoformat(block["last"]),
+            }
+        )
+        for block in sidecar["blocks"]
+    ]
+
+
+def read_segment(
+    path: Path,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    bug_name: Optional[str] = None,
+) -> List[Record]:
+    """Read records from a segment.
+
+    Only the blocks which may hold the matching records are decompressed,
+    straight from the memory map for large segments.
+
+    Parameters:
+        path: Path to the segment.
+        since: Only records logged at or after this time.
+        until: Only records logged before this time.
+        bug_name: Only records of this class.
+
+    Returns:
+        Records in chronological order.
+    """
+    blocks = [
+        block
+        for block in read_sidecar(path)
+        if (bug_name is None or block.bug_name == bug_name)
+        and (since is None or block.last >= since)
+        and (until is None or block.first < until)
+    ]
+    records = []
+    with mapped(path) as buffer:
+        view = memoryview(buffer)
+        for block in blocks:
+            payload = view[block.offset : block.offset + block.length]
+            for record in _decode_block(payload, since, until):
+                if since is not None and record.timestamp < since:
+                    continue
+                if until is not None and record.timestamp >= until:
+                    continue
+                records.append(record)
+            payload.release()
+        view.release()
+    return sorted(records, key=_record_order)
+
+
+def iter_segment_files(
+    since: Optional[datetime] = None, until: Optional[datetime] = None
+) -> Iterator[Path]:
+    """List segments, which may hold the time range.
+
+    Parameters:
+        since: Start of the time range.
+        until: End of the time range.
+
+    Returns:
+        Paths to the segments, in chronological order.
+    """
+    folder = segments_dir()
+    if not folder.is_dir():
+        return
+    for name in sorted(os.listdir(folder)):
+        stem, suffix = os.path.splitext(name)
+        if suffix != SEGMENT_SUFFIX:
+            continue
+        try:
+            month = tuple(map(int, stem.split("-")))
+        except ValueError:
+            continue
+        if since is not None and month < since.timetuple()[:2]:
+            continue
+        if until is not None and month > until.timetuple()[:2]:
+            continue
+        yield folder / name
+
+
+def iter_segment_records(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    bug_name: Optional[str] = None,
+) -> Iterator[Record]:
+    """Read records from all the segments.
+
+    Parameters:
+        since: Only records logged at or after this time.
+        until: Only records logged before this time.
+        bug_name: Only records of this class.
+
+    Returns:
+        Records in chronological order.
+    """
+    for path in iter_segment_files(since, until):
+        yield from read_segment(path, since, until, bug_name)
+
+
+def compact(
+    until: Optional[datetime] = None, *, binary: bool = False
+) -> Dict[Path, int]:
+    """Pack dump files of the closed months into segments.
+
+    Each month gets a ``segments/YYYY-MM.seg`` file of gzip members,
+    each one a block of records of a single class, so that a block
+    can be read on its own. Offsets, classes and time ranges
+    of the blocks are kept in a ``YYYY-MM.idx`` sidecar.
+    Dump files logged into an already compacted month
+    are merged into its segment.
+    The packed dump files are journaled before the segment is replaced,
+    so that a compaction interrupted by a crash is finished
+    by :func:`recover`, instead of leaving the records duplicated.
+
+    Parameters:
+        until: Only months which end before this time
+            (the current month is never compacted).
+        binary: Encode the blocks with the schema-derived binary codec
+            (see :mod:`buglog.codec`), instead of JSON lines.
+            Records which do not fit the current config are kept as JSON.
+
+    Returns:
+        Mapping from the written segments to the number
+        of dump files packed into them.
+    """
+    now = datetime.now()
+    until = min(until or now, now).replace(
+        day=1, hour=0, minute=0, second=0, microsecond=0
+    )
+
+    packed = {}
+    root = data_dir()
+    with locked():
+        _roll_back_journal(root)
+        if segments_dir().is_dir():
+            _finish_journals()
+        dumps = sorted(
+            iter_dump_files(until=until), key=lambda d: (d.timestamp, d.path)
+        )
+        for path, group in itertools.groupby(
+            dumps, lambda d: segment_path(d.timestamp)
+        ):
+            month_dumps = list(group)
+            records = read_segment(path) if path.exists() else []
+            records.extend(
+                Record(dump.timestamp, dump.bug_name, data)
+                for dump in month_dumps
+                for data in read_file(dump.path)
+            )
+            content, blocks = _pack(sorted(records, key=_record_order), binary)
+            journal = path.with_suffix(JOURNAL_SUFFIX)
+            names = [
+                os.fspath(dump.path.relative_to(root)) for dump in month_dumps
+            ]
+            path.parent.mkdir(parents=True, exist_ok=True)
+            _write_atomically(
+                journal,
+                json.dumps(
+                    {
+                        "digest": hashlib.sha256(content).hexdigest(),
+                        "dumps": names,
+                    }
+                ).encode(),
+            )
+            _store_segment(path, content, blocks)
+            _remove_dumps(names)
+            journal.unlink()
+            packed[path] = len(month_dumps)
+        _remove_empty_partitions(root)
+
+    return packed
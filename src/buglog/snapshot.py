@@ -0,0 +1,88 @@
+import json
+import os
+from contextlib import suppress
+from typing import Any
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+
+from buglog.bootstrap import cache_dir
+from buglog.bootstrap import config_digest
+from buglog.bootstrap import config_path
+from buglog.bootstrap import ensure_config
+from buglog.trace import span
+
+Schema = Dict[str, Any]
+
+SNAPSHOT_FORMAT = 1
+
+_loaded: Dict[str, Dict[str, Schema]] = {}
+# Path, modification time and size of the config, and its digest
+_stat: Optional[Tuple[str, int, int]] = None
+_digest = ""
+
+
+def build_snapshot() -> Dict[str, Schema]:
+    """Import the config and collect JSON schemas of all its Bugs.
+
+    Returns:
+        Mapping from the Bug class name to its schema
+        (title, description, fields' titles, defaults and constraints).
+    """
+    from buglog.utils import get_bug_subclasses
+
+    return {
+        bug_class.__name__: json.loads(bug_class.schema_json())
+        for bug_class in get_bug_subclasses()
+    }
+
+
+def load_snapshot() -> Dict[str, Schema]:
+    """Get schemas of all the Bugs without importing the config.
+
+    The schemas are read from a snapshot file in the cache folder,
+    keyed by the config's content hash. If there is no snapshot
+    for the current config, the config is imported and a new
+    snapshot is written, replacing the stale ones.
+    The config is only hashed again if its modification time
+    or size have changed since the last call.
+
+    Returns:
+        Mapping from the Bug class name to its schema,
+        in order of definition.
+    """
+    global _stat, _digest
+
+    path = str(config_path())
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        ensure_config()
+        stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    if key != _stat:
+        _stat, _digest = key, config_digest()
+    digest = _digest
+    if digest in _loaded:
+        return _loaded[digest]
+
+    snapshot_dir = cache_dir()
+    snapshot_path = snapshot_dir / f"schema-{SNAPSHOT_FORMAT}-{digest}.json"
+    try:
+        with open(snapshot_path, "r") as fin:
+            snapshot: Dict[str, Schema] = json.load(fin)
+    except (FileNotFoundError, ValueError):
+        with span("build snapshot"):
+            snapshot = build_snapshot()
+        snapshot_dir.mkdir(parents=True, exist_ok=True)
+        for stale_path in snapshot_dir.glob("schema-*.json"):
+            with suppress(FileNotFoundError):
+                stale_path.unlink()
+        tmp_path = snapshot_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w") as fout:
+            json.dump(snapshot, fout)
+        os.replace(tmp_path, snapshot_path)
+
+    _loaded.clear()
+    _loaded[digest] = snapshot
+    return snapshot
@@ -0,0 +1,303 @@
+import itertools
+import math
+from array import array
+from datetime import date
+from datetime import datetime
+from datetime import timedelta
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+from buglog.index import bucket_bounds
+from buglog.index import rollups
+from buglog.snapshot import load_snapshot
+from buglog.storage import iter_records
+
+EPOCH = datetime(1970, 1, 1)
+SECONDS_PER_DAY = 24 * 60 * 60
+# 1970-01-01 was a Thursday, while weeks start on Mondays
+_WEEK_SHIFT_DAYS = 3
+
+GRANULARITIES = ("day", "week", "month")
+AGGREGATES = ("count", "sum", "mean", "min", "max")
+
+# Array typecodes of the numeric JSON schema types
+_TYPECODES = {"integer": "q", "number": "d", "boolean": "q"}
+# JSON schema types of the fields, which are rolled up in the index
+_ROLLUP_TYPES = ("integer", "number")
+
+
+class Columns(NamedTuple):
+    """Records of a single Bug class, stored column-wise.
+
+    Attributes:
+        timestamps: Seconds since the epoch, in the local time.
+        fields: Numeric fields' values, ``NaN`` marks missing ones
+            (in which case integers get stored as floats).
+    """
+
+    timestamps: "array[int]"
+    fields: Dict[str, "array[Any]"]
+
+
+def numeric_fields(bug_name: str) -> Dict[str, str]:
+    """Get numeric fields of a Bug class.
+
+    Parameters:
+        bug_name: Class name of the bug.
+
+    Returns:
+        Mapping from the field names to the array typecodes.
+    """
+    props = load_snapshot()[bug_name]["properties"]
+    return {
+        field: _TYPECODES[prop["type"]]
+        for field, prop in props.items()
+        if prop.get("type") in _TYPECODES
+    }
+
+
+def _field_type(bug_name: str, field: str) -> Optional[str]:
+    return load_snapshot()[bug_name]["properties"][field].get("type")
+
+
+def load_columns(
+    bug_name: str,
+    fields: Optional[Iterable[str]] = None,
+    *,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> Columns:
+    """Read records of a Bug class into typed columns.
+
+    Only the dump files and segment blocks of the class are read.
+
+    Parameters:
+        bug_name: Class name of the bug.
+        fields: Numeric fields to be loaded (all of them by default).
+        since: Only records logged at or after this time.
+        until: Only records logged before this time.
+
+    Returns:
+        The columns, sorted by the timestamps.
+    """
+    typecodes = numeric_fields(bug_name)
+    if fields is not None:
+        typecodes = {field: typecodes[field] for field in fields}
+
+    timestamps = array("q")
+    columns: Dict[str, "array[Any]"] = {
+        field: array(code) for field, code in typecodes.items()
+    }
+    last_timestamp, seconds = None, 0
+    for timestamp, _, data in iter_records(since, until, bug_name):
+        # Records of a dump file share the timestamp
+        if timestamp != last_timestamp:
+            last_timestamp = timestamp
+            seconds = int((timestamp - EPOCH).total_seconds())
+        timestamps.append(seconds)
+        for field, column in columns.items():
+            value = data.get(field)
+            try:
+                column.append(value)
+            except (TypeError, OverflowError):
+                _append_unfit(columns, field, value)
+
+    return Columns(timestamps, columns)
+
+
+def _append_unfit(
+    columns: Dict[str, "array[Any]"], field: str, value: Any
+) -> None:
+    """Append value not fitting the typecode of its column.
+
+    Integer columns are turned into floats, to hold either a fractional
+    number or ``NaN``. Values which are not numbers (missing, or logged
+    before the field's type was changed) are stored as ``NaN``.
+    """
+    column = columns[field]
+    if column.typecode == "q":
+        column = columns[field] = array("d", column)
+    if isinstance(value, (int, float)):
+        column.append(float(value))
+    else:
+        column.append(math.nan)
+
+
+def bucket_start(seconds: int, granularity: str) -> date:
+    """Get the first day of the bucket a timestamp falls into.
+
+    Example:
+        >>> seconds = int((datetime(2020, 7, 23, 8) - EPOCH).total_seconds())
+        >>> bucket_start(seconds, "week")
+        datetime.date(2020, 7, 20)
+
+    Parameters:
+        seconds: Seconds since the epoch.
+        granularity: One of ``day``, ``week`` or ``month``.
+
+    Returns:
+        The day, the Monday or the first day of the month.
+    """
+    day = EPOCH.date() + timedelta(days=seconds // SECONDS_PER_DAY)
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def _aggregate_python(
+    keys: Sequence[date], values: Sequence[float], how: str
+) -> List[Tuple[date, float]]:
+    funcs: Dict[str, Callable[[List[float]], float]] = {
+        "count": len,
+        "sum": math.fsum,
+        "mean": lambda vs: math.fsum(vs) / len(vs),
+        "min": min,
+        "max": max,
+    }
+    result = []
+    for key, group in itertools.groupby(zip(keys, values), lambda kv: kv[0]):
+        present = [v for _, v in group if not math.isnan(v)]
+        if present:
+            result.append((key, float(funcs[how](present))))
+    return result
+
+
+def _aggregate_numpy(
+    np: Any, seconds: "array[int]", values: "array[Any]", by: str, how: str
+) -> List[Tuple[date, float]]:
+    times = np.frombuffer(seconds, dtype=np.int64)
+    data = np.frombuffer(values, dtype=np.dtype(values.typecode))
+    data = data.astype(np.float64)
+    present = ~np.isnan(data)
+    times, data = times[present], data[present]
+    if not len(data):
+        return []
+
+    stamps = times.astype("datetime64[s]")
+    if by == "month":
+        keys = stamps.astype("datetime64[M]").astype("datetime64[D]")
+    else:
+        keys = stamps.astype("datetime64[D]")
+        if by == "week":
+            # Days since the epoch, shifted so that weeks start on Mondays
+            days = keys.astype(np.int64) + _WEEK_SHIFT_DAYS
+            keys = (days - days % 7 - _WEEK_SHIFT_DAYS).astype("datetime64[D]")
+
+    # Timestamps are sorted, so the buckets are contiguous
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    counts = np.diff(np.r_[starts, len(data)])
+    reduced = {
+        "count": lambda: counts,
+        "sum": lambda: np.add.reduceat(data, starts),
+        "mean": lambda: np.add.reduceat(data, starts) / counts,
+        "min": lambda: np.minimum.reduceat(data, starts),
+        "max": lambda: np.maximum.reduceat(data, starts),
+    }[how]()
+    return [
+        (key.item(), float(value)) for key, value in zip(keys[starts], reduced)
+    ]
+
+
+def aggregate(
+    columns: Columns, field: str, *, by: str = "day", how: str = "sum"
+) -> List[Tuple[date, float]]:
+    """Aggregate field's values over time buckets.
+
+    NumPy is used for vectorized aggregation, if it is installed.
+
+    Parameters:
+        columns: Loaded records.
+        field: Name of the numeric field.
+        by: Bucket size: ``day``, ``week`` or ``month``.
+        how: One of ``count``, ``sum``, ``mean``, ``min`` or ``max``.
+            Missing values are skipped.
+
+    Returns:
+        First days of the non-empty buckets and the aggregated values.
+    """
+    assert by in GRANULARITIES and how in AGGREGATES
+    try:
+        import numpy as np
+    except ImportError:
+        keys = [bucket_start(s, by) for s in columns.timestamps]
+        values = array("d", columns.fields[field])
+        return _aggregate_python(keys, values, how)
+    return _aggregate_numpy(
+        np, columns.timestamps, columns.fields[field], by, how
+    )
+
+
+def _is_bucket_start(moment: Optional[datetime], granularity: str) -> bool:
+    """Check whether the time is at a boundary of the buckets."""
+    if moment is None:
+        return True
+    start, _ = bucket_bounds(moment, granularity)
+    return moment == datetime.combine(start, datetime.min.time())
+
+
+def _from_rollup(
+    how: str, count: int, total: float, low: float, high: float
+) -> float:
+    return {
+        "count": count,
+        "sum": total,
+        "mean": total / count,
+        "min": low,
+        "max": high,
+    }[how]
+
+
+def iter_stats(
+    bug_name: str,
+    field: str,
+    *,
+    by: str = "day",
+    how: str = "sum",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> Iterator[Tuple[date, float]]:
+    """Aggregate field of a Bug class over time buckets.
+
+    The aggregates are read from the rollups in the index,
+    so they cost O(buckets), unless the time range splits
+    some buckets, or the field is not a number; then the records
+    are loaded and aggregated.
+
+    Parameters:
+        bug_name: Class name of the bug.
+        field: Name of the numeric field.
+        by: Bucket size: ``day``, ``week`` or ``month``.
+        how: One of ``count``, ``sum``, ``mean``, ``min`` or ``max``.
+        since: Only records logged at or after this time.
+        until: Only records logged before this time.
+
+    Returns:
+        First days of the non-empty buckets and the aggregated values.
+    """
+    if (
+        _field_type(bug_name, field) in _ROLLUP_TYPES
+        and _is_bucket_start(since, by)
+        and _is_bucket_start(until, by)
+    ):
+        for bucket, count, total, low, high in rollups(
+            bug_name,
+            field,
+            by,
+            since=since and since.date(),
+            until=until and until.date(),
+        ):
+            yield bucket, float(_from_rollup(how, count, total, low, high))
+        return
+
+    columns = load_columns(bug_name, [field], since=since, until=until)
+    yield from aggregate(columns, field, by=by, how=how)
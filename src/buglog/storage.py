@@ -0,0 +1,572 @@
+import fcntl
+import heapq
+import json
+import mmap
+import os
+from contextlib import contextmanager
+from contextlib import suppress
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Mapping
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+from buglog.bootstrap import data_dir
+
+LOCK_NAME = ".lock"
+LAYOUT_NAME = ".layout"
+# Sizes of the files written by a commit in progress, to roll them back
+COMMIT_JOURNAL_NAME = ".commit.pending"
+# Dump files are either all kept in the data folder itself,
+# or partitioned into ``YYYY/MM/DD/`` subfolders
+FLAT = "flat"
+PARTITIONED = "partitioned"
+LAYOUTS = (FLAT, PARTITIONED)
+# Records are appended to JSON lines files,
+# while legacy files hold a single JSON array
+SUFFIX = ".jsonl"
+LEGACY_SUFFIX = ".json"
+
+_DATE_LEN = len("YYYY-MM-DD_hh:mm:ss")
+_APPEND_FLAGS = os.O_WRONLY | os.O_APPEND | os.O_CREAT
+# Files of this size and larger are memory-mapped, instead of read at once
+MMAP_MIN_SIZE = 1024 * 1024
+
+
+class Record(NamedTuple):
+    """A single logged bug, as read back from the data folder."""
+
+    timestamp: datetime
+    bug_name: str
+    data: Dict[str, Any]
+
+
+def parse_file_name(file_name: str) -> Tuple[datetime, str]:
+    """Get bug's timestamp and class name from its dump file name.
+
+    Example:
+        >>> parse_file_name('2007-12-06_15:29:43_Squats.jsonl')
+        (datetime.datetime(2007, 12, 6, 15, 29, 43), 'Squats')
+
+    Parameters:
+        file_name: Name of the dump file (either new or legacy one).
+
+    Returns:
+        Timestamp and class name of the bug.
+
+    Raises:
+        ValueError: The file name is not of a dump file.
+    """
+    stem, suffix = os.path.splitext(file_name)
+    if suffix not in (SUFFIX, LEGACY_SUFFIX) or stem[_DATE_LEN:][:1] != "_":
+        raise ValueError(f"not a dump file name: {file_name!r}")
+    timestamp = datetime.fromisoformat(stem[:_DATE_LEN].replace("_", "T"))
+    return timestamp, stem[_DATE_LEN + 1 :]
+
+
+@contextmanager
+def locked() -> Iterator[None]:
+    """Hold an exclusive lock on the data folder.
+
+    Concurrent ``bug`` processes serialize their writes on this lock.
+    """
+    root = data_dir()
+    root.mkdir(parents=True, exist_ok=True)
+    with open(root / LOCK_NAME, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def get_layout() -> str:
+    """Get layout of the data folder.
+
+    Returns:
+        Either ``"flat"`` (the default) or ``"partitioned"``.
+    """
+    try:
+        layout = (data_dir() / LAYOUT_NAME).read_text().strip()
+    except FileNotFoundError:
+        return FLAT
+    return layout if layout in LAYOUTS else FLAT
+
+
+def _partition(timestamp: datetime) -> str:
+    return timestamp.strftime("%Y/%m/%d")
+
+
+def dump_path(
+    file_name: Union[Path, str], *, layout: Optional[str] = None
+) -> Path:
+    """Get path of a dump file, according to the data folder's layout.
+
+    Parameters:
+        file_name: Name of the dump file. Names with folders
+            are treated as relative to the data folder as is.
+        layout: Layout of the data folder (read from it, if not given).
+
+    Returns:
+        Path to the dump file.
+    """
+    root = data_dir()
+    if os.path.dirname(file_name):
+        return root / file_name
+    return _layout_path(root, os.fspath(file_name), layout or get_layout())
+
+
+def _layout_path(root: Path, file_name: str, layout: str) -> Path:
+    if layout == FLAT:
+        return root / file_name
+    try:
+        timestamp, _ = parse_file_name(file_name)
+    except ValueError:
+        return root / file_name
+    return root / _partition(timestamp) / file_name
+
+
+def _write_all(fd: int, payload: bytes) -> None:
+    view = memoryview(payload)
+    while view:
+        view = view[os.write(fd, view) :]
+
+
+def _truncate_torn_tail(fd: int) -> None:
+    """Drop an incomplete last line, left by an interrupted write."""
+    size = os.fstat(fd).st_size
+    end = size
+    chunk_size = 4096
+    while end > 0:
+        start = max(0, end - chunk_size)
+        chunk = os.pread(fd, end - start, start)
+        newline = chunk.rfind(b"\n")
+        if newline != -1:
+            end = start + newline + 1
+            break
+        end = start
+    if end != size:
+        os.ftruncate(fd, end)
+
+
+def _fsync_dir(path: Path) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _file_sizes(paths: Iterable[Path]) -> Dict[Path, Optional[int]]:
+    """Get sizes of the files (``None`` if missing), without torn tails."""
+    sizes: Dict[Path, Optional[int]] = {}
+    for path in paths:
+        try:
+            fd = os.open(path, os.O_RDWR)
+        except FileNotFoundError:
+            sizes[path] = None
+            continue
+        try:
+            _truncate_torn_tail(fd)
+            sizes[path] = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+    return sizes
+
+
+def _write_journal(
+    root: Path, sizes: Mapping[Path, Optional[int]], *, fsync: bool
+) -> None:
+    entry = [
+        [os.fspath(path.relative_to(root)), size]
+        for path, size in sizes.items()
+    ]
+    tmp_path = root / f"{COMMIT_JOURNAL_NAME}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as fout:
+        fout.write(json.dumps(entry).encode())
+        if fsync:
+            fout.flush()
+            os.fsync(fout.fileno())
+    os.replace(tmp_path, root / COMMIT_JOURNAL_NAME)
+    if fsync:
+        _fsync_dir(root)
+
+
+def _roll_back_journal(root: Path) -> None:
+    """Restore the files of an unfinished commit to their former sizes."""
+    journal = root / COMMIT_JOURNAL_NAME
+    try:
+        entry = json.loads(journal.read_bytes())
+    except FileNotFoundError:
+        return
+    except ValueError:
+        # Torn journal, the commit did not start writing
+        entry = []
+    for file_name, size in entry:
+        path = root / file_name
+        with suppress(FileNotFoundError):
+            if size is None:
+                path.unlink()
+            elif path.stat().st_size > size:
+                os.truncate(path, size)
+    journal.unlink()
+
+
+def roll_back() -> None:
+    """Roll back a commit interrupted by a crash, if there is one.
+
+    Until then, only a part of its records would be read.
+    """
+    root = data_dir()
+    if not (root / COMMIT_JOURNAL_NAME).exists():
+        return
+    with locked():
+        _roll_back_journal(root)
+
+
+def commit(
+    batch: Mapping[Union[Path, str], Iterable[Dict[str, Any]]],
+    *,
+    fsync: bool = True,
+) -> List[Path]:
+    """Append records to several dump files as a single transaction.
+
+    All the files are written under one hold of the data folder's lock,
+    with a single ``write()`` per file opened in append mode,
+    so each write costs O(1) regardless of the file size.
+
+    Former sizes of the files are journaled before they are written,
+    and the journal is removed once all of them are. If any write
+    fails, or the process dies in between (see :func:`roll_back`),
+    all the files are rolled back.
+
+    Parameters:
+        batch: Mapping from dump file names (relative to the data folder)
+            to the records to be appended to them.
+        fsync: Flush the files (and the folder, if any file
+            was created) to the disk before returning.
+            Without it, the batch is atomic only if the system
+            does not crash.
+
+    Returns:
+        Paths to the written dump files.
+    """
+    payloads = {}
+    for file_name, records in batch.items():
+        lines = "".join(json.dumps(record) + "\n" for record in records)
+        payloads[file_name] = lines.encode()
+
+    root = data_dir()
+    with locked():
+        _roll_back_journal(root)
+        layout = get_layout()
+        paths = [dump_path(name, layout=layout) for name in payloads]
+        sizes = _file_sizes(paths)
+        _write_journal(root, sizes, fsync=fsync)
+        try:
+            for path, payload in zip(paths, payloads.values()):
+                path.parent.mkdir(parents=True, exist_ok=True)
+                fd = os.open(path, _APPEND_FLAGS, 0o644)
+                try:
+                    _write_all(fd, payload)
+                    if fsync:
+                        os.fsync(fd)
+                finally:
+                    os.close(fd)
+            if fsync:
+                for parent in {
+                    p.parent for p, s in sizes.items() if s is None
+                }:
+                    _fsync_dir(parent)
+        except BaseException:
+            _roll_back_journal(root)
+            raise
+
+        (root / COMMIT_JOURNAL_NAME).unlink()
+        if fsync:
+            _fsync_dir(root)
+
+    return paths
+
+
+def append_records(
+    file_name: Union[Path, str],
+    records: Iterable[Dict[str, Any]],
+    *,
+    fsync: bool = True,
+) -> Path:
+    """Append records to a dump file, one JSON document per line.
+
+    Parameters:
+        file_name: Name of the dump file, relative to the data folder.
+        records: Records to be written.
+        fsync: Flush the file to the disk before returning.
+
+    Returns:
+        Path to the dump file.
+    """
+    (path,) = commit({file_name: records}, fsync=fsync)
+    return path
+
+
+@contextmanager
+def mapped(path: Union[Path, str]) -> Iterator[Union[bytes, mmap.mmap]]:
+    """Open file for reading, memory-mapping it if it is large.
+
+    Mapped pages are read lazily and can be evicted under memory
+    pressure, so even multi-GB files are scanned in bounded memory.
+
+    Parameters:
+        path: Path to the file.
+
+    Returns:
+        Context manager of the file's content: either the bytes
+        (for small files) or the read-only memory map.
+    """
+    with open(path, "rb") as fin:
+        size = os.fstat(fin.fileno()).st_size
+        # Empty files can not be mapped
+        if not size or size < MMAP_MIN_SIZE:
+            yield fin.read()
+            return
+        mapping = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield mapping
+        finally:
+            # Slices still held by the caller keep it open until collected
+            with suppress(BufferError):
+                mapping.close()
+
+
+def iter_lines(buffer: Union[bytes, mmap.mmap]) -> Iterator[memoryview]:
+    """Iterate non-empty lines of a buffer, without copying them.
+
+    Example:
+        >>> [bytes(line) for line in iter_lines(b'{"a": 1}\\n\\n{"a": 2')]
+        [b'{"a": 1}']
+
+    Parameters:
+        buffer: Content of a JSON lines file.
+
+    Returns:
+        Slices of the buffer, without the newlines. The last line
+        is skipped if incomplete (left by an interrupted write).
+    """
+    view = memoryview(buffer)
+    start = 0
+    while True:
+        end = buffer.find(b"\n", start)
+        if end == -1:
+            return
+        if end > start:
+            yield view[start:end]
+        start = end + 1
+
+
+def read_file(path: Union[Path, str]) -> Iterator[Dict[str, Any]]:
+    """Read records from a dump file.
+
+    Large files are memory-mapped, and decoded line by line.
+
+    Parameters:
+        path: Path to either a JSON lines or a legacy JSON array file.
+
+    Returns:
+        Records stored in the file.
+    """
+    if os.fspath(path).endswith(LEGACY_SUFFIX):
+        with open(path, "rb") as fin:
+            yield from json.loads(fin.read())
+        return
+
+    with mapped(path) as buffer:
+        for line in iter_lines(buffer):
+            yield json.loads(bytes(line))
+
+
+class DumpFile(NamedTuple):
+    """A dump file in the data folder."""
+
+    path: Path
+    timestamp: datetime
+    bug_name: str
+
+
+def _scan_dumps(
+    folder: Path, since: Optional[datetime], until: Optional[datetime]
+) -> Iterator[DumpFile]:
+    """List dump files in a folder, logged in the time range."""
+    for entry in os.scandir(folder):
+        try:
+            timestamp, bug_name = parse_file_name(entry.name)
+        except ValueError:
+            continue
+        if since is not None and timestamp < since:
+            continue
+        if until is not None and timestamp >= until:
+            continue
+        yield DumpFile(folder / entry.name, timestamp, bug_name)
+
+
+def _scan_partitions(
+    folder: Path,
+    prefix: Tuple[int, ...],
+    since: Optional[datetime],
+    until: Optional[datetime],
+) -> Iterator[Path]:
+    """List ``YYYY/MM/DD`` partitions, which may hold the time range.
+
+    Parameters:
+        folder: The folder to look for partitions in.
+        prefix: Year and month of the folder (if it is a partition).
+        since: Start of the time range.
+        until: End of the time range.
+    """
+    if len(prefix) == 3:
+        yield folder
+        return
+    for entry in os.scandir(folder):
+        if not entry.name.isdigit() or not entry.is_dir():
+            continue
+        part = prefix + (int(entry.name),)
+        # Compare the partition with the range, truncated to its precision
+        if since is not None and part < since.timetuple()[: len(part)]:
+            continue
+        if until is not None and part > until.timetuple()[: len(part)]:
+            continue
+        yield from _scan_partitions(folder / entry.name, part, since, until)
+
+
+def iter_dump_files(
+    since: Optional[datetime] = None, until: Optional[datetime] = None
+) -> Iterator[DumpFile]:
+    """List dump files in the data folder.
+
+    Both the flat and ``YYYY/MM/DD/`` partitioned layouts are read,
+    partitions which can not hold the time range are skipped.
+
+    Parameters:
+        since: Only files logged at or after this time.
+        until: Only files logged before this time.
+
+    Returns:
+        Dump files in no particular order.
+    """
+    root = data_dir()
+    if not root.is_dir():
+        return
+
+    yield from _scan_dumps(root, since, until)
+    for partition in _scan_partitions(root, (), since, until):
+        yield from _scan_dumps(partition, since, until)
+
+
+def iter_records(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    bug_name: Optional[str] = None,
+) -> Iterator[Record]:
+    """Read records from the data folder.
+
+    Records of the compacted months are read from the segments,
+    and merged with the ones in the dump files.
+
+    Parameters:
+        since: Only records logged at or after this time.
+        until: Only records logged before this time.
+        bug_name: Only records of this class.
+
+    Returns:
+        Records in chronological order.
+    """
+    from buglog.segments import iter_segment_records
+    from buglog.segments import recover
+
+    roll_back()
+    recover()
+    dumps = sorted(
+        (
+            dump
+            for dump in iter_dump_files(since, until)
+            if bug_name is None or dump.bug_name == bug_name
+        ),
+        key=lambda d: (d.timestamp, d.path),
+    )
+    loose = (
+        Record(dump.timestamp, dump.bug_name, data)
+        for dump in dumps
+        for data in read_file(dump.path)
+    )
+    yield from heapq.merge(
+        iter_segment_records(since, until, bug_name),
+        loose,
+        key=lambda r: (r.timestamp, r.bug_name),
+    )
+
+
+def _move_dump(src: Path, dst: Path) -> None:
+    """Move dump file, merging it into the destination if it exists."""
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    if not dst.exists():
+        os.rename(src, dst)
+        return
+    if dst.suffix == LEGACY_SUFFIX:
+        merged = list(read_file(dst)) + list(read_file(src))
+        tmp_path = dst.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w") as fout:
+            json.dump(merged, fout)
+        os.replace(tmp_path, dst)
+    else:
+        lines = "".join(json.dumps(record) + "\n" for record in read_file(src))
+        with open(dst, "a") as fout:
+            fout.write(lines)
+    src.unlink()
+
+
+def _remove_empty_partitions(root: Path) -> None:
+    for folder, _, _ in os.walk(root, topdown=False):
+        relative = os.path.relpath(folder, root)
+        if relative != "." and relative.replace(os.sep, "").isdigit():
+            with suppress(OSError):
+                os.rmdir(folder)
+
+
+def migrate(layout: str) -> int:
+    """Move the dump files into the given layout of the data folder.
+
+    The files are moved one by one while the folders are scanned,
+    so the whole listing is never kept in memory.
+    Subsequent writes follow the new layout.
+
+    Parameters:
+        layout: Either ``"flat"`` or ``"partitioned"``.
+
+    Returns:
+        Number of the moved files.
+
+    Raises:
+        ValueError: Unknown layout.
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"unknown layout: {layout!r}")
+
+    root = data_dir()
+    moved = 0
+    with locked():
+        _roll_back_journal(root)
+        (root / LAYOUT_NAME).write_text(f"{layout}\n")
+        for dump in iter_dump_files():
+            target = _layout_path(root, dump.path.name, layout)
+            if target != dump.path:
+                _move_dump(dump.path, target)
+                moved += 1
+        _remove_empty_partitions(root)
+
+    return moved
@@ -0,0 +1,166 @@
+import atexit
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextlib import nullcontext
+from typing import Any
+from typing import ContextManager
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import TextIO
+
+TRACE_ENV = "BUGLOG_TRACE"
+# Value of the environment variable printing the spans to stderr,
+# any other (non-empty) one is a path to write a Chrome trace into
+STDERR = "stderr"
+_STDERR_ALIASES = ("1", "yes", "true", STDERR)
+
+
+class Span(NamedTuple):
+    """A timed stage of the run."""
+
+    name: str
+    start: int
+    duration: int
+    depth: int
+    thread: int
+    args: Dict[str, Any]
+
+
+class Tracer:
+    """Collector of the spans.
+
+    Parameters:
+        output: Where the spans go when :meth:`finish` is called:
+            ``stderr`` for a breakdown of the timings,
+            otherwise a path to the Chrome trace JSON file
+            (to be opened in ``chrome://tracing`` or Perfetto).
+    """
+
+    def __init__(self, output: str = STDERR) -> None:
+        self.output = output
+        self.origin = time.perf_counter_ns()
+        self.spans: List[Span] = []
+        self._depths: Dict[int, int] = {}
+
+    @contextmanager
+    def span(self, name: str, args: Dict[str, Any]) -> Iterator[None]:
+        thread = threading.get_ident()
+        depth = self._depths.get(thread, 0)
+        self._depths[thread] = depth + 1
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter_ns() - start
+            self._depths[thread] = depth
+            self.spans.append(
+                Span(name, start - self.origin, duration, depth, thread, args)
+            )
+
+    def print_breakdown(self, file: TextIO) -> None:
+        """Print the spans as an indented tree of their timings.
+
+        Parameters:
+            file: Stream to print into.
+        """
+        print("buglog trace:", file=file)
+        for span in sorted(self.spans, key=lambda s: (s.thread, s.start)):
+            args = " ".join(f"{k}={v}" for k, v in span.args.items())
+            print(
+                f"{span.duration / 1e6:10.2f} ms  "
+                + "  " * span.depth
+                + f"{span.name} {args}".rstrip(),
+                file=file,
+            )
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """Convert the spans into the Chrome trace event format.
+
+        Returns:
+            The trace, to be dumped as JSON.
+        """
+        pid = os.getpid()
+        events = [
+            {
+                "name": span.name,
+                "ph": "X",
+                "ts": span.start / 1000,
+                "dur": span.duration / 1000,
+                "pid": pid,
+                "tid": span.thread,
+                "args": span.args,
+            }
+            for span in self.spans
+        ]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def finish(self) -> None:
+        """Report the collected spans to the output."""
+        if self.output == STDERR:
+            self.print_breakdown(sys.stderr)
+            return
+        import json
+
+        with open(self.output, "w") as fout:
+            json.dump(self.chrome_trace(), fout, default=str)
+
+
+_tracer: Optional[Tracer] = None
+_DISABLED: ContextManager[None] = nullcontext()
+
+
+def span(name: str, **args: Any) -> ContextManager[None]:
+    """Time a stage of the run, if tracing is enabled.
+
+    Parameters:
+        name: Name of the stage.
+        args: Details of the stage, shown along with the timing.
+
+    Returns:
+        Context manager timing its block.
+
+    Example:
+        >>> with span("parse", bugs=2):
+        ...     pass
+    """
+    if _tracer is None:
+        return _DISABLED
+    return _tracer.span(name, args)
+
+
+def enable(output: str = STDERR) -> Tracer:
+    """Start collecting spans, to be reported when the process exits.
+
+    Parameters:
+        output: ``stderr``, or path to a Chrome trace file.
+
+    Returns:
+        The tracer.
+    """
+    global _tracer
+
+    if _tracer is None:
+        _tracer = Tracer(output)
+        atexit.register(_tracer.finish)
+    return _tracer
+
+
+def enable_from_env() -> Optional[Tracer]:
+    """Enable tracing if the ``BUGLOG_TRACE`` variable is set.
+
+    Returns:
+        The tracer, if enabled.
+    """
+    output = os.environ.get(TRACE_ENV, "")
+    if not output:
+        return None
+    return enable(STDERR if output.lower() in _STDERR_ALIASES else output)
+
+
+enable_from_env()
@@ -1,20 +1,25 @@
+import os
 import sys
 from importlib.machinery import SourceFileLoader
 from importlib.util import module_from_spec
 from importlib.util import spec_from_loader
 from types import ModuleType
 from typing import Any
+from typing import Dict
 from typing import Iterable
 from typing import List
+from typing import Optional
 from typing import Tuple
 from typing import Type
 from typing import TypeVar
 from typing import Union
 
 from pydantic import BaseModel
-from xdg import XDG_CONFIG_HOME
 
+from buglog.bootstrap import config_digest
+from buglog.bootstrap import config_path
 from buglog.bootstrap import ensure_config
+from buglog.trace import span
 
 
 class Bug(BaseModel):
@@ -31,7 +36,7 @@ def import_config() -> ModuleType:
         module object (assuming it is present).
     """
 
-    file_path = XDG_CONFIG_HOME / __package__ / "config.py"
+    file_path = config_path()
     module_name = "config"
 
     loader = SourceFileLoader(module_name, str(file_path))
@@ -43,10 +48,84 @@ def import_config() -> ModuleType:
     return module
 
 
+class BugRegistry:
+    """Process-wide cache of the Bug subclasses defined in the config.
+
+    The config is imported once and re-imported only when its contents
+    change: every lookup does a cheap ``stat()`` of the file, and only
+    if the path, modification time or size differ the file is hashed.
+
+    Attributes:
+        classes: Bug subclasses in order of their definition.
+        by_name: Mapping from class name to the class itself.
+    """
+
+    def __init__(self) -> None:
+        self._stat: Optional[Tuple[str, int, int]] = None
+        self._digest: Optional[str] = None
+        self.classes: List[Type[Bug]] = []
+        self.by_name: Dict[str, Type[Bug]] = {}
+
+    def refresh(self) -> "BugRegistry":
+        """Re-import the config if it has changed since the last call.
+
+        Returns:
+            The registry itself.
+        """
+        path = str(config_path())
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            ensure_config()
+            stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        if key == self._stat:
+            return self
+
+        digest = config_digest()
+        if digest == self._digest:
+            self._stat = key
+            return self
+
+        with span("import config"):
+            module = import_config()
+        # Classes from the previous imports still linger
+        # in ``Bug.__subclasses__()`` until garbage collected,
+        # so only keep the ones bound in the fresh module
+        self.classes = [
+            bug_class
+            for bug_class in Bug.__subclasses__()
+            if vars(module).get(bug_class.__name__) is bug_class
+        ]
+        self.by_name = {
+            bug_class.__name__: bug_class for bug_class in self.classes
+        }
+        # Only after a successful import, so that a broken config
+        # keeps raising until it is fixed
+        self._digest = digest
+        self._stat = key
+        return self
+
+
+_registry = BugRegistry()
+
+
 def get_bug_subclasses() -> List[Type[Bug]]:
-    ensure_config()
-    import_config()
-    return Bug.__subclasses__()
+    """Get Bug subclasses defined in the config.
+
+    Returns:
+        List of the Bug subclasses.
+    """
+    return _registry.refresh().classes
+
+
+def get_bugs_by_name() -> Dict[str, Type[Bug]]:
+    """Get Bug subclasses defined in the config, by their names.
+
+    Returns:
+        Mapping from the class name to the class itself.
+    """
+    return _registry.refresh().by_name
 
 
 T1 = TypeVar("T1")
@@ -91,6 +170,4 @@ def str_to_bug(bug_name: str) -> Type[Bug]:
     Returns:
         The bug's subclass object.
     """
-    return {
-        bug_class.__name__: bug_class for bug_class in get_bug_subclasses()
-    }[bug_name]
+    return _registry.refresh().by_name[bug_name]
@@ -13,6 +13,12 @@ def mock_xdg(
     tmp_path = tmp_path_factory.mktemp("data")
     data_home = tmp_path / ".local/share"
     config_home = tmp_path / ".config"
+    cache_home = tmp_path / ".cache"
     monkeypatch.setattr("buglog.bootstrap.XDG_DATA_HOME", data_home)
     monkeypatch.setattr("buglog.bootstrap.XDG_CONFIG_HOME", config_home)
-    return {"XDG_DATA_HOME": data_home, "XDG_CONFIG_HOME": config_home}
+    monkeypatch.setattr("buglog.bootstrap.XDG_CACHE_HOME", cache_home)
+    return {
+        "XDG_DATA_HOME": data_home,
+        "XDG_CONFIG_HOME": config_home,
+        "XDG_CACHE_HOME": cache_home,
+    }
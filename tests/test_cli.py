@@ -1,7 +1,22 @@
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Dict
+from typing import Iterable
+from typing import List
+
 import pytest
+from _pytest.monkeypatch import MonkeyPatch
 from click.testing import CliRunner
 
 from buglog import cli
+from buglog.daemon import DaemonError
+from buglog.daemon import DaemonLostError
+from buglog.daemon import SaveItem
+from buglog.daemon import Session
+from buglog.storage import append_records
+from buglog.storage import iter_records
+from buglog.storage import Record
 
 
 @pytest.fixture
@@ -12,3 +27,136 @@ def runner() -> CliRunner:
 def test_main_succeeds(runner: CliRunner) -> None:
     result = runner.invoke(cli.main, "--version")
     assert result.exit_code == 0
+
+
+def test_query(runner: CliRunner, mock_xdg: Dict[str, Path]) -> None:
+    append_records("2020-03-01_09:00:00_Escitalopram.jsonl", [{"dose": 10}])
+    append_records("2020-03-02_09:00:00_Escitalopram.jsonl", [{"dose": 5}])
+
+    result = runner.invoke(
+        cli.main, ["query", "Escitalopram", "--where", "dose=5"]
+    )
+    assert result.exit_code == 0
+    assert json.loads(result.output) == {
+        "timestamp": "2020-03-02T09:00:00",
+        "bug": "Escitalopram",
+        "data": {"dose": 5},
+    }
+
+    for where in ("dose", "dose=[5]", 'dose>={"mg": 5}'):
+        result = runner.invoke(cli.main, ["query", "--where", where])
+        assert result.exit_code == 2
+        assert "Invalid value for '--where'" in result.output
+
+
+def test_add(runner: CliRunner, mock_xdg: Dict[str, Path]) -> None:
+    result = runner.invoke(
+        cli.main, ["add", "Squats", "times=3", "--at", "2020-07-21 08:00"]
+    )
+    assert result.exit_code == 0
+    assert list(iter_records()) == [
+        Record(datetime(2020, 7, 21, 8), "Squats", {"reps": 1, "times": 3})
+    ]
+
+    result = runner.invoke(cli.main, ["add", "Squats", "times=0"])
+    assert result.exit_code != 0
+    assert len(list(iter_records())) == 1
+
+
+def test_import(runner: CliRunner, mock_xdg: Dict[str, Path]) -> None:
+    lines = [
+        '{"bug": "Mood", "at": "2020-07-21 08:00", "mood": 3}',
+        '{"bug": "Mood", "at": "2020-07-21 09:00", "mood": 9}',
+    ]
+    result = runner.invoke(cli.main, ["import"], input="\n".join(lines))
+    assert result.exit_code != 0
+    assert "line 2: mood:" in result.output
+    assert list(iter_records()) == []
+
+    result = runner.invoke(
+        cli.main, ["import", "--partial"], input="\n".join(lines)
+    )
+    assert list(iter_records()) == [
+        Record(datetime(2020, 7, 21, 8), "Mood", {"mood": 3})
+    ]
+
+
+def test_validate(runner: CliRunner, mock_xdg: Dict[str, Path]) -> None:
+    append_records("2020-07-21_08:00:00_Mood.jsonl", [{"mood": 3}])
+    result = runner.invoke(cli.main, ["validate", "--jobs", "1"])
+    assert result.exit_code == 0
+
+    append_records("2020-07-21_09:00:00_Mood.jsonl", [{"mood": 9}])
+    result = runner.invoke(cli.main, ["validate", "--jobs", "1"])
+    assert result.exit_code != 0
+    assert result.output.startswith("2020-07-21_09:00:00 Mood: mood:")
+
+
+def test_stats(runner: CliRunner, mock_xdg: Dict[str, Path]) -> None:
+    append_records("2020-07-21_08:00:00_Weight.jsonl", [{"kg": 80.5}])
+    append_records("2020-07-23_08:00:00_Weight.jsonl", [{"kg": 79.5}])
+
+    result = runner.invoke(
+        cli.main, ["stats", "Weight", "kg", "--by", "week", "--agg", "mean"]
+    )
+    assert result.exit_code == 0
+    assert result.output == "2020-07-20\t80\n"
+
+    result = runner.invoke(cli.main, ["stats", "Learned", "summary"])
+    assert result.exit_code != 0
+
+
+def test_compact(runner: CliRunner, mock_xdg: Dict[str, Path]) -> None:
+    append_records("2020-07-21_08:00:00_Weight.jsonl", [{"kg": 80.5}])
+    result = runner.invoke(cli.main, ["compact", "--before", "2020-08"])
+    assert result.exit_code == 0
+    assert result.output == "Packed 1 file(s) into 1 segment(s)\n"
+    assert list(iter_records()) == [
+        Record(datetime(2020, 7, 21, 8), "Weight", {"kg": 80.5})
+    ]
+
+
+def test_profile(
+    runner: CliRunner,
+    mock_xdg: Dict[str, Path],
+    tmp_path: Path,
+    monkeypatch: MonkeyPatch,
+) -> None:
+    import marshal
+
+    from buglog.trace import Tracer
+
+    monkeypatch.setattr("buglog.trace.enable", lambda: Tracer())
+    profile_path = tmp_path / "bug.prof"
+    result = runner.invoke(cli.main, ["--profile", str(profile_path), "query"])
+    assert result.exit_code == 0
+    # cProfile dumps the stats keyed by (file, line, function)
+    profiled = marshal.loads(profile_path.read_bytes())
+    assert any(
+        file.endswith("cli.py") and name == "query"
+        for file, _, name in profiled
+    )
+
+
+def test_log_bugs_keeps_unsaved(
+    mock_xdg: Dict[str, Path], monkeypatch: MonkeyPatch
+) -> None:
+    class _LostSession(Session):
+        def save(self, items: Iterable[SaveItem]) -> int:
+            raise DaemonLostError("the daemon closed the connection")
+
+    edited: List[str] = []
+
+    def _edit(text: str) -> str:
+        edited.append(text + "3")
+        return edited[-1]
+
+    monkeypatch.setattr("buglog.cli.fuzzy_pick_bug", lambda lines: ["Mood"])
+    monkeypatch.setattr("click.edit", _edit)
+    monkeypatch.setattr("buglog.cli.user_read_character", lambda *args: "k")
+    with pytest.raises(DaemonError) as excinfo:
+        cli.log_bugs(_LostSession())
+
+    path = mock_xdg["XDG_CACHE_HOME"] / "buglog" / cli.UNSAVED_NAME
+    assert str(excinfo.value).endswith(f"the bugs are kept in {path}")
+    assert path.read_text() == edited[-1]
@@ -0,0 +1,75 @@
+from pathlib import Path
+from typing import Any
+from typing import Dict
+
+import pytest
+
+from buglog.codec import decode
+from buglog.codec import Layout
+from buglog.codec import layout_for
+from buglog.snapshot import load_snapshot
+from buglog.utils import str_to_bug
+
+# Values of the required fields of the template config's Bugs
+REQUIRED = {
+    "times": 3,
+    "time": 30,
+    "liters": 0.5,
+    "name": "tea",
+    "mass": 35.5,
+    "mood": 4,
+    "kg": 80.5,
+}
+
+
+def test_round_trip_of_config_bugs(mock_xdg: Dict[str, Path]) -> None:
+    for bug_name, schema in load_snapshot().items():
+        fields = {
+            field: REQUIRED[field] for field in schema.get("required", [])
+        }
+        records = [str_to_bug(bug_name)(**fields).dict() for _ in range(3)]
+
+        layout = layout_for(bug_name)
+        decoded_layout, decoded = decode(layout.encode(records))
+        assert decoded_layout == layout
+        assert decoded == records
+        assert [list(r) for r in decoded] == [list(r) for r in records]
+
+
+@pytest.mark.parametrize(
+    "record",
+    [
+        {"n": 1, "x": 0.1, "ok": True, "s": "diet soda", "j": [1, {"a": 2}]},
+        {"n": -(2**63), "x": float("inf"), "ok": False, "s": "", "j": {}},
+        {"n": None, "x": None, "ok": None, "s": None, "j": None},
+        {"n": 0, "x": -0.0, "ok": True, "s": "zażółć", "j": "text"},
+    ],
+)
+def test_round_trip(record: Dict[str, Any]) -> None:
+    layout = Layout(
+        "Thing", [("n", "q"), ("x", "d"), ("ok", "?"), ("s", "s"), ("j", "j")]
+    )
+    records = [record, {"n": 2, "x": 2.5, "ok": False, "s": "ąę", "j": 1}]
+    _, decoded = decode(layout.encode(records))
+    assert decoded == records
+    assert str(decoded[0]["x"]) == str(record["x"])
+
+
+@pytest.mark.parametrize(
+    "record",
+    [{"n": 1.0}, {"n": True}, {"n": 2**63}, {"n": 1, "m": 2}, {}],
+)
+def test_records_not_fitting_layout(record: Dict[str, Any]) -> None:
+    with pytest.raises(ValueError):
+        Layout("Thing", [("n", "q")]).encode([record])
+
+
+def test_decode_checks_header() -> None:
+    payload = Layout("Thing", [("n", "q")]).encode([{"n": 1}])
+    with pytest.raises(ValueError):
+        decode(b"JSON" + payload[4:])
+    with pytest.raises(ValueError):
+        decode(payload[:8])
+    # The layout is changed, while the tag is not
+    with pytest.raises(ValueError):
+        decode(payload.replace(b'"q"', b'"d"'))
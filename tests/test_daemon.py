@@ -0,0 +1,119 @@
+import socket
+import threading
+import time
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from typing import Dict
+from typing import Iterator
+
+import pytest
+from _pytest.capture import CaptureFixture
+
+from buglog.bootstrap import config_path
+from buglog.daemon import connect
+from buglog.daemon import Daemon
+from buglog.daemon import DaemonLostError
+from buglog.daemon import open_session
+from buglog.daemon import RemoteSession
+from buglog.daemon import Session
+from buglog.daemon import socket_path
+from buglog.parse_rst import RstSyntaxError
+from buglog.storage import iter_records
+from buglog.storage import Record
+
+
+@pytest.fixture
+def daemon(mock_xdg: Dict[str, Path]) -> Iterator[Daemon]:
+    socket_path().parent.mkdir(parents=True)
+    server = Daemon(socket_path(), watch_interval=0.1)
+    server.warm_up()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    thread.join()
+    server.server_close()
+
+
+def test_remote_session(daemon: Daemon) -> None:
+    remote = connect()
+    assert isinstance(remote, RemoteSession)
+    local = Session()
+    with closing(remote):
+        assert remote.picker_lines() == local.picker_lines()
+        template = remote.template(["Squats", "Mood"])
+        assert template == local.template(["Squats", "Mood"])
+
+        text = template.replace("* Times: ", "* Times: 3")
+        parsed = remote.parse(text)
+        assert parsed == local.parse(text)
+        assert parsed.bugs == [("Squats", {"reps": 1, "times": 3})]
+        assert parsed.errors == ["Mood.mood: value is not a valid integer"]
+
+        with pytest.raises(RstSyntaxError) as excinfo:
+            remote.parse("Squats\n------\n\n* Laps: 3")
+        assert excinfo.value.lineno == 4
+        assert str(excinfo.value) == "line 4: unknown field 'Laps: 3'"
+
+        items = [("Mood", {"mood": "3"}, "2020-07-21_08:00:00_Mood.jsonl")]
+        assert remote.save(items) == 1
+    assert list(iter_records()) == [
+        Record(datetime(2020, 7, 21, 8), "Mood", {"mood": 3})
+    ]
+
+
+def test_config_is_watched(daemon: Daemon) -> None:
+    with config_path().open("a") as fout:
+        fout.write('\n\nclass Stretching(Bug):\n    """Excercise"""\n')
+    time.sleep(0.5)
+    remote = connect()
+    assert remote is not None
+    with closing(remote):
+        assert remote.picker_lines()[-1] == "Stretching Excercise"
+        assert remote.template(["Stretching"]) == "Stretching: Excercise\n" + (
+            "-" * len("Stretching: Excercise")
+        )
+
+
+def test_falls_back_to_process(mock_xdg: Dict[str, Path]) -> None:
+    assert connect() is None
+
+    # Socket left behind by a killed daemon
+    socket_path().parent.mkdir(parents=True)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.bind(str(socket_path()))
+    assert connect() is None
+    with open_session() as session:
+        assert type(session) is Session
+
+
+def test_falls_back_after_losing_daemon(
+    mock_xdg: Dict[str, Path], capsys: CaptureFixture[str]
+) -> None:
+    ours, theirs = socket.socketpair()
+    theirs.close()
+    with closing(RemoteSession(ours)) as remote:
+        assert remote.template(["Mood"]) == Session().template(["Mood"])
+        items = [("Mood", {"mood": 3}, "2020-07-21_08:00:00_Mood.jsonl")]
+        assert remote.save(items) == 1
+    (warning,) = capsys.readouterr().err.splitlines()
+    assert warning.endswith(", continuing without the daemon")
+    assert [record.data for record in iter_records()] == [{"mood": 3}]
+
+
+def test_save_is_not_repeated(mock_xdg: Dict[str, Path]) -> None:
+    ours, theirs = socket.socketpair()
+
+    def _die_while_saving() -> None:
+        with theirs, theirs.makefile("rb") as fin:
+            fin.readline()
+
+    thread = threading.Thread(target=_die_while_saving)
+    thread.start()
+    with closing(RemoteSession(ours)) as remote:
+        items = [("Mood", {"mood": 3}, "2020-07-21_08:00:00_Mood.jsonl")]
+        with pytest.raises(DaemonLostError):
+            remote.save(items)
+    thread.join()
+    assert list(iter_records()) == []
@@ -0,0 +1,34 @@
+from pathlib import Path
+from typing import Dict
+
+from _pytest.capture import CaptureFixture
+
+from buglog.dump import dump_bugs
+from buglog.storage import read_file
+from buglog.utils import str_to_bug
+
+
+def test_dump_bugs(
+    mock_xdg: Dict[str, Path], capsys: CaptureFixture[str]
+) -> None:
+    data_dir = mock_xdg["XDG_DATA_HOME"] / "buglog"
+    squats = str_to_bug("Squats")
+    mood = str_to_bug("Mood")
+
+    dump_bugs(
+        [
+            (squats(**{"times": 1}), "2020-07-21_10:51:10_Squats.jsonl"),
+            (squats(**{"times": 2}), "2020-07-21_10:51:10_Squats.jsonl"),
+            (mood(**{"mood": 5}), "2020-07-21_10:51:10_Mood.jsonl"),
+        ]
+    )
+
+    assert list(read_file(data_dir / "2020-07-21_10:51:10_Squats.jsonl")) == [
+        {"reps": 1, "times": 1},
+        {"reps": 1, "times": 2},
+    ]
+    assert list(read_file(data_dir / "2020-07-21_10:51:10_Mood.jsonl")) == [
+        {"mood": 5}
+    ]
+    (summary,) = capsys.readouterr().out.splitlines()
+    assert "Squats, Squats, Mood into 2 file(s)" in summary
@@ -0,0 +1,26 @@
+import subprocess
+from datetime import datetime
+from datetime import timedelta
+from pathlib import Path
+from typing import Dict
+
+from buglog.fuzzy import preview_command
+from buglog.index import index_written
+from buglog.storage import append_records
+
+
+def test_preview_command(mock_xdg: Dict[str, Path]) -> None:
+    logged = datetime.now() - timedelta(hours=23, minutes=5)
+    path = append_records(
+        f"{logged:%Y-%m-%d_%H:%M:%S}_Escitalopram.jsonl", [{"dose": 10}]
+    )
+    index_written([path])
+
+    def _preview(bug_name: str) -> str:
+        command = preview_command().replace("{1}", f"'{bug_name}'")
+        return subprocess.check_output(["sh", "-c", command], text=True)
+
+    assert _preview("Escitalopram") == (
+        f"23h ago   {logged:%Y-%m-%d %H:%M}  dose=10\n"
+    )
+    assert _preview("Weight") == "Not logged yet\n"
@@ -0,0 +1,190 @@
+import asyncio
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+
+from _pytest.monkeypatch import MonkeyPatch
+
+import buglog.httpd
+from buglog.httpd import IngestServer
+from buglog.storage import iter_records
+from buglog.storage import Record
+
+
+async def _request(
+    port: int,
+    method: str,
+    path: str,
+    payload: Any = None,
+    headers: Optional[Dict[str, str]] = None,
+) -> Tuple[int, Any]:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = b"" if payload is None else json.dumps(payload).encode()
+    lines = [f"{method} {path} HTTP/1.1", f"Content-Length: {len(body)}"]
+    lines += [f"{k}: {v}" for k, v in (headers or {}).items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + body)
+    response = await reader.read()
+    writer.close()
+    head, content = response.split(b"\r\n\r\n", 1)
+    status = int(head.split()[1])
+    return status, json.loads(content)
+
+
+async def _with_server(scenario: Any, **kwargs: Any) -> Any:
+    server = IngestServer(**kwargs)
+    listening = await server.start(port=0)
+    port = listening.sockets[0].getsockname()[1]
+    try:
+        return await scenario(port)
+    finally:
+        listening.close()
+        await listening.wait_closed()
+        await server.stop()
+
+
+def test_post_bugs(mock_xdg: Dict[str, Path]) -> None:
+    records = [
+        {"bug": "Mood", "at": "2020-07-21 08:00", "mood": 3},
+        {"bug": "Mood", "at": "2020-07-21 09:00", "mood": 9},
+    ]
+
+    async def scenario(port: int) -> None:
+        headers = {"Connection": "close"}
+        status, payload = await _request(
+            port, "POST", "/bugs", records, headers
+        )
+        assert status == 422
+        assert payload["errors"][0]["record"] == 2
+
+        status, payload = await _request(
+            port, "POST", "/bugs", records[0], headers
+        )
+        assert (status, payload) == (200, {"saved": 1})
+
+        status, payload = await _request(port, "GET", "/stats", None, headers)
+        assert status == 200
+        assert (payload["requests"], payload["rejected"]) == (2, 1)
+        assert payload["records"] == 1
+
+        status, _ = await _request(port, "GET", "/bugs", None, headers)
+        assert status == 405
+
+        status, payload = await _request(
+            port, "POST", "/bugs", {"bug": ["Mood"], "mood": 3}, headers
+        )
+        assert status == 422
+        assert payload["errors"][0]["message"] == "unknown bug ['Mood']"
+
+    asyncio.run(_with_server(scenario))
+    assert list(iter_records()) == [
+        Record(datetime(2020, 7, 21, 8), "Mood", {"mood": 3})
+    ]
+
+
+def test_concurrent_requests_are_group_committed(
+    mock_xdg: Dict[str, Path],
+) -> None:
+    async def scenario(port: int) -> Dict[str, Any]:
+        headers = {"Connection": "close"}
+        results = await asyncio.gather(
+            *(
+                _request(
+                    port,
+                    "POST",
+                    "/bugs",
+                    {"bug": "Weight", "at": f"2020-07-{day:02}", "kg": 80},
+                    headers,
+                )
+                for day in range(1, 11)
+            )
+        )
+        assert {status for status, _ in results} == {200}
+        _, stats = await _request(port, "GET", "/stats", None, headers)
+        return stats
+
+    stats = asyncio.run(_with_server(scenario, batch_window=0.5))
+    assert (stats["batches"], stats["records"]) == (1, 10)
+    assert stats["batch_size"]["10"] == 1
+    assert len(list(iter_records(bug_name="Weight"))) == 10
+
+
+def test_cancelled_request_does_not_stop_writer(
+    mock_xdg: Dict[str, Path],
+) -> None:
+    server = IngestServer(batch_window=0.3)
+    record = {"bug": "Weight", "at": "2020-07-21", "kg": 80}
+
+    async def scenario() -> int:
+        listening = await server.start(port=0)
+        port = listening.sockets[0].getsockname()[1]
+        try:
+            waiting = asyncio.ensure_future(
+                server._save(json.dumps(record).encode())
+            )
+            await asyncio.sleep(0.1)
+            waiting.cancel()
+            status, _ = await asyncio.wait_for(
+                _request(
+                    port, "POST", "/bugs", record, {"Connection": "close"}
+                ),
+                timeout=2,
+            )
+            return status
+        finally:
+            listening.close()
+            await listening.wait_closed()
+            await asyncio.wait_for(server.stop(), timeout=2)
+
+    assert asyncio.run(scenario()) == 200
+    assert len(list(iter_records(bug_name="Weight"))) == 2
+
+
+def test_token(mock_xdg: Dict[str, Path]) -> None:
+    async def scenario(port: int) -> None:
+        status, _ = await _request(
+            port, "GET", "/stats", None, {"Connection": "close"}
+        )
+        assert status == 401
+        status, _ = await _request(
+            port,
+            "GET",
+            "/stats",
+            None,
+            {"Connection": "close", "Authorization": "Bearer secret"},
+        )
+        assert status == 200
+
+    asyncio.run(_with_server(scenario, token="secret"))
+
+
+def test_validation_does_not_block_other_requests(
+    mock_xdg: Dict[str, Path], monkeypatch: MonkeyPatch
+) -> None:
+    validate_chunk = buglog.httpd.validate_chunk
+
+    def _slow_validate_chunk(*args: Any) -> Any:
+        time.sleep(0.5)
+        return validate_chunk(*args)
+
+    monkeypatch.setattr("buglog.httpd.validate_chunk", _slow_validate_chunk)
+
+    async def scenario(port: int) -> None:
+        headers = {"Connection": "close"}
+        started = time.perf_counter()
+        post = asyncio.ensure_future(
+            _request(
+                port, "POST", "/bugs", {"bug": "Weight", "kg": 80}, headers
+            )
+        )
+        await asyncio.sleep(0.1)
+        status, _ = await _request(port, "GET", "/stats", None, headers)
+        assert status == 200
+        assert time.perf_counter() - started < 0.4
+        assert (await post)[0] == 200
+
+    asyncio.run(_with_server(scenario))
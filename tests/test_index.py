@@ -0,0 +1,164 @@
+import os
+from contextlib import closing
+from datetime import date
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import Iterator
+from typing import List
+
+from _pytest.monkeypatch import MonkeyPatch
+
+import buglog.index
+from buglog.index import connect
+from buglog.index import data_stamp
+from buglog.index import index_written
+from buglog.index import LATEST_COUNT
+from buglog.index import query
+from buglog.index import rebuild_index
+from buglog.index import rollups
+from buglog.storage import append_records
+from buglog.storage import Record
+
+
+def _fill_data_dir() -> None:
+    append_records("2020-02-29_09:00:00_Escitalopram.jsonl", [{"dose": 10}])
+    append_records("2020-03-01_09:00:00_Escitalopram.jsonl", [{"dose": 10}])
+    append_records("2020-03-02_09:00:00_Escitalopram.jsonl", [{"dose": 5}])
+    append_records("2020-03-02_09:00:00_Weight.jsonl", [{"kg": 80.5}])
+
+
+def test_query(mock_xdg: Dict[str, Path]) -> None:
+    _fill_data_dir()
+
+    assert list(
+        query(
+            "Escitalopram",
+            since=datetime(2020, 3, 1),
+            until=datetime(2020, 4, 1),
+        )
+    ) == [
+        Record(datetime(2020, 3, 1, 9), "Escitalopram", {"dose": 10}),
+        Record(datetime(2020, 3, 2, 9), "Escitalopram", {"dose": 5}),
+    ]
+    assert [r.data for r in query(where=[("dose", ">", 5)])] == [
+        {"dose": 10},
+        {"dose": 10},
+    ]
+    assert [r.bug_name for r in query(where=[("kg", ">=", 80)])] == ["Weight"]
+
+
+def test_index_is_incremental(
+    mock_xdg: Dict[str, Path], monkeypatch: MonkeyPatch
+) -> None:
+    data_dir = mock_xdg["XDG_DATA_HOME"] / "buglog"
+    _fill_data_dir()
+    assert len(list(query())) == 4
+
+    read_paths = []
+    read_file = buglog.index.read_file
+
+    def _tracking_read_file(path: Path) -> Iterator[Dict[str, Any]]:
+        read_paths.append(path.name)
+        return read_file(path)
+
+    monkeypatch.setattr("buglog.index.read_file", _tracking_read_file)
+
+    append_records("2020-03-02_09:00:00_Weight.jsonl", [{"kg": 80.0}])
+    (data_dir / "2020-02-29_09:00:00_Escitalopram.jsonl").unlink()
+
+    assert [r.data for r in query("Weight")] == [{"kg": 80.5}, {"kg": 80.0}]
+    assert len(list(query())) == 4
+    assert read_paths == ["2020-03-02_09:00:00_Weight.jsonl"]
+
+
+def test_rollups(mock_xdg: Dict[str, Path]) -> None:
+    _fill_data_dir()
+    assert list(rollups("Escitalopram", "dose", "month")) == [
+        (date(2020, 2, 1), 1, 10.0, 10.0, 10.0),
+        (date(2020, 3, 1), 2, 15.0, 5.0, 10.0),
+    ]
+    assert list(
+        rollups("Escitalopram", "dose", "day", since=date(2020, 3, 2))
+    ) == [(date(2020, 3, 2), 1, 5.0, 5.0, 5.0)]
+
+    path = append_records(
+        "2020-03-03_09:00:00_Escitalopram.jsonl", [{"dose": 20}]
+    )
+    index_written([path])
+    with closing(connect()) as conn:
+        rows = conn.execute(
+            "SELECT bucket, count, sum, min, max FROM rollups"
+            " WHERE bug_name = 'Escitalopram' AND granularity = 'week'"
+            " ORDER BY bucket"
+        ).fetchall()
+    assert rows == [
+        ("2020-02-24", 2, 20.0, 10.0, 10.0),
+        ("2020-03-02", 2, 25.0, 5.0, 20.0),
+    ]
+
+    path.unlink()
+    rebuild_index()
+    assert list(rollups("Escitalopram", "dose", "week")) == [
+        (date(2020, 2, 24), 2, 20.0, 10.0, 10.0),
+        (date(2020, 3, 2), 1, 5.0, 5.0, 5.0),
+    ]
+
+
+def test_data_folder_scanned_only_when_changed(
+    mock_xdg: Dict[str, Path], monkeypatch: MonkeyPatch
+) -> None:
+    data_dir = mock_xdg["XDG_DATA_HOME"] / "buglog"
+    _fill_data_dir()
+    assert len(list(rollups("Escitalopram", "dose", "month"))) == 2
+
+    scans: List[int] = []
+    update_index = buglog.index.update_index
+
+    def _update_index(conn: Any, paths: Any = None) -> None:
+        if paths is None:
+            scans.append(1)
+        update_index(conn, paths)
+
+    monkeypatch.setattr("buglog.index.update_index", _update_index)
+    stamp = data_stamp()
+    path = append_records(
+        "2020-03-03_09:00:00_Escitalopram.jsonl", [{"dose": 20}]
+    )
+    index_written([path], stamp=stamp)
+    assert list(rollups("Escitalopram", "dose", "month"))[-1][1] == 3
+    assert scans == []
+
+    # Written without indexing, in a later tick of the folder's clock
+    append_records("2020-03-04_09:00:00_Escitalopram.jsonl", [{"dose": 5}])
+    os.utime(data_dir, ns=(0, 0))
+    assert list(rollups("Escitalopram", "dose", "month"))[-1][1] == 4
+    assert len(scans) == 1
+
+
+def test_latest_records(mock_xdg: Dict[str, Path]) -> None:
+    latest = mock_xdg["XDG_CACHE_HOME"] / "buglog" / "latest"
+    _fill_data_dir()
+    rebuild_index()
+    lines = (latest / "Escitalopram.tsv").read_text().splitlines()
+    assert [line.split("\t", 1)[1] for line in lines] == [
+        "2020-03-02 09:00\tdose=5",
+        "2020-03-01 09:00\tdose=10",
+        "2020-02-29 09:00\tdose=10",
+    ]
+
+    paths = [
+        append_records(f"2020-04-0{day}_09:00:00_Escitalopram.jsonl", [{}])
+        for day in range(1, LATEST_COUNT + 1)
+    ]
+    index_written(paths)
+    lines = (latest / "Escitalopram.tsv").read_text().splitlines()
+    assert len(lines) == LATEST_COUNT
+    assert lines[0].endswith(f"2020-04-0{LATEST_COUNT} 09:00\t")
+    assert (latest / "Weight.tsv").exists()
+
+    for path in (mock_xdg["XDG_DATA_HOME"] / "buglog").glob("*Weight*"):
+        path.unlink()
+    rebuild_index()
+    assert not (latest / "Weight.tsv").exists()
@@ -0,0 +1,105 @@
+import io
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+from pathlib import Path
+from typing import Dict
+
+from buglog.ingest import Invalid
+from buglog.ingest import read_csv
+from buglog.ingest import read_ndjson
+from buglog.ingest import revalidate
+from buglog.ingest import validate_rows
+from buglog.ingest import Validated
+from buglog.ingest import write_validated
+from buglog.storage import iter_records
+from buglog.storage import Record
+
+NDJSON = """\
+{"bug": "Squats", "at": "2020-07-21 10:51:10", "times": 3}
+
+{"bug": "Squats", "at": "2020-07-21 10:51:10", "times": 0}
+{"bug": "Planks", "seconds": 30}
+[1, 2, 3]
+{"bug": ["Squats"], "times": 3}
+{"bug": "Drink", "at": "2020-07-21 11:00:00", "liters": "0.5", "name": "tea"}
+"""
+
+CSV = """\
+bug,at,times,reps,mood
+Squats,2020-07-21 10:51:10,3,,
+Mood,2020-07-21 12:00:00,,,6
+"""
+
+
+def test_validate_ndjson(mock_xdg: Dict[str, Path]) -> None:
+    valid, invalid = validate_rows(
+        read_ndjson(io.StringIO(NDJSON)), chunk_size=2
+    )
+    assert valid == [
+        Validated(
+            1,
+            "Squats",
+            datetime(2020, 7, 21, 10, 51, 10),
+            {"reps": 1, "times": 3},
+        ),
+        Validated(
+            7,
+            "Drink",
+            datetime(2020, 7, 21, 11),
+            {"liters": 0.5, "name": "tea"},
+        ),
+    ]
+    assert invalid == [
+        Invalid(3, "times: ensure this value is greater than 0"),
+        Invalid(4, "unknown bug 'Planks'"),
+        Invalid(5, "not a JSON object"),
+        Invalid(6, "unknown bug ['Squats']"),
+    ]
+
+    write_validated(valid)
+    assert list(iter_records()) == [
+        Record(v.timestamp, v.bug_name, v.data) for v in valid
+    ]
+
+
+def test_validate_aware_time(mock_xdg: Dict[str, Path]) -> None:
+    rows = [(1, {"bug": "Squats", "at": "2020-03-01 08:00+02:00", "times": 3})]
+    (valid,), invalid = validate_rows(rows)
+    assert not invalid
+    offset = timezone(timedelta(hours=2))
+    local = datetime(2020, 3, 1, 8, tzinfo=offset).astimezone()
+    assert valid.timestamp == local.replace(tzinfo=None)
+
+    write_validated([valid])
+    assert [r.timestamp for r in iter_records()] == [valid.timestamp]
+
+
+def test_validate_csv(mock_xdg: Dict[str, Path]) -> None:
+    valid, invalid = validate_rows(read_csv(io.StringIO(CSV)))
+    assert [v.data for v in valid] == [{"reps": 1, "times": 3}]
+    assert [i.lineno for i in invalid] == [3]
+
+
+def test_validate_rows_in_parallel(mock_xdg: Dict[str, Path]) -> None:
+    rows = list(read_ndjson(io.StringIO(NDJSON * 20)))
+    assert validate_rows(rows, chunk_size=3, jobs=2) == validate_rows(rows)
+
+
+def test_revalidate(mock_xdg: Dict[str, Path]) -> None:
+    config_path = mock_xdg["XDG_CONFIG_HOME"] / "buglog" / "config.py"
+    records = [
+        Record(datetime(2020, 7, 21, 8), "Mood", {"mood": mood})
+        for mood in range(1, 6)
+    ] * 10
+    assert list(revalidate(records, chunk_size=4, jobs=2)) == []
+
+    with open(config_path, "a") as fout:
+        fout.write(
+            "\n\nclass Mood(Bug):\n" "    mood: int = Field(..., ge=1, le=3)\n"
+        )
+    invalid = list(revalidate(records, chunk_size=4, jobs=2))
+    assert [record.data["mood"] for record, _ in invalid] == [4, 5] * 10
+    assert (
+        invalid[0][1] == "mood: ensure this value is less than or equal to 3"
+    )
@@ -0,0 +1,164 @@
+import gc
+from pathlib import Path
+from typing import Any
+from typing import Dict
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+from pydantic import ValidationError
+
+from buglog.parse_rst import _docutils_sections
+from buglog.parse_rst import _render_bug
+from buglog.parse_rst import _template_sections
+from buglog.parse_rst import _title_indexes
+from buglog.parse_rst import bugs_to_rst
+from buglog.parse_rst import rst_to_bugs
+from buglog.parse_rst import RstSyntaxError
+from buglog.snapshot import load_snapshot
+from buglog.utils import str_to_bug
+
+FILLED = """\
+Squats: Excercise: squats
+-------------------------
+* Repetitions: 2
+* Times: 10
+
+Drink
+-----
+* Vol [L]: 0.5
+* What was it: green
+  tea
+"""
+
+
+def test_template_parser_agrees_with_docutils(
+    mock_xdg: Dict[str, Path],
+) -> None:
+    template = bugs_to_rst(load_snapshot())
+    for text in (template, FILLED):
+        fast = [
+            (t, [i for _, i in items])
+            for _, t, items in _template_sections(text)
+        ]
+        slow = [
+            (t, [i for _, i in items])
+            for _, t, items in _docutils_sections(text)
+        ]
+        assert fast == slow
+
+
+def test_rst_to_bugs(mock_xdg: Dict[str, Path]) -> None:
+    squats, drink = rst_to_bugs(FILLED)
+    assert squats == str_to_bug("Squats")(**{"reps": 2, "times": 10})
+    assert drink == str_to_bug("Drink")(
+        **{"liters": 0.5, "name": "green\ntea"}
+    )
+
+
+@pytest.mark.parametrize(
+    "text, lineno",
+    [
+        ("* Times: 1\n", 1),
+        ("Squats\n---\n* Times: 1\n", 1),
+        ("Squats\n------\n  * Times: 1\n", 3),
+        ("Squats\n------\n* Times: 1\n\nDrink\n", 5),
+    ],
+)
+def test_template_syntax_errors(text: str, lineno: int) -> None:
+    with pytest.raises(RstSyntaxError) as err:
+        list(_template_sections(text))
+    assert err.value.lineno == lineno
+
+
+@pytest.mark.parametrize(
+    "text, lineno",
+    [
+        ("Squats\n------\n* Times: 1\n* Sets: 2\n", 4),
+        ("Squats\n------\n* Times: 1\n\nPlanks\n------\n", 5),
+    ],
+)
+def test_rst_to_bugs_errors(
+    mock_xdg: Dict[str, Path], text: str, lineno: int
+) -> None:
+    with pytest.raises(RstSyntaxError) as err:
+        list(rst_to_bugs(text))
+    assert err.value.lineno == lineno
+
+
+def test_rst_to_bugs_falls_back_to_docutils(mock_xdg: Dict[str, Path]) -> None:
+    text = "Some notes.\n\n" + FILLED.replace("* Times", "\n* Times")
+    assert [type(bug).__name__ for bug in rst_to_bugs(text)] == [
+        "Squats",
+        "Drink",
+    ]
+
+
+def test_rst_to_bugs_picks_longest_title(mock_xdg: Dict[str, Path]) -> None:
+    config_path = mock_xdg["XDG_CONFIG_HOME"] / "buglog" / "config.py"
+    load_snapshot()
+    with open(config_path, "a") as fout:
+        fout.write(
+            "\n\nclass Planks(Bug):\n"
+            '    sets: int = Field(..., title="Time")\n'
+            '    seconds: int = Field(..., title="Time [s]")\n'
+        )
+
+    (planks,) = rst_to_bugs("Planks\n------\n* Time [s]: 30\n* Time: 2\n")
+    assert not isinstance(planks, ValidationError)
+    assert planks.dict() == {"sets": 2, "seconds": 30}
+
+
+def test_bugs_to_rst_renders_changed_bugs_only(
+    mock_xdg: Dict[str, Path], monkeypatch: MonkeyPatch
+) -> None:
+    monkeypatch.setattr("buglog.parse_rst._fragments", {})
+    rendered = []
+
+    def _render(schema: Dict[str, Any]) -> str:
+        rendered.append(schema["title"])
+        return _render_bug(schema)
+
+    monkeypatch.setattr("buglog.parse_rst._render_bug", _render)
+    bugs_to_rst(["Squats", "Mood"])
+    bugs_to_rst(["Mood", "Squats"])
+    assert rendered == ["Squats", "Mood"]
+
+    config_path = mock_xdg["XDG_CONFIG_HOME"] / "buglog" / "config.py"
+    config = config_path.read_text()
+    config_path.write_text(config.replace("Excercise: squats", "Squats"))
+    assert bugs_to_rst(["Squats", "Mood"]).startswith("Squats: Squats\n")
+    assert rendered == ["Squats", "Mood", "Squats"]
+
+
+def test_rst_to_bugs_reuses_unchanged_sections(
+    mock_xdg: Dict[str, Path], monkeypatch: MonkeyPatch
+) -> None:
+    monkeypatch.setattr("buglog.parse_rst._parsed", {})
+    text = FILLED.replace("* Times: 10", "* Times: ten")
+    squats, drink = rst_to_bugs(text)
+    assert isinstance(squats, ValidationError)
+
+    fixed_squats, same_drink = rst_to_bugs(FILLED)
+    assert not isinstance(fixed_squats, ValidationError)
+    assert fixed_squats.dict() == {"reps": 2, "times": 10}
+    assert same_drink == drink
+
+    # Changes of the returned bugs do not leak into the next call
+    setattr(fixed_squats, "times", 20)
+    again_squats, _ = rst_to_bugs(FILLED)
+    assert again_squats == str_to_bug("Squats")(**{"reps": 2, "times": 10})
+
+
+def test_title_indexes_follow_config(mock_xdg: Dict[str, Path]) -> None:
+    squats = str_to_bug("Squats")
+    list(rst_to_bugs(FILLED))
+    assert squats in _title_indexes
+
+    config_path = mock_xdg["XDG_CONFIG_HOME"] / "buglog" / "config.py"
+    with open(config_path, "a") as fout:
+        fout.write("\n\nclass Planks(Bug):\n    seconds: int\n")
+    list(rst_to_bugs(FILLED))
+    assert str_to_bug("Squats") in _title_indexes
+    del squats
+    gc.collect()
+    assert len(_title_indexes) == 2
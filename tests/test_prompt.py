@@ -1,5 +1,9 @@
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
 from typing import Callable
 from typing import Iterable
+from typing import Optional
 
 import pytest
 from _pytest.monkeypatch import MonkeyPatch
@@ -30,3 +34,56 @@ def test_user_read_character(
 
     monkeypatch.setattr("readchar.readchar", rotate_chars(chars))
     assert choice == user_read_character(*args)
+
+
+NOW = datetime(2020, 7, 21, 10, 51, 10)
+
+
+@pytest.mark.parametrize(
+    "text, date",
+    [
+        ("", NOW),
+        ("now", NOW),
+        ("2020-07-20_08:00:00", datetime(2020, 7, 20, 8)),
+        (
+            "2020-07-20T08:00:00+02:00",
+            datetime(2020, 7, 20, 8, tzinfo=timezone(timedelta(hours=2))),
+        ),
+        ("Yesterday at 4PM", datetime(2020, 7, 20, 16)),
+        ("-15m", datetime(2020, 7, 21, 10, 36, 10)),
+        ("2 hours ago", datetime(2020, 7, 21, 8, 51, 10)),
+        ("+1d", datetime(2020, 7, 22, 10, 51, 10)),
+        ("today 8:00", datetime(2020, 7, 21, 8)),
+        ("yesterday at 4pm", datetime(2020, 7, 20, 16)),
+        ("12am", datetime(2020, 7, 21, 0)),
+        ("tomorrow 7", datetime(2020, 7, 22, 7)),
+        ("8", None),
+        ("13pm", None),
+        ("today 25:00", None),
+        ("next friday", None),
+    ],
+)
+def test_decode_fast(text: str, date: Optional[datetime]) -> None:
+    from buglog.prompt import _decode_fast
+
+    assert _decode_fast(text, NOW) == date
+
+
+def test_decode_timedate_is_cached(monkeypatch: MonkeyPatch) -> None:
+    from buglog.prompt import _decode_human
+    from buglog.prompt import decode_timedate
+
+    calls = []
+
+    def _timefhuman(text: str) -> datetime:
+        calls.append(text)
+        return NOW
+
+    monkeypatch.setattr("timefhuman.timefhuman", _timefhuman)
+    _decode_human.cache_clear()
+
+    # Validator and toolbar parse the same buffer
+    assert decode_timedate("next friday") == NOW
+    assert decode_timedate("next friday") == NOW
+    assert decode_timedate("-15m") is not None
+    assert calls == ["next friday"]
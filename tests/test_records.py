@@ -0,0 +1,68 @@
+from datetime import datetime
+from pathlib import Path
+from typing import Dict
+
+import pytest
+from pydantic import ValidationError
+
+from buglog.bootstrap import ensure_config
+from buglog.records import iter_lite_records
+from buglog.records import load_lite_records
+from buglog.records import record_class
+from buglog.storage import append_records
+from buglog.utils import str_to_bug
+
+
+def test_record_class(mock_xdg: Dict[str, Path]) -> None:
+    squats = record_class("Squats")
+    assert record_class("Squats") is squats
+    assert squats.fields == ("reps", "times")
+
+    record = squats(datetime(2020, 7, 21, 8), {"times": 3})
+    assert record.reps == 1
+    assert record.dict() == {"reps": 1, "times": 3}
+    assert not hasattr(record, "__dict__")
+    assert repr(record) == "Squats(2020-07-21T08:00:00, reps=1, times=3)"
+
+
+def test_fields_named_like_attributes(mock_xdg: Dict[str, Path]) -> None:
+    config_path = mock_xdg["XDG_CONFIG_HOME"] / "buglog" / "config.py"
+    ensure_config()
+    with open(config_path, "a") as fout:
+        fout.write(
+            "\n\nclass Meeting(Bug):\n"
+            "    timestamp: str\n"
+            "    bug_name: str = 'x'\n"
+            "    to_bug: int = 2\n"
+        )
+
+    meeting = record_class("Meeting")
+    record = meeting(datetime(2020, 7, 21, 8), {"timestamp": "9:00"})
+    assert record.timestamp == datetime(2020, 7, 21, 8)
+    assert record.bug_name == "Meeting"
+    assert meeting.fields == ("timestamp", "bug_name", "to_bug")
+    assert record.dict() == {"timestamp": "9:00", "bug_name": "x", "to_bug": 2}
+    assert record.to_bug().dict() == record.dict()
+
+
+def test_to_bug(mock_xdg: Dict[str, Path]) -> None:
+    squats = record_class("Squats")
+    record = squats(datetime(2020, 7, 21, 8), {"times": 3})
+    assert record.to_bug() == str_to_bug("Squats")(**{"times": 3})
+
+    invalid = squats(datetime(2020, 7, 21, 8), {"times": 0})
+    with pytest.raises(ValidationError):
+        invalid.to_bug()
+    assert getattr(invalid.to_bug(validate=False), "times") == 0
+
+
+def test_iter_lite_records(mock_xdg: Dict[str, Path]) -> None:
+    append_records("2020-07-21_08:00:00_Mood.jsonl", [{"mood": 3}])
+    append_records("2020-07-21_09:00:00_Removed.jsonl", [{"x": 1}])
+    append_records("2020-07-21_10:00:00_Mood.jsonl", [{"mood": 4}])
+
+    records = load_lite_records()
+    assert [(r.timestamp.hour, r.mood) for r in records] == [(8, 3), (10, 4)]
+    assert list(iter_lite_records("Mood", since=datetime(2020, 7, 21, 9))) == [
+        record_class("Mood")(datetime(2020, 7, 21, 10), {"mood": 4})
+    ]
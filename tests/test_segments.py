@@ -0,0 +1,168 @@
+import gzip
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+from typing import Dict
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+
+from buglog.index import query
+from buglog.segments import compact
+from buglog.segments import read_segment
+from buglog.segments import read_sidecar
+from buglog.segments import segment_path
+from buglog.storage import append_records
+from buglog.storage import iter_dump_files
+from buglog.storage import iter_records
+from buglog.storage import Record
+
+
+def _fill_data_dir() -> None:
+    append_records("2020-06-30_23:00:00_Mood.jsonl", [{"mood": 5}])
+    append_records("2020-07-01_09:00:00_Mood.jsonl", [{"mood": 3}])
+    append_records("2020-07-01_09:00:00_Weight.jsonl", [{"kg": 80.5}])
+    append_records(
+        "2020-07-02_09:00:00_Weight.jsonl", [{"kg": 80.0}, {"kg": 79.5}]
+    )
+    append_records("2020-08-01_09:00:00_Mood.jsonl", [{"mood": 7}])
+
+
+def test_compact_is_invisible_to_readers(mock_xdg: Dict[str, Path]) -> None:
+    _fill_data_dir()
+    records = list(iter_records())
+    queried = list(query())
+
+    packed = compact(datetime(2020, 8, 15))
+    assert packed == {
+        segment_path(datetime(2020, 6, 1)): 1,
+        segment_path(datetime(2020, 7, 1)): 3,
+    }
+    assert [d.path.name for d in iter_dump_files()] == [
+        "2020-08-01_09:00:00_Mood.jsonl"
+    ]
+    assert list(iter_records()) == records
+    assert list(query()) == queried
+    assert list(
+        iter_records(since=datetime(2020, 7, 1, 12), bug_name="Weight")
+    ) == [
+        Record(datetime(2020, 7, 2, 9), "Weight", {"kg": 80.0}),
+        Record(datetime(2020, 7, 2, 9), "Weight", {"kg": 79.5}),
+    ]
+
+    # Late records are merged into the month's segment
+    append_records("2020-07-03_09:00:00_Mood.jsonl", [{"mood": 4}])
+    assert compact(datetime(2020, 8, 15)) == {
+        segment_path(datetime(2020, 7, 1)): 1
+    }
+    assert [r.data for r in iter_records(bug_name="Mood")] == [
+        {"mood": 5},
+        {"mood": 3},
+        {"mood": 4},
+        {"mood": 7},
+    ]
+
+
+def test_interrupted_compact_is_finished(
+    mock_xdg: Dict[str, Path], monkeypatch: MonkeyPatch
+) -> None:
+    _fill_data_dir()
+    records = list(iter_records())
+
+    def _crash(*args: Any) -> None:
+        raise KeyboardInterrupt
+
+    # Crash after the segments were written, before the dumps are removed
+    with monkeypatch.context() as patch:
+        patch.setattr("buglog.segments._remove_dumps", _crash)
+        with pytest.raises(KeyboardInterrupt):
+            compact(datetime(2020, 8, 15))
+    # The crash hit the first month, whose dump is removed by the readers
+    assert len(list(iter_dump_files())) == 5
+    assert list(iter_records()) == records
+    assert len(list(iter_dump_files())) == 4
+    assert list(query()) == records
+
+    # Crash before the segment was replaced
+    append_records("2020-07-03_09:00:00_Mood.jsonl", [{"mood": 4}])
+    records = list(iter_records())
+    with monkeypatch.context() as patch:
+        patch.setattr("buglog.segments._store_segment", _crash)
+        with pytest.raises(KeyboardInterrupt):
+            compact(datetime(2020, 8, 15))
+    assert list(iter_records()) == records
+    compact(datetime(2020, 8, 15))
+    assert list(iter_records()) == records
+    segments = mock_xdg["XDG_DATA_HOME"] / "buglog" / "segments"
+    assert not list(segments.glob("*.pending"))
+
+
+def test_blocks_are_read_selectively(
+    mock_xdg: Dict[str, Path], monkeypatch: MonkeyPatch
+) -> None:
+    monkeypatch.setattr("buglog.segments.BLOCK_SIZE", 1)
+    _fill_data_dir()
+    compact(datetime(2020, 8, 1))
+    path = segment_path(datetime(2020, 7, 1))
+
+    blocks = read_sidecar(path)
+    assert [(b.bug_name, b.n_records) for b in blocks] == [
+        ("Mood", 1),
+        ("Weight", 1),
+        ("Weight", 1),
+        ("Weight", 1),
+    ]
+    assert read_segment(path, since=datetime(2020, 7, 2)) == [
+        Record(datetime(2020, 7, 2, 9), "Weight", {"kg": 80.0}),
+        Record(datetime(2020, 7, 2, 9), "Weight", {"kg": 79.5}),
+    ]
+
+    # The sidecar is recovered from the segment itself
+    path.with_suffix(".idx").unlink()
+    assert read_sidecar(path) == blocks
+    assert path.with_suffix(".idx").exists()
+
+
+def test_binary_blocks(mock_xdg: Dict[str, Path]) -> None:
+    _fill_data_dir()
+    # Records not fitting the config are kept as JSON
+    append_records("2020-07-03_09:00:00_Mood.jsonl", [{"mood": 3, "x": 1}])
+    records = list(iter_records())
+
+    compact(datetime(2020, 8, 1), binary=True)
+    assert list(iter_records()) == records
+
+    path = segment_path(datetime(2020, 7, 1))
+    content = path.read_bytes()
+    kinds = [
+        gzip.decompress(content[b.offset : b.offset + b.length])[:4]
+        for b in read_sidecar(path)
+    ]
+    assert kinds == [b'["20', b"BUGT"]
+
+
+def test_records_are_prefiltered(
+    mock_xdg: Dict[str, Path], monkeypatch: MonkeyPatch
+) -> None:
+    monkeypatch.setattr("buglog.storage.MMAP_MIN_SIZE", 1)
+    append_records(
+        "2020-07-01_09:00:00_Mood.jsonl", [{"mood": m} for m in range(1, 6)]
+    )
+    append_records("2020-07-02_09:00:00_Mood.jsonl", [{"mood": 3}])
+    compact(datetime(2020, 8, 1))
+
+    decoded = []
+    loads = json.loads
+
+    def _tracking_loads(line: bytes) -> Any:
+        if line.startswith(b"["):
+            decoded.append(line)
+        return loads(line)
+
+    monkeypatch.setattr("buglog.segments.json.loads", _tracking_loads)
+    path = segment_path(datetime(2020, 7, 1))
+    assert read_segment(path, since=datetime(2020, 7, 2)) == [
+        Record(datetime(2020, 7, 2, 9), "Mood", {"mood": 3})
+    ]
+    assert decoded == [b'["2020-07-02T09:00:00", "Mood", {"mood": 3}]']
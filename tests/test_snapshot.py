@@ -0,0 +1,52 @@
+from pathlib import Path
+from typing import Any
+from typing import Dict
+
+from _pytest.monkeypatch import MonkeyPatch
+
+from buglog.parse_rst import bugs_to_rst
+from buglog.snapshot import load_snapshot
+from buglog.utils import str_to_bug
+
+
+def test_snapshot_matches_schemas(mock_xdg: Dict[str, Path]) -> None:
+    snapshot = load_snapshot()
+    assert list(snapshot)[0] == "SideBridge"
+    for bug_name, schema in snapshot.items():
+        assert schema == str_to_bug(bug_name).schema()
+
+
+def test_snapshot_is_read_from_cache(
+    mock_xdg: Dict[str, Path], monkeypatch: MonkeyPatch
+) -> None:
+    monkeypatch.setattr("buglog.snapshot._loaded", {})
+    snapshot = load_snapshot()
+    assert list((mock_xdg["XDG_CACHE_HOME"] / "buglog").glob("schema-*"))
+
+    # Forget in-process copy, so the snapshot file is read
+    monkeypatch.setattr("buglog.snapshot._loaded", {})
+
+    def _fail() -> Any:
+        raise AssertionError("config should not be imported")
+
+    monkeypatch.setattr("buglog.snapshot.build_snapshot", _fail)
+    assert load_snapshot() == snapshot
+    assert bugs_to_rst(["Squats"]) == (
+        "Squats: Excercise: squats\n"
+        "-------------------------\n"
+        "* Repetitions: 1\n"
+        "* Times: "
+    )
+
+
+def test_snapshot_follows_config(
+    mock_xdg: Dict[str, Path], monkeypatch: MonkeyPatch
+) -> None:
+    monkeypatch.setattr("buglog.snapshot._loaded", {})
+    config_path = mock_xdg["XDG_CONFIG_HOME"] / "buglog" / "config.py"
+
+    assert "Planks" not in load_snapshot()
+    with open(config_path, "a") as fout:
+        fout.write("\n\nclass Planks(Bug):\n    seconds: int\n")
+    assert "Planks" in load_snapshot()
+    assert len(list((mock_xdg["XDG_CACHE_HOME"] / "buglog").iterdir())) == 1
@@ -0,0 +1,83 @@
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict
+from typing import Set
+
+import pytest
+
+# Generous upper bounds for the import time of the code paths below,
+# without the modules imported by the interpreter startup itself
+VERSION_BUDGET_MS = 200
+PICKER_BUDGET_MS = 300
+
+HEAVY_MODULES = (
+    "blessings",
+    "bs4",
+    "docutils",
+    "httpx",
+    "prompt_toolkit",
+    "pydantic",
+    "readchar",
+    "timefhuman",
+)
+
+PICKER_CODE = """
+import sys
+from buglog.fuzzy import fuzzy_pick_bug
+from buglog.parse_rst import bugs_to_rst
+from buglog.snapshot import load_snapshot
+
+bugs_to_rst(load_snapshot())
+print(" ".join(sorted(sys.modules)))
+"""
+
+
+def _top_level_imports(code: str, env: Dict[str, str]) -> Dict[str, int]:
+    """Run code with ``-X importtime`` and get top-level imports' times."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    times = {}
+    for line in proc.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| (\S+)$", line)
+        if match:
+            times[match.group(2)] = int(match.group(1))
+    return times
+
+
+def _imports_time_ms(code: str, env: Dict[str, str]) -> float:
+    baseline: Set[str] = set(_top_level_imports("pass", env))
+    times = _top_level_imports(code, env)
+    return sum(t for mod, t in times.items() if mod not in baseline) / 1000
+
+
+@pytest.fixture
+def xdg_env(tmp_path: Path) -> Dict[str, str]:
+    env = dict(os.environ)
+    for var in ("XDG_CONFIG_HOME", "XDG_CACHE_HOME", "XDG_DATA_HOME"):
+        env[var] = str(tmp_path / var)
+    return env
+
+
+def test_version_startup_budget(xdg_env: Dict[str, str]) -> None:
+    code = "from buglog.cli import main; main(['--version'])"
+    assert _imports_time_ms(code, xdg_env) < VERSION_BUDGET_MS
+
+
+def test_picker_startup_budget(xdg_env: Dict[str, str]) -> None:
+    # Warm up the schema snapshot
+    subprocess.run([sys.executable, "-c", PICKER_CODE], env=xdg_env)
+
+    output = subprocess.check_output(
+        [sys.executable, "-c", PICKER_CODE], env=xdg_env, text=True
+    )
+    imported = set(output.split())
+    assert not imported.intersection(HEAVY_MODULES)
+    assert _imports_time_ms(PICKER_CODE, xdg_env) < PICKER_BUDGET_MS
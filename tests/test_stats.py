@@ -0,0 +1,131 @@
+import builtins
+from datetime import date
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+from typing import Dict
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+
+from buglog.stats import aggregate
+from buglog.stats import iter_stats
+from buglog.stats import load_columns
+from buglog.storage import append_records
+
+
+def _fill_data_dir() -> None:
+    append_records("2020-07-19_09:00:00_Escitalopram.jsonl", [{"dose": 10}])
+    append_records("2020-07-20_09:00:00_Escitalopram.jsonl", [{"dose": 10}])
+    append_records(
+        "2020-07-20_21:00:00_Escitalopram.jsonl", [{"dose": 5, "num": 2}]
+    )
+    append_records("2020-08-01_09:00:00_Escitalopram.jsonl", [{"dose": 20}])
+    append_records("2020-07-20_09:00:00_Weight.jsonl", [{"kg": 80.5}])
+
+
+def test_load_columns(mock_xdg: Dict[str, Path]) -> None:
+    _fill_data_dir()
+    columns = load_columns("Escitalopram")
+    assert len(columns.timestamps) == 4
+    assert columns.fields["dose"].typecode == "q"
+    assert list(columns.fields["dose"]) == [10, 10, 5, 20]
+    # Records missing the integer field are stored as floats
+    assert columns.fields["num"].typecode == "d"
+    assert str(list(columns.fields["num"])) == "[nan, nan, 2.0, nan]"
+
+    columns = load_columns("Weight", since=datetime(2020, 8, 1))
+    assert list(columns.timestamps) == []
+
+
+def test_load_columns_mixed_history(mock_xdg: Dict[str, Path]) -> None:
+    append_records("2020-07-19_09:00:00_Escitalopram.jsonl", [{"dose": 10}])
+    # Logged before the fields' types were changed
+    append_records(
+        "2020-07-20_09:00:00_Escitalopram.jsonl",
+        [{"dose": 7.5, "num": "two"}, {"dose": 5, "num": 1.0}],
+    )
+    append_records("2020-07-19_09:00:00_Weight.jsonl", [{"kg": 80}])
+
+    columns = load_columns("Escitalopram")
+    assert columns.fields["dose"].typecode == "d"
+    assert list(columns.fields["dose"]) == [10.0, 7.5, 5.0]
+    assert str(list(columns.fields["num"])) == "[nan, nan, 1.0]"
+    assert list(load_columns("Weight").fields["kg"]) == [80.0]
+
+
+@pytest.mark.parametrize(
+    "by, how, expected",
+    [
+        (
+            "day",
+            "sum",
+            [
+                (date(2020, 7, 19), 10.0),
+                (date(2020, 7, 20), 15.0),
+                (date(2020, 8, 1), 20.0),
+            ],
+        ),
+        (
+            "week",
+            "mean",
+            [
+                (date(2020, 7, 13), 10.0),
+                (date(2020, 7, 20), 7.5),
+                (date(2020, 7, 27), 20.0),
+            ],
+        ),
+        ("month", "max", [(date(2020, 7, 1), 10.0), (date(2020, 8, 1), 20.0)]),
+        ("month", "count", [(date(2020, 7, 1), 3.0), (date(2020, 8, 1), 1.0)]),
+    ],
+)
+def test_iter_stats(
+    mock_xdg: Dict[str, Path], by: str, how: str, expected: Any
+) -> None:
+    _fill_data_dir()
+    assert list(iter_stats("Escitalopram", "dose", by=by, how=how)) == expected
+
+
+def test_aggregate_without_numpy(
+    mock_xdg: Dict[str, Path], monkeypatch: MonkeyPatch
+) -> None:
+    _fill_data_dir()
+    columns = load_columns("Escitalopram")
+    import_module = builtins.__import__
+
+    def _import(name: str, *args: Any, **kwargs: Any) -> Any:
+        if name == "numpy":
+            raise ImportError(name)
+        return import_module(name, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, "__import__", _import)
+    assert aggregate(columns, "num", by="week", how="min") == [
+        (date(2020, 7, 20), 2.0)
+    ]
+    assert aggregate(columns, "dose", by="day", how="sum") == [
+        (date(2020, 7, 19), 10.0),
+        (date(2020, 7, 20), 15.0),
+        (date(2020, 8, 1), 20.0),
+    ]
+
+
+def test_iter_stats_splitting_buckets(
+    mock_xdg: Dict[str, Path], monkeypatch: MonkeyPatch
+) -> None:
+    _fill_data_dir()
+    since = datetime(2020, 7, 20, 12)
+    # The day is split, so the records are loaded
+    assert list(iter_stats("Escitalopram", "dose", since=since)) == [
+        (date(2020, 7, 20), 5.0),
+        (date(2020, 8, 1), 20.0),
+    ]
+
+    def _fail(*args: Any, **kwargs: Any) -> Any:
+        raise AssertionError("records should not be loaded")
+
+    monkeypatch.setattr("buglog.stats.load_columns", _fail)
+    assert list(
+        iter_stats(
+            "Escitalopram", "dose", by="month", until=datetime(2020, 8, 1)
+        )
+    ) == [(date(2020, 7, 1), 25.0)]
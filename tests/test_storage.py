@@ -0,0 +1,192 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+
+import buglog.storage
+from buglog.storage import _scan_partitions
+from buglog.storage import append_records
+from buglog.storage import commit
+from buglog.storage import COMMIT_JOURNAL_NAME
+from buglog.storage import iter_records
+from buglog.storage import migrate
+from buglog.storage import read_file
+from buglog.storage import Record
+
+
+def test_append_records(mock_xdg: Dict[str, Path]) -> None:
+    file_name = "2020-07-21_10:51:10_Squats.jsonl"
+    path = append_records(file_name, [{"reps": 1, "times": 2}])
+    append_records(file_name, [{"reps": 3, "times": 4}], fsync=False)
+
+    assert path == mock_xdg["XDG_DATA_HOME"] / "buglog" / file_name
+    assert path.read_text() == (
+        '{"reps": 1, "times": 2}\n{"reps": 3, "times": 4}\n'
+    )
+
+
+def test_append_records_repairs_torn_tail(mock_xdg: Dict[str, Path]) -> None:
+    file_name = "2020-07-21_10:51:10_Squats.jsonl"
+    path = append_records(file_name, [{"reps": 1}])
+    with open(path, "a") as fout:
+        fout.write('{"reps": ')
+
+    # Incomplete lines are not read, and are dropped on the next write
+    assert list(read_file(path)) == [{"reps": 1}]
+    append_records(file_name, [{"reps": 2}])
+    assert list(read_file(path)) == [{"reps": 1}, {"reps": 2}]
+
+
+@pytest.mark.parametrize("mmap_min_size", [1, 1024 * 1024])
+def test_read_file(
+    mock_xdg: Dict[str, Path], monkeypatch: MonkeyPatch, mmap_min_size: int
+) -> None:
+    monkeypatch.setattr("buglog.storage.MMAP_MIN_SIZE", mmap_min_size)
+    path = append_records("2020-07-21_10:51:10_Squats.jsonl", [])
+    assert list(read_file(path)) == []
+
+    records = [{"reps": n, "times": 1} for n in range(1000)]
+    append_records(path.name, records)
+    with open(path, "a") as fout:
+        fout.write("\n\n{")
+    assert list(read_file(path)) == records
+
+
+def test_concurrent_appends(mock_xdg: Dict[str, Path]) -> None:
+    file_name = "2020-07-21_10:51:10_Squats.jsonl"
+
+    def _append(num: int) -> None:
+        append_records(file_name, [{"num": num}] * 10, fsync=False)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(_append, range(50)))
+
+    nums = [
+        record["num"]
+        for record in read_file(
+            mock_xdg["XDG_DATA_HOME"] / "buglog" / file_name
+        )
+    ]
+    assert sorted(nums) == sorted(list(range(50)) * 10)
+
+
+def test_iter_records(mock_xdg: Dict[str, Path]) -> None:
+    data_dir = mock_xdg["XDG_DATA_HOME"] / "buglog"
+    append_records("2020-07-21_10:51:10_Squats.jsonl", [{"times": 2}])
+    with open(data_dir / "2020-07-20_08:00:00_Drink_Tea.json", "w") as fout:
+        json.dump([{"liters": 0.5}, {"liters": 0.2}], fout)
+    (data_dir / "fzf").touch()
+
+    assert list(iter_records()) == [
+        Record(datetime(2020, 7, 20, 8), "Drink_Tea", {"liters": 0.5}),
+        Record(datetime(2020, 7, 20, 8), "Drink_Tea", {"liters": 0.2}),
+        Record(datetime(2020, 7, 21, 10, 51, 10), "Squats", {"times": 2}),
+    ]
+
+
+def test_commit_rolls_back(
+    mock_xdg: Dict[str, Path], monkeypatch: MonkeyPatch
+) -> None:
+    data_dir = mock_xdg["XDG_DATA_HOME"] / "buglog"
+    existing = "2020-07-21_10:51:10_Squats.jsonl"
+    created = "2020-07-21_10:51:10_Drink.jsonl"
+    append_records(existing, [{"times": 1}])
+
+    write_all = buglog.storage._write_all
+
+    def _failing_write_all(fd: int, payload: bytes) -> None:
+        write_all(fd, payload)
+        if len(list(data_dir.glob("*.jsonl"))) == 2:
+            raise OSError("disk full")
+
+    monkeypatch.setattr("buglog.storage._write_all", _failing_write_all)
+    with pytest.raises(OSError):
+        commit({existing: [{"times": 2}], created: [{"liters": 1.0}]})
+
+    assert list(read_file(data_dir / existing)) == [{"times": 1}]
+    assert not (data_dir / created).exists()
+
+
+def test_interrupted_commit_is_rolled_back(
+    mock_xdg: Dict[str, Path], monkeypatch: MonkeyPatch
+) -> None:
+    data_dir = mock_xdg["XDG_DATA_HOME"] / "buglog"
+    existing = "2020-07-21_10:51:10_Squats.jsonl"
+    created = "2020-07-21_10:51:10_Drink.jsonl"
+    append_records(existing, [{"times": 1}])
+
+    write_all = buglog.storage._write_all
+
+    def _crashing_write_all(fd: int, payload: bytes) -> None:
+        write_all(fd, payload)
+        if (data_dir / created).exists():
+            raise SystemExit
+
+    # The process dies after writing both files, without cleaning up
+    with monkeypatch.context() as patch:
+        patch.setattr("buglog.storage._write_all", _crashing_write_all)
+        patch.setattr("buglog.storage._roll_back_journal", lambda root: None)
+        with pytest.raises(SystemExit):
+            commit({existing: [{"times": 2}], created: [{"liters": 1.0}]})
+    assert (data_dir / COMMIT_JOURNAL_NAME).exists()
+
+    assert [r.data for r in iter_records()] == [{"times": 1}]
+    assert not (data_dir / COMMIT_JOURNAL_NAME).exists()
+    assert not (data_dir / created).exists()
+
+
+def test_partitioned_layout(mock_xdg: Dict[str, Path]) -> None:
+    data_dir = mock_xdg["XDG_DATA_HOME"] / "buglog"
+    names = [
+        "2019-12-31_23:00:00_Mood.jsonl",
+        "2020-01-01_08:00:00_Mood.jsonl",
+        "2020-01-02_08:00:00_Mood.jsonl",
+        "2020-02-01_08:00:00_Mood.jsonl",
+    ]
+    for num, file_name in enumerate(names[:2]):
+        append_records(file_name, [{"mood": num}])
+
+    assert migrate("partitioned") == 2
+    for num, file_name in enumerate(names[2:], start=2):
+        append_records(file_name, [{"mood": num}])
+
+    assert sorted(
+        os.fspath(path.relative_to(data_dir))
+        for path in data_dir.rglob("*.jsonl")
+    ) == [
+        "2019/12/31/2019-12-31_23:00:00_Mood.jsonl",
+        "2020/01/01/2020-01-01_08:00:00_Mood.jsonl",
+        "2020/01/02/2020-01-02_08:00:00_Mood.jsonl",
+        "2020/02/01/2020-02-01_08:00:00_Mood.jsonl",
+    ]
+
+    since, until = datetime(2020, 1, 1, 12), datetime(2020, 2, 1)
+    assert sorted(
+        os.fspath(path.relative_to(data_dir))
+        for path in _scan_partitions(data_dir, (), since, until)
+    ) == ["2020/01/01", "2020/01/02", "2020/02/01"]
+    assert [r.data for r in iter_records(since, until)] == [{"mood": 2}]
+
+    assert migrate("flat") == 4
+    assert sorted(path.name for path in data_dir.iterdir()) == sorted(
+        names + [".layout", ".lock"]
+    )
+    assert [r.data["mood"] for r in iter_records()] == [0, 1, 2, 3]
+
+
+def test_migrate_merges_dumps(mock_xdg: Dict[str, Path]) -> None:
+    data_dir = mock_xdg["XDG_DATA_HOME"] / "buglog"
+    file_name = "2020-01-01_08:00:00_Mood.jsonl"
+    append_records(file_name, [{"mood": 1}])
+    migrate("partitioned")
+    # A leftover from a concurrent writer unaware of the new layout
+    (data_dir / file_name).write_text('{"mood": 2}\n')
+
+    assert migrate("partitioned") == 1
+    assert [r.data["mood"] for r in iter_records()] == [1, 2]
+    assert not (data_dir / file_name).exists()
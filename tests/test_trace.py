@@ -0,0 +1,54 @@
+import io
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from _pytest.monkeypatch import MonkeyPatch
+
+from buglog import trace
+from buglog.trace import span
+from buglog.trace import Tracer
+
+
+def test_disabled_spans_are_shared(monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setattr("buglog.trace._tracer", None)
+    assert span("a") is span("b", x=1)
+
+
+def test_spans(monkeypatch: MonkeyPatch) -> None:
+    tracer = Tracer()
+    monkeypatch.setattr("buglog.trace._tracer", tracer)
+    with span("outer"):
+        with span("inner", bug="Mood"):
+            pass
+
+    assert [(s.name, s.depth, s.args) for s in tracer.spans] == [
+        ("inner", 1, {"bug": "Mood"}),
+        ("outer", 0, {}),
+    ]
+    stream = io.StringIO()
+    tracer.print_breakdown(stream)
+    lines = stream.getvalue().splitlines()
+    assert lines[1].endswith(" ms  outer")
+    assert lines[2].endswith(" ms    inner bug=Mood")
+    events = tracer.chrome_trace()["traceEvents"]
+    assert {e["ph"] for e in events} == {"X"}
+
+
+def test_trace_env(tmp_path: Path) -> None:
+    env = dict(os.environ)
+    for var in ("XDG_CONFIG_HOME", "XDG_CACHE_HOME", "XDG_DATA_HOME"):
+        env[var] = str(tmp_path / var)
+    env[trace.TRACE_ENV] = str(tmp_path / "trace.json")
+    code = (
+        "from buglog.parse_rst import rst_to_bugs\n"
+        "list(rst_to_bugs('Squats\\n------\\n\\n* Times: 3'))\n"
+    )
+    subprocess.run([sys.executable, "-c", code], env=env, check=True)
+
+    with open(tmp_path / "trace.json") as fin:
+        events = json.load(fin)["traceEvents"]
+    names = {event["name"] for event in events}
+    assert {"import config", "parse sections", "validate"} <= names
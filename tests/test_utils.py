@@ -0,0 +1,63 @@
+from pathlib import Path
+from types import ModuleType
+from typing import Dict
+from typing import List
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+
+import buglog.utils
+from buglog.utils import get_bug_subclasses
+from buglog.utils import str_to_bug
+
+
+def test_registry_imports_config_once(
+    mock_xdg: Dict[str, Path], monkeypatch: MonkeyPatch
+) -> None:
+    calls: List[None] = []
+    import_config = buglog.utils.import_config
+
+    def _counting_import_config() -> ModuleType:
+        calls.append(None)
+        return import_config()
+
+    monkeypatch.setattr("buglog.utils.import_config", _counting_import_config)
+
+    classes = get_bug_subclasses()
+    assert str_to_bug("Squats") in classes
+    for bug_class in classes:
+        assert str_to_bug(bug_class.__name__) is bug_class
+    assert len(calls) == 1
+
+
+def test_registry_reimports_changed_config(mock_xdg: Dict[str, Path]) -> None:
+    config_path = mock_xdg["XDG_CONFIG_HOME"] / "buglog" / "config.py"
+
+    squats = str_to_bug("Squats")
+    num_classes = len(get_bug_subclasses())
+
+    with open(config_path, "a") as fout:
+        fout.write("\n\nclass Planks(Bug):\n    seconds: int\n")
+
+    # Re-imported classes replace the stale ones
+    classes = get_bug_subclasses()
+    assert len(classes) == num_classes + 1
+    assert str_to_bug("Planks") is classes[-1]
+    assert str_to_bug("Squats") is not squats
+    assert len({bug_class.__name__ for bug_class in classes}) == len(classes)
+
+
+def test_registry_raises_until_config_is_fixed(
+    mock_xdg: Dict[str, Path],
+) -> None:
+    config_path = mock_xdg["XDG_CONFIG_HOME"] / "buglog" / "config.py"
+    str_to_bug("Squats")
+    config = config_path.read_text()
+
+    config_path.write_text(config + "\n\nclass Planks(Bug:\n")
+    for _ in range(2):
+        with pytest.raises(SyntaxError):
+            str_to_bug("Squats")
+
+    config_path.write_text(config + "\n\nclass Planks(Bug):\n    s: int\n")
+    assert str_to_bug("Planks").__name__ == "Planks"